@@ -1,10 +1,10 @@
-from pyzbar.pyzbar import decode
 import cv2
 import numpy as np
 
 camera_index = 2
 
 def qrcodeReader(image):
+    from pyzbar.pyzbar import decode
     image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
     qrcodes = decode(image)
     for decodedObject in qrcodes:
@@ -17,13 +17,15 @@ def qrcodeReader(image):
     return list(data)
 
 
-cap = cv2.VideoCapture(camera_index)
+if __name__ == "__main__":
 
-while True:
-    ret, frame = cap.read()
-    qrcode = qrcodeReader(frame)
-    print(qrcode)
-    cv2.imshow('qrcode reader', frame)
-    code = cv2.waitKey(1)
-    if code == ord('q'):
-        break
+    cap = cv2.VideoCapture(camera_index)
+
+    while True:
+        ret, frame = cap.read()
+        qrcode = qrcodeReader(frame)
+        print(qrcode)
+        cv2.imshow('qrcode reader', frame)
+        code = cv2.waitKey(1)
+        if code == ord('q'):
+            break
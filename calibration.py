@@ -1,71 +1,192 @@
-import socket
 import sys
+import os
+import glob
+import time
+import argparse
 import numpy as np
 import cv2
-import time
-from image import take_pictures, mapping
+from image import camera_index, imageToActual
+from scene import measureRegion
 from connect import connect2Arm
+from param import close_grip, open_grip, rise_pose, go_home, view_clear_pose
+from pose import CartesianPose, sendCommands
+from motion import MotionSocket
 
-if __name__ == "__main__":
+calib_dir = './calibration_data'
+
+# ---------------------------------------- FIT ----------------------------------------
+
+# img_pos, actual_pos: (n, 2) arrays of matching pixel / arm (mm) positions
+
+
+def fitAffine(img_pos, actual_pos, ransac_thresh=3.0):
+    # affine map as a 3x3 matrix like mapping(): RANSAC picks the inliers
+    # (within ransac_thresh mm), then least squares over all of them
+    img_pos = np.asarray(img_pos, dtype=float)
+    actual_pos = np.asarray(actual_pos, dtype=float)
+    inliers = np.ones(len(img_pos), dtype=bool)
+    if len(img_pos) > 3:
+        _, mask = cv2.estimateAffine2D(img_pos.astype(np.float32), actual_pos.astype(np.float32),
+                                       method=cv2.RANSAC, ransacReprojThreshold=ransac_thresh)
+        if mask is not None and mask.sum() >= 3:
+            inliers = mask.ravel().astype(bool)
+    X = np.hstack([img_pos, np.ones((len(img_pos), 1))])
+    sol, _, _, _ = np.linalg.lstsq(X[inliers], actual_pos[inliers], rcond=None)
+    A = np.eye(3)
+    A[:2, :] = sol.T
+    return A, inliers
+
+
+def fitHomography(img_pos, actual_pos, ransac_thresh=3.0):
+    # RANSAC homography, outliers (> ransac_thresh mm) are left out of the final fit
+    H, mask = cv2.findHomography(np.asarray(img_pos, dtype=np.float64),
+                                 np.asarray(actual_pos, dtype=np.float64), cv2.RANSAC, ransac_thresh)
+    if H is None:
+        raise ValueError('homography fit failed')
+    return H / H[2, 2], mask.ravel().astype(bool)
+
+
+def fit(img_pos, actual_pos, method='affine'):
+    if method == 'affine':
+        return fitAffine(img_pos, actual_pos)
+    if method == 'homography':
+        return fitHomography(img_pos, actual_pos)
+    raise ValueError('unknown method %r' % method)
+
+
+def residuals(A, img_pos, actual_pos):
+    # per-point placement error (mm)
+    return np.linalg.norm(imageToActual(A, img_pos) - np.asarray(actual_pos, dtype=float), axis=1)
+
+
+def localScale(A, img_pos):
+    # mm per pixel around the centre of the calibrated points
+    c = np.mean(np.asarray(img_pos, dtype=float), axis=0)
+    d = 1.0
+    p = imageToActual(A, [c, c + [d, 0], c + [0, d]])
+    u, v = p[1] - p[0], p[2] - p[0]
+    return np.sqrt(abs(u[0] * v[1] - u[1] * v[0])) / d
+
+
+def report(A, img_pos, actual_pos, inliers):
+    err = residuals(A, img_pos, actual_pos)
+    print(' #   actual (mm)          image (px)           error (mm)')
+    for i in range(len(err)):
+        print('%2d  %8.1f %8.1f   %8.1f %8.1f   %6.2f%s' % (i, actual_pos[i][0], actual_pos[i][1],
+              img_pos[i][0], img_pos[i][1], err[i], '' if inliers[i] else '  (outlier)'))
+    print('rms: %.2f mm   max: %.2f mm' % (np.sqrt(np.mean(err[inliers] ** 2)), err[inliers].max()))
+    return err
+
+# ---------------------------------------- ARTIFACT ----------------------------------------
 
-    # [[x, y], [x, y], [x, y]]
-    actual_pos = np.array([[-100.0, 380.0], [200.0, 550.0], [100.0, 400.0]])
-    img_pos = np.zeros([3, 2])
-    s = connect2Arm()
-
-    for i in range(3):
-
-        # move to position
-        action = 'MOVP ' + str(actual_pos[i, 0]) + ' ' + str(actual_pos[i, 1]) + ' -170 90 0 180'
-        s.sendall(action.encode('ascii'))
-
-        # place the item
-        print('Please place the object in the gripper.')
-        input('Press any key to continue.')
-
-        # home
-        go_home = 'GOHOME'
-        s.sendall(go_home.encode('ascii'))
-        time.sleep(5)
-
-        # get centroid, store in img_pos
-        mc, p_angle = take_pictures()
-        img_pos[i, 0] = mc[0][0]
-        img_pos[i, 1] = mc[0][1]
-        print('mc for calibration: ', img_pos[i, 0], ', ', img_pos[i, 1])
-        print('Please remove the object.')
-        input('Press any key to continue.')
-    
+
+def save(A, pixel2mm, img_pos, actual_pos, err, inliers, method):
+    # versioned artifact + the current img2actual.npy / pixel2mm.npy used by the detector
+    versions = glob.glob(os.path.join(calib_dir, 'calib_v*.npz'))
+    version = 1 + max([int(os.path.basename(v)[7:-4]) for v in versions] + [0])
+    path = os.path.join(calib_dir, 'calib_v%d.npz' % version)
+    np.savez(path, version=version, time=time.time(), method=method, img2actual=A, pixel2mm=pixel2mm,
+             img_pos=img_pos, actual_pos=actual_pos, residuals=err, inliers=inliers)
+    np.save(os.path.join(calib_dir, 'img2actual.npy'), A)
+    np.save(os.path.join(calib_dir, 'pixel2mm.npy'), pixel2mm)
+    print('\'%s\' saved' % path)
+    return path
+
+
+def loadRecorded(path):
+    # csv with columns actual_x, actual_y, img_x, img_y
+    data = np.loadtxt(path, delimiter=',', skiprows=1, ndmin=2)
+    return data[:, 2:4], data[:, 0:2]
+
+
+def saveRecorded(path, img_pos, actual_pos):
+    np.savetxt(path, np.hstack([actual_pos, img_pos]), delimiter=',', fmt='%.3f',
+               header='actual_x,actual_y,img_x,img_y', comments='')
+
+# ---------------------------------------- ARM ----------------------------------------
+
+
+def gridPoints(x_range, y_range, nx, ny):
+    xs = np.linspace(x_range[0], x_range[1], nx)
+    ys = np.linspace(y_range[0], y_range[1], ny)
+    return np.array([[x, y] for y in ys for x in xs])
+
+
+def waitStill(cap, tol=2.0, still_frames=5, timeout=10.0):
+    # wait until the image stops changing; call it once the arm is done moving
+    # (MotionSocket.wait), a frame is still too before the arm starts
+    ret, last = cap.read()
+    last = cv2.cvtColor(last, cv2.COLOR_BGR2GRAY)
+    still = 0
+    start = time.time()
+    while still < still_frames and time.time() - start < timeout:
+        ret, frame = cap.read()
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        still = still + 1 if np.mean(cv2.absdiff(gray, last)) < tol else 0
+        last = gray
+    return last
+
+
+def collect(points, place_z=-170, rotation=(90, 0, 180)):
+    # The calibration object starts in the gripper. At every grid point the arm puts
+    # it down, clears the view and the centroid is measured, then picks it up again.
+    s = MotionSocket(connect2Arm())
+    cap = cv2.VideoCapture(camera_index)
+    img_pos = []
+    actual_pos = []
+    sendCommands(s, close_grip)
+    for p in points:
+        above = CartesianPose(p[0], p[1], 0, *rotation)
+        down = CartesianPose(p[0], p[1], place_z, *rotation)
+        sendCommands(s, above, down, open_grip, rise_pose, view_clear_pose)
+        # estimated end of the moves, then the image settles with the arm out of view
+        s.wait()
+        gray = waitStill(cap)
+        objects = measureRegion(gray)
+        if len(objects) != 1:
+            print('point (%.1f, %.1f): %d objects detected, skipped' % (p[0], p[1], len(objects)))
+        else:
+            img_pos.append(objects[0].centroid)
+            actual_pos.append(p)
+            print('point (%.1f, %.1f): centroid (%.1f, %.1f)' % (p[0], p[1], *objects[0].centroid))
+        sendCommands(s, above, down, close_grip, rise_pose)
+    sendCommands(s, go_home)
     s.close()
+    cap.release()
+    return np.array(img_pos), np.array(actual_pos)
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description='camera to arm calibration')
+    parser.add_argument('--method', choices=['affine', 'homography'], default='affine')
+    parser.add_argument('--grid', type=int, nargs=2, default=[4, 3], metavar=('NX', 'NY'))
+    parser.add_argument('--x-range', type=float, nargs=2, default=[-100.0, 200.0])
+    parser.add_argument('--y-range', type=float, nargs=2, default=[380.0, 550.0])
+    parser.add_argument('--offline', metavar='CSV', help='fit recorded centroids instead of driving the arm')
+    parser.add_argument('--check', metavar='NPY', help='only measure the error of an existing img2actual')
+    parser.add_argument('--record', metavar='CSV', help='save the collected centroids')
+    args = parser.parse_args()
+
+    if args.offline:
+        img_pos, actual_pos = loadRecorded(args.offline)
+    else:
+        points = gridPoints(args.x_range, args.y_range, *args.grid)
+        img_pos, actual_pos = collect(points)
+        if args.record:
+            saveRecorded(args.record, img_pos, actual_pos)
+
+    if args.check:
+        A = np.load(args.check)
+        report(A, img_pos, actual_pos, np.ones(len(img_pos), dtype=bool))
+        sys.exit(0)
 
-    # compute image pixel to real world mm
-    # ones = np.matrix(np.ones([1, 3], dtype=float))
-    # actual_pos = np.concatenate((actual_pos, ones.T), axis=1)
-    # actual_pos = actual_pos.T
-    # print(actual_pos)
-    # A = np.matrix(np.load('./calibration_data/img2actual.npy'))
-
-    # img_pos = np.matmul(A.I, actual_pos)
-    # print(img_pos)
-
-    pixel2mm = []
-    for [i, j] in [[0, 1], [0, 2], [1, 2]]:
-        actual_dis = np.linalg.norm(actual_pos[i] - actual_pos[j])
-        img_dis = np.linalg.norm(img_pos[i] - img_pos[j])
-        # print("actual_dis", actual_dis)
-        # print("img_dis", img_dis)
-        print(i, j)
-        print(actual_dis / img_dis)
-        pixel2mm.append(actual_dis / img_dis)
-        print(actual_dis / img_dis)
-    pixel2mm = sum(pixel2mm) / len(pixel2mm)
-    np.save('./calibration_data/pixel2mm.npy', pixel2mm)
-    print("pixel2mm: ", pixel2mm)
-    print('\'./calibration_data/pixel2mm.npy\' saved')
-
-    # compute and store the mapping matrix
-    img2actual = mapping(actual_pos, img_pos)
-    np.save('./calibration_data/img2actual.npy', img2actual)
-    print('img2actual: ', img2actual)
-    print('\'./calibration_data/img2actual.npy\' saved')
-    
+    need = 3 if args.method == 'affine' else 4
+    if len(img_pos) < need:
+        sys.exit('at least %d points are needed, got %d' % (need, len(img_pos)))
+    A, inliers = fit(img_pos, actual_pos, args.method)
+    err = report(A, img_pos, actual_pos, inliers)
+    pixel2mm = localScale(A, img_pos[inliers])
+    print('img2actual: ', A)
+    print('pixel2mm: ', pixel2mm)
+    save(A, pixel2mm, img_pos, actual_pos, err, inliers, args.method)
@@ -0,0 +1,115 @@
+# Compiled product catalog: obj_info.csv (or .json) -> one .npy structured array,
+# rows sorted by SN, opened with mmap. The SN column is the index (binary search),
+# so opening is instant whatever the catalog size and every lane / worker process
+# shares the same pages through the OS page cache.
+#
+#   python3 catalog.py                      rebuild ./obj_data/obj_info.npy from the CSV
+#   python3 catalog.py SRC OUT              any source / output
+#   python3 catalog.py --lookup 1 5 7       print catalog rows
+import os
+import csv
+import json
+import numpy as np
+from param import catalog_path
+
+CATALOG_DTYPE = np.dtype([('sn', '<i8'), ('a', '<f4'), ('b', '<f4'), ('c', '<f4'),
+                          ('fragility', '<i1'), ('weight', '<f4')])
+FIELDS = ('a', 'b', 'c', 'fragility', 'weight')
+
+
+def _rows(source):
+    # (sn, a, b, c, fragility, weight) from the CSV / JSON catalog, streamed
+    if source.lower().endswith('.json'):
+        with open(source) as f:
+            for sn, row in json.load(f).items():
+                yield (int(sn),) + tuple(row[k] for k in FIELDS)
+        return
+    with open(source, newline='') as f:
+        reader = csv.DictReader(f)
+        for row in reader:
+            yield (int(row['SN']),) + tuple(float(row[k]) for k in FIELDS)
+
+
+def sourceOf(path):
+    # the CSV a compiled catalog is built from: same name, next to it
+    return os.path.splitext(path)[0] + '.csv'
+
+
+def build(source, out=catalog_path):
+    table = np.fromiter(_rows(source), dtype=CATALOG_DTYPE)
+    table.sort(order='sn')
+    dup = table['sn'][1:][table['sn'][1:] == table['sn'][:-1]]
+    if len(dup):
+        raise ValueError('%s: duplicated SN %s' % (source, sorted(set(dup.tolist()))[:10]))
+    # write next to the target and rename, so readers never see a half written file
+    tmp = out + '.tmp.npy'
+    np.save(tmp, table)
+    os.replace(tmp, out)
+    return len(table)
+
+
+class Catalog:
+
+    def __init__(self, path=catalog_path):
+        self.path = path
+        self.table = np.load(path, mmap_mode='r')
+        if self.table.dtype != CATALOG_DTYPE:
+            raise ValueError('%s is not a compiled catalog' % path)
+        self.sn = self.table['sn']
+
+    def __len__(self):
+        return len(self.table)
+
+    def index(self, SN):
+        # row of SN (an int or an array of them); KeyError for unknown SNs
+        SN = np.asarray(SN, dtype=np.int64)
+        i = np.searchsorted(self.sn, SN)
+        found = (i < len(self.sn)) & (self.sn[np.minimum(i, len(self.sn) - 1)] == SN)
+        if not np.all(found):
+            raise KeyError('SN not in catalog: %s' % np.atleast_1d(SN)[~np.atleast_1d(found)].tolist())
+        return i
+
+    def size(self, SN):
+        # (a, b, c) edge lengths in mm
+        row = self.table[self.index(SN)]
+        return np.array([row['a'], row['b'], row['c']], dtype=float)
+
+    def attrs(self, SN):
+        # (weight, fragility)
+        row = self.table[self.index(SN)]
+        return float(row['weight']), int(row['fragility'])
+
+    def column(self, name, SNs):
+        # one field for many SNs at once
+        return np.asarray(self.table[name][self.index(SNs)])
+
+
+def openCatalog(path=catalog_path, source=None):
+    # build the compiled file first if it is missing or older than its source
+    source = source or sourceOf(path)
+    if os.path.exists(source) and \
+            (not os.path.exists(path) or os.path.getmtime(path) < os.path.getmtime(source)):
+        build(source, path)
+    return Catalog(path)
+
+
+if __name__ == "__main__":
+
+    import sys
+    import time
+    import argparse
+    parser = argparse.ArgumentParser(description='compile the product catalog')
+    parser.add_argument('source', nargs='?', help='CSV / JSON catalog (default: next to OUT)')
+    parser.add_argument('out', nargs='?', default=catalog_path)
+    parser.add_argument('--lookup', type=int, nargs='+', metavar='SN')
+    args = parser.parse_args()
+
+    if args.lookup:
+        cat = openCatalog(args.out, args.source)
+        for SN in args.lookup:
+            print(SN, cat.size(SN), cat.attrs(SN))
+        sys.exit(0)
+    source = args.source or sourceOf(args.out)
+    start = time.time()
+    n = build(source, args.out)
+    print('%d items, %s -> %s (%.1f ms)' % (n, source, args.out, (time.time() - start) * 1000))
@@ -0,0 +1,53 @@
+# Entry point for the checkout system and its tools:
+#   python3 checkout.py run              complete process (main.py)
+#   python3 checkout.py calibrate ...    camera to arm calibration
+#   python3 checkout.py <tool> -h        options of a tool
+# Only the module of the chosen subcommand is imported, so each tool starts with
+# just the dependencies it actually uses.
+import sys
+import runpy
+
+commands = {
+    'run': ('main', 'complete checkout process'),
+    'lanes': ('orchestrator', 'several lanes (or simulated arms) from one host'),
+    'simarm': ('simarm', 'simulated arm smoke test'),
+    'catalog': ('catalog', 'compile obj_info.csv into the memory-mapped catalog'),
+    'calibrate': ('calibration', 'camera to arm calibration'),
+    'intrinsics': ('intrinsics', 'lens calibration from chessboard images'),
+    'pack': ('portfolio', 'portfolio packing on a random basket'),
+    'pack-milp': ('packing_gurobi', 'MILP packing of param.item_size (gurobipy)'),
+    'pack-multi': ('packing_multi', 'split a basket over several containers'),
+    'framebus': ('framebus', 'one capture process, parallel consumers on a shared-memory bus'),
+    'scene': ('scene', 'incremental scene model on the camera feed'),
+    'qrcode': ('barcode_qrcode_reader', 'live QR code reader (pyzbar)'),
+    'motion': ('motion', 'estimated move times, PTP vs MOVL selection'),
+    'speed': ('speed', 'per-phase arm speeds of the catalog items'),
+    'reach': ('reach', 'reachability grid (--build) and pose checks'),
+    'scan': ('scan', 'QR scan order learned per SN and face'),
+    'fusion': ('fusion', 'multi-frame fused detections with confidence'),
+    'synth': ('synth', 'synthetic tabletop frames with ground truth, detector benchmark'),
+    'metrics': ('metrics', 'metrics summary of a running lane (--url), recording cost'),
+    'heightmap': ('heightmap', 'height map query timing'),
+    'validate': ('validate', 'plan validator timing'),
+    'importtime': ('importtime', 'import time of every module'),
+}
+
+
+def usage():
+    print('usage: python3 checkout.py <command> [options]\n')
+    for name, (module, text) in commands.items():
+        print('  %-12s %s' % (name, text))
+
+
+def main(argv):
+    if not argv or argv[0] not in commands:
+        usage()
+        return 1
+    module, _ = commands[argv[0]]
+    sys.argv = [module + '.py'] + argv[1:]
+    runpy.run_module(module, run_name='__main__', alter_sys=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -1,13 +1,10 @@
 
 
 import socket
+from param import arm_ip, arm_port
 
 
-def connect2Arm():
-    TCP_IP = "169.254.222.242"
-    TCP_PORT = 8000
-    BUFFER_SIZE = 1024
-    MESSAGE = "Hello, World!"
+def connect2Arm(TCP_IP=arm_ip, TCP_PORT=arm_port):
     s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     s.connect((TCP_IP, TCP_PORT))
 
@@ -1,20 +1,31 @@
 # returns true if QR code is detected
 # o.w. false
-from pyzbar.pyzbar import decode
-import pandas as pd
 import cv2
-import numpy as np
-import queue
-from param import *
+from param import scan_pos, scan_pos_inv, man_pose_J, man_pose_inv, open_grip, close_grip, rise_pose, \
+    Rotate_gripper_90, temp_pose, woman_pose, camera_index, catalog_path
+from pose import sendCommands
+from prompt import waitForArm
+import prompt
+from framebus import openCapture
+from helper import GetSizeBySN
+import metrics
 
 SN = ""
-camera_index = 2
-def qrcodeReader():
+def qrcodeReader(camera_index=camera_index):
+    with metrics.timer('qr_decode'):
+        data = _qrcodeReader(camera_index)
+    metrics.count('qr_decodes', result='found' if data else 'none')
+    return data
+
+
+def _qrcodeReader(camera_index):
+    from pyzbar.pyzbar import decode
     data = ""
-    cap = cv2.VideoCapture(camera_index)
+    cap = openCapture(camera_index)
 
     ret, frame = cap.read()
-    cv2.imshow("contour", frame)
+    if prompt.display:
+        cv2.imshow("contour", frame)
     for i in range(20):
         
         ret, frame = cap.read()
@@ -31,30 +42,28 @@ def qrcodeReader():
         data = list(data)
         print("i = %d" % i)
         if len(data) != 0:
-            SN = data[0]
             print("serial number = {}".format(data[0]))
             return data[0]
     
     return False
 
 # 2 scans
-def scan_rotate(s):
+def scan_rotate(s, camera_index=camera_index):
     s.sendall(scan_pos.encode('ascii'))
-    input("press anything when object is in place")
-    detected = qrcodeReader()
+    waitForArm("press anything when object is in place")
+    detected = qrcodeReader(camera_index)
 
     # Register "SN"
     if detected:
         return detected
 
     s.sendall(scan_pos_inv.encode('ascii'))
-    input("press anything when object is in place")
-    detected = qrcodeReader()
+    waitForArm("press anything when object is in place")
+    detected = qrcodeReader(camera_index)
     return detected
 
-def match2database(SN, actual_length):
-    df = pd.read_csv("./obj_data/obj_info.csv")
-    database_length = df.iloc[SN - 1][1:4].to_numpy()
+def match2database(SN, actual_length, catalog_path=catalog_path):
+    database_length = GetSizeBySN(SN, catalog_path)
     print("Matching database length: {}".format(database_length))
     #(a, b), (b, c), (a,c)
     actual_length = (max(actual_length), min(actual_length))
@@ -73,64 +82,94 @@ def match2database(SN, actual_length):
         return (database_length[0], database_length[2]), database_length[1]
     pass
 
-# Exit : back to bar code scanning position
-# Detecting barcode for 1 object
-# actual_length -> (int, int)
-def detect(i, s, actual_length):
-    SN = ""
-    face = (0, 0)
-    grabbing = 0
-    # First 2 scans
-    SN = scan_rotate(s)
-    if SN:
-        SN = int(SN)
-        face,_ = match2database(SN, actual_length)
-        grabbing = max(face)
-        print("SN is: {}".format(SN))
-        s.sendall(scan_pos.encode('ascii')) # go to scan pos
-        return face, grabbing, SN
-    input()
-    # If no QR code detected, grip the next 2 sides of the object
-    s.sendall(man_pose_J.encode('ascii'))   # go to man_pose
-    s.sendall(open_grip.encode('ascii'))        # open gripper
-    input()
-    s.sendall(rise_pose.encode('ascii'))  # rise 50mm
-    s.sendall(Rotate_gripper_90.encode('ascii')) # rotate 90deg
-    input()
-    s.sendall(man_pose_inv.encode('ascii'))  # lower 50mm
-    s.sendall(close_grip.encode('ascii'))       # close gripper
-    input()
-    SN = scan_rotate(s)
-    if SN:
-        SN = int(SN)
-        face, _ = match2database(SN, actual_length)
-        grabbing = min(face)
-        print("SN is: {}".format(SN))
-        s.sendall(scan_pos.encode('ascii')) # go to scan pos
-        return face, grabbing, SN
-
-    # If no QR code detected, do the roll manoeuver
-    input()
+def _scanAt(s, which, camera_index):
+    # one scan: scan_pos, or scan_pos_inv (J6 turned; from scan_pos as its other joints are kept)
+    if which == 'scan':
+        s.sendall(scan_pos.encode('ascii'))
+    else:
+        sendCommands(s, scan_pos, scan_pos_inv)
+    waitForArm("press anything when object is in place")
+    return qrcodeReader(camera_index)
+
+
+def _regrasp(s):
+    # grip the next 2 sides of the object
+    waitForArm()
+    sendCommands(s, man_pose_J, open_grip)          # go to man_pose, open gripper
+    waitForArm()
+    sendCommands(s, rise_pose, Rotate_gripper_90)   # rise 50mm, rotate 90deg
+    waitForArm()
+    sendCommands(s, man_pose_inv, close_grip)       # lower 50mm, close gripper
+    waitForArm()
+
+
+def _roll(s):
+    # the roll manoeuver
+    waitForArm()
     s.sendall(man_pose_J.encode('ascii'))
-    input()
-    s.sendall(open_grip.encode('ascii'))        # open gripper
-    s.sendall(rise_pose.encode('ascii'))        # rise 1200mm
+    waitForArm()
+    sendCommands(s, open_grip, rise_pose)           # open gripper, rise
 
-    input("stop here")
+    waitForArm("stop here")
     s.sendall(temp_pose.encode('ascii'))        # go to temp pose (move back)
-    input()
-    s.sendall(woman_pose.encode('ascii'))       # go to woman pose (L shape)
-    s.sendall(close_grip.encode('ascii'))        # close gripper
+    waitForArm()
+    sendCommands(s, woman_pose, close_grip)         # go to woman pose (L shape), close gripper
+    waitForArm()
+
+
+def heldAs(face, grabbing, stage, rolled):
+    # match2database (face, grabbing) -> as held after the scans: picked (grip), turned in
+    # the hand (regrasp), rolled over; once rolled a later regrasp keeps the roll's footprint
+    if rolled:
+        face = (max(face), grabbing)
+        return (max(face), min(face)), grabbing
+    if stage == 'grip':
+        return face, max(face)
+    return face, min(face)
+
 
-    input()
-    SN = scan_rotate(s)
+# Exit : back to bar code scanning position
+# Detecting barcode for 1 object
+# actual_length -> (int, int)
+# stats = scan.ScanStats: the scans are ordered by what found the code of items with
+# this footprint before (fixed order without stats), and the successful one is recorded
+def detect(i, s, actual_length, camera_index=camera_index, catalog_path=catalog_path, stats=None):
+    from scan import ATTEMPTS, DEFAULT_ORDER, footprintFaces
+    order = DEFAULT_ORDER
+    if stats is not None:
+        from helper import catalog
+        order, expected, default = stats.plan(stats.candidates(actual_length, catalog(catalog_path)))
+        if order != DEFAULT_ORDER:
+            print("scan order: {} (expected {:.1f} scans, {:.1f} in the fixed order)".format(
+                ' '.join('%s/%s' % ATTEMPTS[k] for k in order), expected, default))
+            stats.saved += default - expected
+    SN = False
+    stage = 'grip'
+    rolled = False
+    scans = 0
+    for attempt in order:
+        to_stage, which = ATTEMPTS[attempt]
+        if to_stage != stage:
+            # a regrasp put off until after the roll turns the rolled item in the hand
+            if to_stage == 'regrasp':
+                _regrasp(s)
+            else:
+                _roll(s)
+                rolled = True
+            stage = to_stage
+        SN = _scanAt(s, which, camera_index)
+        scans += 1
+        if SN:
+            break
+    if not SN:
+        raise RuntimeError("no QR code found on item {} in {} scans".format(i, scans))
     SN = int(SN)
-    face, grabbing = match2database(SN, actual_length)
-    face = (max(face), grabbing)
-    face = (max(face), min(face))
+    face, grabbing = heldAs(*match2database(SN, actual_length, catalog_path), stage, rolled)
+    if stats is not None:
+        stats.record(SN, int(footprintFaces(GetSizeBySN(SN, catalog_path), actual_length)[0][0]), attempt, scans)
 
     print("SN is: {}".format(SN))
-    input()
+    if rolled:
+        waitForArm()
     s.sendall(scan_pos.encode('ascii')) # go to scan pos
     return face, grabbing, SN
-    
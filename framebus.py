@@ -0,0 +1,309 @@
+# Shared-memory frame bus: one capture process writes camera frames into a ring of
+# slots in a multiprocessing.shared_memory block; any number of processes (contour
+# detector, QR decoder, recorder) read them as numpy views, without pickling or
+# copying the image.
+#
+# Layout: header (8 x int64) | slot seq (int64 x slots) | slot time (float64 x slots)
+#         | frames (uint8 x slots x h x w x c)
+# A slot's seq is set to -1 while it is written and to the frame number after, so a
+# reader can tell when the frame it holds has been overwritten (fresh()).
+#
+#   bus = startCapture(camera_index)          # capture process, returns its bus name
+#   cap = openCapture('bus:' + bus.name)      # in any process, cv2.VideoCapture-like
+#   ret, frame = cap.read()
+#
+#   python3 framebus.py --name cam0 --serve   # publish the camera until ^C, lanes use bus:cam0
+import time
+import numpy as np
+import multiprocessing as mp
+from multiprocessing import shared_memory
+
+MAGIC = 0x46425553  # 'FBUS'
+HEADER = 8
+# header fields
+_MAGIC, _LATEST, _SLOTS, _H, _W, _C = range(6)
+
+
+# buses attached by this process; a reader's mapping stays until the process exits,
+# because frames handed out by read() are views into it
+_attached = {}
+
+
+def _attach(name):
+    # attach without letting this process's resource tracker unlink the block on exit
+    if name in _attached:
+        return _attached[name]
+    try:
+        shm = shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name)
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, 'shared_memory')
+    _attached[name] = shm
+    return shm
+
+
+class FrameBus:
+
+    def __init__(self, name=None, shape=None, slots=8):
+        # shape given: create a new bus (writer side); otherwise attach to `name`
+        if shape is not None:
+            h, w = shape[:2]
+            c = shape[2] if len(shape) > 2 else 1
+            size = 8 * HEADER + 16 * slots + slots * h * w * c
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+            self.owner = True
+        else:
+            self.shm = _attach(name)
+            self.owner = False
+        self.name = self.shm.name
+        self.header = np.ndarray((HEADER,), np.int64, self.shm.buf, 0)
+        if self.owner:
+            self.header[:] = (MAGIC, -1, slots, h, w, c, 0, 0)
+        elif self.header[_MAGIC] != MAGIC:
+            raise ValueError('%s is not a frame bus' % name)
+        self.slots, h, w, c = (int(v) for v in self.header[_SLOTS:_C + 1])
+        self.shape = (h, w, c) if c > 1 else (h, w)
+        offset = 8 * HEADER
+        self.seqs = np.ndarray((self.slots,), np.int64, self.shm.buf, offset)
+        self.times = np.ndarray((self.slots,), np.float64, self.shm.buf, offset + 8 * self.slots)
+        self.frames = np.ndarray((self.slots,) + self.shape, np.uint8, self.shm.buf, offset + 16 * self.slots)
+        if self.owner:
+            self.seqs[:] = -1
+
+    # ---------------------------------------- WRITER ----------------------------------------
+
+    def begin(self):
+        # (seq, buffer) of the next frame; fill the buffer (e.g. cap.read(buffer)), then commit(seq)
+        seq = int(self.header[_LATEST]) + 1
+        self.seqs[seq % self.slots] = -1
+        return seq, self.frames[seq % self.slots]
+
+    def commit(self, seq, timestamp=None):
+        slot = seq % self.slots
+        self.times[slot] = time.time() if timestamp is None else timestamp
+        self.seqs[slot] = seq
+        self.header[_LATEST] = seq
+
+    def publish(self, frame, timestamp=None):
+        seq, buf = self.begin()
+        buf[...] = frame
+        self.commit(seq, timestamp)
+        return seq
+
+    # ---------------------------------------- READER ----------------------------------------
+
+    def latest(self):
+        return int(self.header[_LATEST])
+
+    def get(self, seq):
+        # (timestamp, view) of frame seq, or None if it is not (or no longer) in the ring
+        slot = seq % self.slots
+        if seq < 0 or self.seqs[slot] != seq:
+            return None
+        ts = float(self.times[slot])
+        view = self.frames[slot]
+        return (ts, view) if self.seqs[slot] == seq else None
+
+    def fresh(self, seq):
+        # frame seq has not been overwritten since it was read
+        return self.seqs[seq % self.slots] == seq
+
+    def close(self):
+        self.header = self.seqs = self.times = self.frames = None
+        if self.owner:
+            self.shm.close()
+            self.shm.unlink()
+
+
+class BusCapture:
+    # cv2.VideoCapture-like reader: read() returns the next frame not seen yet
+    # (frames the reader was too slow for are skipped and counted in dropped).
+    # The frame is copied out and checked not to have been overwritten meanwhile;
+    # copy=False hands out the slot itself, valid while self.bus.fresh(self.last)
+
+    def __init__(self, name, timeout=2.0, copy=True):
+        self.bus = FrameBus(name)
+        self.timeout = timeout
+        self.copy = copy
+        self.last = -1
+        self.timestamp = None
+        self.dropped = 0
+
+    def isOpened(self):
+        return self.bus is not None
+
+    def read(self, image=None):
+        deadline = time.time() + self.timeout
+        while True:
+            seq = self.bus.latest()
+            if seq > self.last:
+                got = self.bus.get(seq)
+                if got is not None:
+                    timestamp, frame = got
+                    if image is not None:
+                        image[...] = frame
+                        frame = image
+                    elif self.copy:
+                        frame = frame.copy()
+                    # the writer may have lapped the ring while the slot was copied
+                    if (image is None and not self.copy) or self.bus.fresh(seq):
+                        break
+            if time.time() > deadline:
+                return False, None
+            time.sleep(0.001)
+        if self.last >= 0:
+            self.dropped += seq - self.last - 1
+        self.last = seq
+        self.timestamp = timestamp
+        return True, frame
+
+    def release(self):
+        if self.bus is not None:
+            self.bus.close()
+            self.bus = None
+
+
+def openCapture(source, **kwargs):
+    # camera number / video file -> cv2.VideoCapture, 'bus:NAME' -> BusCapture
+    if isinstance(source, str) and source.startswith('bus:'):
+        return BusCapture(source[4:], **kwargs)
+    import cv2
+    return cv2.VideoCapture(source)
+
+
+def _captureLoop(source, name, slots, ready, stop):
+    import cv2
+    cap = cv2.VideoCapture(source)
+    ret, frame = cap.read()
+    if not ret:
+        ready.put(None)
+        return
+    bus = FrameBus(name, frame.shape, slots)
+    bus.publish(frame)
+    ready.put((bus.name, frame.shape))
+    try:
+        while not stop.is_set():
+            seq, buf = bus.begin()
+            # decode straight into the slot
+            ret, image = cap.read(buf)
+            if not ret:
+                break
+            if not np.shares_memory(image, buf):
+                buf[...] = image
+            bus.commit(seq)
+    finally:
+        cap.release()
+        bus.close()
+
+
+class Capture:
+    # capture process publishing a camera / video file on a frame bus
+
+    def __init__(self, process, name, shape, stop):
+        self.process = process
+        self.name = name
+        self.shape = shape
+        self._stop = stop
+
+    def stop(self):
+        self._stop.set()
+        self.process.join()
+
+
+def startCapture(source, name=None, slots=8, timeout=10.0):
+    ready = mp.Queue()
+    stop = mp.Event()
+    process = mp.Process(target=_captureLoop, args=(source, name, slots, ready, stop), daemon=True)
+    process.start()
+    info = ready.get(timeout=timeout)
+    if info is None:
+        process.join()
+        raise RuntimeError('cannot read from %r' % (source,))
+    return Capture(process, info[0], info[1], stop)
+
+
+# ---------------------------------------- CONSUMERS ----------------------------------------
+
+def record(name, path, fps=30.0, frames=None):
+    # write the bus to a video file (e.g. for orchestrator.py --feed)
+    import cv2
+    cap = BusCapture(name)
+    writer = None
+    n = 0
+    while frames is None or n < frames:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        if writer is None:
+            h, w = frame.shape[:2]
+            writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), fps, (w, h), frame.ndim == 3)
+        writer.write(frame)
+        n += 1
+    if writer is not None:
+        writer.release()
+    cap.release()
+    return n
+
+
+def _consume(kind, name, seconds, out):
+    import cv2
+    cap = BusCapture(name)
+    n = 0
+    start = time.time()
+    while time.time() - start < seconds:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        if kind == 'contours':
+            from image import findContours
+            findContours(gray)
+        elif kind == 'qrcode':
+            try:
+                from pyzbar.pyzbar import decode
+                decode(gray)
+            except ImportError:
+                cv2.QRCodeDetector().detectAndDecode(gray)
+        n += 1
+    out.put((kind, n, cap.dropped))
+    cap.release()
+
+
+if __name__ == "__main__":
+
+    # capture once, run the contour detector and the QR decoder side by side
+    import argparse
+    from param import camera_index
+    parser = argparse.ArgumentParser(description='frame bus demo: one capture, parallel consumers')
+    parser.add_argument('--source', default=camera_index, help='camera number or video file')
+    parser.add_argument('--name', default=None, help='bus name (readers open bus:NAME), random by default')
+    parser.add_argument('--serve', action='store_true', help='only publish the feed, until ^C')
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--record', metavar='FILE', help='also record the feed to FILE')
+    args = parser.parse_args()
+    source = int(args.source) if str(args.source).isdigit() else args.source
+
+    capture = startCapture(source, name=args.name)
+    print('bus %s, frames %s' % (capture.name, capture.shape))
+    if args.serve:
+        print('camera_index "bus:%s" in a lane config reads it' % capture.name)
+        try:
+            capture.process.join()
+        except KeyboardInterrupt:
+            pass
+        capture.stop()
+        raise SystemExit
+    out = mp.Queue()
+    consumers = [mp.Process(target=_consume, args=(kind, capture.name, args.seconds, out))
+                 for kind in ('contours', 'qrcode')]
+    if args.record:
+        consumers.append(mp.Process(target=record, args=(capture.name, args.record)))
+    for c in consumers:
+        c.start()
+    for _ in range(2):
+        kind, n, dropped = out.get()
+        print('%-10s %5d frames  %.1f fps  %d skipped' % (kind, n, n / args.seconds, dropped))
+    capture.stop()
+    for c in consumers:
+        c.join()
@@ -0,0 +1,152 @@
+# Temporal fusion of the tabletop detections.
+# Instead of one thresholded frame, take_pictures' measurements of a short window of
+# frames are tracked per object (stable ids, nearest centroid) and combined robustly:
+# median centroid and minAreaRect size, and the median of the principal angle around
+# its circular mean (the angle is an axis, i.e. modulo 180 deg). Every object gets a
+# confidence in [0, 1] from how often it was seen in the window and how much its
+# centroid and angle spread (shown in the preview, confident ones in green).
+import math
+from collections import deque
+import numpy as np
+import cv2
+from scene import measureRegion
+from image import pixelRatio
+from param import camera_index, calibration_dir, fusion_window, fusion_centroid_tol, fusion_angle_tol, \
+    fusion_min_seen, fusion_confident
+from framebus import openCapture
+import prompt
+
+
+def _wrapAxis(angle):
+    # deg -> (-90, 90]
+    angle = (angle + 90.0) % 180.0 - 90.0
+    return 90.0 if angle == -90.0 else angle
+
+
+def axisMedian(angles):
+    # robust mean of axis angles (deg): median of the offsets from the circular mean
+    a = np.radians(np.asarray(angles, dtype=float)) * 2
+    mean = math.degrees(math.atan2(np.sin(a).mean(), np.cos(a).mean())) / 2
+    diff = (np.asarray(angles, dtype=float) - mean + 90.0) % 180.0 - 90.0
+    return _wrapAxis(mean + np.median(diff)), float(np.median(np.abs(diff - np.median(diff))))
+
+
+class Track:
+    __slots__ = ('id', 'obs', 'last')
+
+    def __init__(self, track_id, window):
+        self.id = track_id
+        # (frame, centroid, angle, (long, short) side, box)
+        self.obs = deque(maxlen=window)
+        self.last = -1
+
+
+class FusionTracker:
+
+    def __init__(self, window=fusion_window, match_dist=30, pixel2mm=None, calib_dir=calibration_dir):
+        # match_dist: largest centroid jump (px) between frames of one object
+        self.window = window
+        self.match_dist = match_dist
+        self.pixel2mm = pixelRatio(calib_dir) if pixel2mm is None else pixel2mm
+        self.tracks = {}
+        self.next_id = 0
+        self.frame = 0
+
+    def reset(self):
+        self.tracks = {}
+        self.frame = 0
+
+    def add(self, objects):
+        # one frame of scene.SceneObject measurements
+        free = dict(self.tracks)
+        for obj in objects:
+            best, best_dist = None, self.match_dist
+            for track in free.values():
+                c = track.obs[-1][1]
+                d = math.hypot(obj.centroid[0] - c[0], obj.centroid[1] - c[1])
+                if d < best_dist:
+                    best, best_dist = track, d
+            if best is None:
+                best = self.tracks[self.next_id] = Track(self.next_id, self.window)
+                self.next_id += 1
+            else:
+                del free[best.id]
+            best.obs.append((self.frame, np.asarray(obj.centroid, dtype=float), obj.angle,
+                             (max(obj.length), min(obj.length)), obj.box))
+            best.last = self.frame
+        # forget objects gone for a whole window
+        for track_id in [t.id for t in self.tracks.values() if self.frame - t.last >= self.window]:
+            del self.tracks[track_id]
+        self.frame += 1
+
+    def fused(self, track):
+        # (centroid px, angle deg, box, side lengths mm, confidence) of one track
+        recent = [o for o in track.obs if o[0] > self.frame - 1 - self.window]
+        frames = min(self.window, self.frame)
+        seen = len(recent) / float(max(frames, 1))
+        cs = np.array([o[1] for o in recent])
+        centroid = np.median(cs, axis=0)
+        spread = np.median(np.hypot(*(cs - centroid).T)) * self.pixel2mm
+        angle, angle_spread = axisMedian([o[2] for o in recent])
+        length = np.median(np.array([o[3] for o in recent]), axis=0)
+        box = recent[int(np.argmin(np.hypot(*(cs - centroid).T)))][4]
+        confidence = seen * max(0.0, 1 - spread / fusion_centroid_tol) * max(0.0, 1 - angle_spread / fusion_angle_tol)
+        return centroid, angle, box, length * self.pixel2mm, confidence, seen
+
+    def results(self):
+        # same lists as take_pictures plus the confidence, objects seen in at least
+        # fusion_min_seen of the window, in id order
+        mc, angle, box, actual, confidence = [], [], [], [], []
+        for track_id in sorted(self.tracks):
+            c, a, b, l, conf, seen = self.fused(self.tracks[track_id])
+            if seen < fusion_min_seen:
+                continue
+            mc.append(c); angle.append(a); box.append(b); actual.append(l); confidence.append(conf)
+        return mc, angle, box, actual, confidence
+
+
+def fusedPictures(camera_index=camera_index, calib_dir=calibration_dir, frames=fusion_window):
+    # take_pictures over `frames` frames: (mc, principal_angle, bounding_boxes,
+    # actual_length_of_boxes, confidence)
+    cap = openCapture(camera_index)
+    tracker = FusionTracker(frames, calib_dir=calib_dir)
+    try:
+        while True:
+            tracker.reset()
+            gray = None
+            for _ in range(frames):
+                ret, image = cap.read()
+                if not ret:
+                    continue
+                gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+                tracker.add(measureRegion(gray, calib_dir=calib_dir))
+            result = tracker.results()
+            for i, (c, a, conf) in enumerate(zip(result[0], result[1], result[4])):
+                print(i, a, c, "confidence {:.2f}".format(conf))
+            if not prompt.display or gray is None:
+                return result
+            drawing = cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
+            for c, a, b, conf in zip(result[0], result[1], result[2], result[4]):
+                color = (0, 255, 0) if conf >= fusion_confident else (0, 0, 255)
+                cv2.drawContours(drawing, [np.int32(b)], 0, color, 2)
+                d = 100 * np.array([math.cos(math.radians(a)), math.sin(math.radians(a))])
+                cv2.line(drawing, tuple(np.int32(c - d)), tuple(np.int32(c + d)), color)
+                cv2.putText(drawing, '%.2f' % conf, tuple(np.int32(c)), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color)
+            cv2.imshow('Contours', drawing)
+            if cv2.waitKey() == ord('q'):
+                cv2.destroyWindow('Contours')
+                return result
+    finally:
+        cap.release()
+
+
+if __name__ == "__main__":
+
+    # fused detections of the camera / a video file
+    import argparse
+    parser = argparse.ArgumentParser(description='multi-frame fused tabletop detections')
+    parser.add_argument('--source', default=camera_index, help='camera number, video file or bus:NAME')
+    parser.add_argument('--frames', type=int, default=fusion_window)
+    args = parser.parse_args()
+    source = int(args.source) if str(args.source).isdigit() else args.source
+    fusedPictures(source, frames=args.frames)
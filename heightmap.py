@@ -0,0 +1,138 @@
+# Height map of a container: the top surface seen from above on a 2D grid of
+# resolution x resolution mm cells. Placement queries ("how low can this footprint
+# go", "where is the best spot for this box") are answered for every position at
+# once with sliding-window maxima and summed-area tables.
+import numpy as np
+import math
+
+
+def _slidingMax(a, k, axis):
+    # max over every window of k cells along axis, by doubling the window size
+    a = np.moveaxis(a, axis, 0)
+    n = a.shape[0]
+    m = a
+    span = 1
+    while 2 * span <= k:
+        m = np.maximum(m[:-span], m[span:])
+        span *= 2
+    if span < k:
+        m = np.maximum(m[:n - k + 1], m[k - span:k - span + n - k + 1])
+    return np.moveaxis(m, 0, axis)
+
+
+def windowMax(a, kx, ky):
+    return _slidingMax(_slidingMax(a, kx, 0), ky, 1)
+
+
+def summedArea(a):
+    # sat[i, j] = a[:i, :j].sum()
+    sat = np.zeros((a.shape[0] + 1, a.shape[1] + 1))
+    sat[1:, 1:] = a.cumsum(axis=0).cumsum(axis=1)
+    return sat
+
+
+def windowSum(sat, kx, ky):
+    return sat[kx:, ky:] - sat[:-kx, ky:] - sat[kx:, :-ky] + sat[:-kx, :-ky]
+
+
+class HeightMap:
+    # heights: top surface (mm) of each cell, fragile: a fragile item is somewhere in the column
+
+    def __init__(self, container_size, resolution=1.0):
+        self.container_size = [float(c) for c in container_size]
+        self.resolution = float(resolution)
+        shape = (int(self.container_size[0] // resolution), int(self.container_size[1] // resolution))
+        self.heights = np.zeros(shape)
+        self.fragile = np.zeros(shape, dtype=bool)
+
+    @classmethod
+    def fromBoxes(cls, container_size, lo, hi, fragility=None, resolution=1.0):
+        hmap = cls(container_size, resolution)
+        for i in np.argsort(hi[:, 2]):
+            hmap.place(lo[i, 0], lo[i, 1], hi[i] - lo[i], lo[i, 2],
+                       fragile=fragility is not None and fragility[i] > 0)
+        return hmap
+
+    def cells(self, length):
+        # cells covered by a length starting on a cell boundary (rounded up, so never optimistic)
+        return max(int(math.ceil(length / self.resolution - 1e-9)), 1)
+
+    def _window(self, x, y, ext):
+        i, j = int(round(x / self.resolution)), int(round(y / self.resolution))
+        return slice(i, i + self.cells(ext[0])), slice(j, j + self.cells(ext[1]))
+
+    def lowestZ(self, x, y, ext):
+        # z a box of extent ext would rest at with its corner at (x, y)
+        sx, sy = self._window(x, y, ext)
+        return float(self.heights[sx, sy].max())
+
+    def place(self, x, y, ext, z=None, fragile=False):
+        sx, sy = self._window(x, y, ext)
+        if z is None:
+            z = float(self.heights[sx, sy].max())
+        self.heights[sx, sy] = z + ext[2]
+        if fragile:
+            self.fragile[sx, sy] = True
+        return z
+
+    def top(self):
+        return float(self.heights.max())
+
+    def candidates(self, ext, min_support=0.0, heavy=False, tol=0.5):
+        # z and support fraction for the corner at every cell (i, j) the footprint fits from,
+        # and the mask of feasible corners
+        kx, ky = self.cells(ext[0]), self.cells(ext[1])
+        nx = int((self.container_size[0] - ext[0]) // self.resolution + 1e-9) + 1
+        ny = int((self.container_size[1] - ext[1]) // self.resolution + 1e-9) + 1
+        nx = min(nx, self.heights.shape[0] - kx + 1)
+        ny = min(ny, self.heights.shape[1] - ky + 1)
+        if nx <= 0 or ny <= 0:
+            return None
+        z = windowMax(self.heights, kx, ky)[:nx, :ny]
+        feasible = z + ext[2] <= self.container_size[2] + 1e-6
+        # support: share of the footprint at the resting height, counted with one
+        # summed-area table per distinct height in the map
+        support = np.ones_like(z)
+        if min_support > 0:
+            for level in np.unique(z[z > tol]):
+                at = np.abs(z - level) < 1e-9
+                sat = summedArea(np.abs(self.heights - level) < tol)
+                support[at] = windowSum(sat, kx, ky)[:nx, :ny][at] / float(kx * ky)
+            feasible &= support >= min_support - 1e-9
+        if heavy:
+            feasible &= windowSum(summedArea(self.fragile), kx, ky)[:nx, :ny] < 0.5
+        return z, support, feasible
+
+    def bestPosition(self, ext, min_support=0.0, heavy=False):
+        # (x, y, z) keeping the top lowest, then the bottom, then back-left; None if nothing fits
+        result = self.candidates(ext, min_support, heavy)
+        if result is None:
+            return None
+        z, _, feasible = result
+        if not feasible.any():
+            return None
+        i, j = np.nonzero(feasible)
+        zs = z[i, j]
+        k = np.lexsort((i, j, zs))[0]
+        return i[k] * self.resolution, j[k] * self.resolution, float(zs[k])
+
+
+if __name__ == "__main__":
+
+    # timing: fill a container with random boxes, one bestPosition query each
+    import time
+    rng = np.random.default_rng(0)
+    for resolution in [5.0, 2.0, 1.0]:
+        hmap = HeightMap([150, 95, 400], resolution)
+        start = time.time()
+        n = 0
+        for _ in range(40):
+            ext = rng.choice([20, 30, 40, 50], 3).astype(float)
+            pos = hmap.bestPosition(ext, min_support=0.6)
+            if pos is None:
+                continue
+            hmap.place(pos[0], pos[1], ext, pos[2])
+            n += 1
+        elapsed = time.time() - start
+        print('%.0f mm cells: %d boxes, top %.0f mm, %.2f ms / box' % (resolution, n, hmap.top(),
+                                                                       elapsed * 1000 / 40))
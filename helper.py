@@ -1,7 +1,19 @@
-import pandas as pd
+from functools import lru_cache
+from param import catalog_path
 
 
-def GetSizeBySN(SN):
-    df = pd.read_csv("./obj_data/obj_info.csv")
-    edges = df.iloc[SN - 1][1:4].to_numpy()
-    return edges
\ No newline at end of file
+@lru_cache(maxsize=None)
+def catalog(path=catalog_path):
+    # compiled catalog (catalog.py), opened once per process with mmap
+    from catalog import openCatalog
+    return openCatalog(path)
+
+
+def GetSizeBySN(SN, path=catalog_path):
+    edges = catalog(path).size(SN)
+    return edges
+
+
+def GetAttrBySN(SN, path=catalog_path):
+    # (weight, fragility)
+    return catalog(path).attrs(SN)
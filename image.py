@@ -1,71 +1,107 @@
+import os
 import numpy as np
 import cv2
 import math
+from functools import lru_cache
+from intrinsics import loadLens, undistortContours
+from param import camera_index, calibration_dir
+import prompt
+from framebus import openCapture
 
-ratio = np.load('./calibration_data/pixel2mm.npy')
 
-camera_index = 2
+# calibration files are read on first use, not when the module is imported
+
+@lru_cache(maxsize=None)
+def pixelRatio(calib_dir=calibration_dir):
+    return np.load(os.path.join(calib_dir, 'pixel2mm.npy'))
+
+
+@lru_cache(maxsize=None)
+def imageToActualMatrix(calib_dir=calibration_dir):
+    return np.load(os.path.join(calib_dir, 'img2actual.npy'))
+
+
+@lru_cache(maxsize=None)
+def lensModel(calib_dir=calibration_dir):
+    # camera matrix and distortion coefficients from intrinsics.py (None if not calibrated)
+    return loadLens(calib_dir)
 
 
 def distance (x, y, a, b):
     return np.sqrt((x - a) ** 2 + (y-b)**2)
 
 
-def take_pictures():
-    cap = cv2.VideoCapture(camera_index)
+def findContours(gray, offset=(0, 0), calib_dir=calibration_dir):
+    # blur, threshold, edges and contours of a grayscale image (or a crop of it;
+    # offset shifts the contour points back to full-frame coordinates)
+    gray = cv2.GaussianBlur(gray, (5, 5), 0)
+    cv2.threshold(gray, 150, 255, cv2.THRESH_BINARY, gray)
+    edges = cv2.Canny(gray, 100, 200)
+    contours, _ = cv2.findContours(edges, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE, offset=offset)
+
+    # Filter out small contours
+    contours_filtered = []
+    for i in contours:
+        if len(i) > 20:
+            contours_filtered.append(i)
+    return edges, undistortContours(contours_filtered, lensModel(calib_dir))
+
+
+def uniqueObjects(contours_filtered):
+    # moments and mass centers, dropping contours whose centroid is within 30px of one kept before
+    mu_filtered = []
+    mc_filtered = []
+    contours_filterered = []
+    for contour in contours_filtered:
+        if cv2.arcLength(contour, True) < 20:
+            continue
+        mu = cv2.moments(contour)
+        # add 1e-5 to avoid division by zero
+        mc = (mu['m10'] / (mu['m00'] + 1e-5), mu['m01'] / (mu['m00'] + 1e-5))
+        pushable = True
+        for kept in mc_filtered:
+            if distance(mc[0], mc[1], kept[0], kept[1]) < 30:
+                pushable = False
+                break
+        if pushable:
+            contours_filterered.append(contour)
+            mu_filtered.append(mu)
+            mc_filtered.append(mc)
+    return contours_filterered, mu_filtered, mc_filtered
+
+
+def principalAngle(mu):
+    # principal axis angle (rad) from the image moments
+    num = 2 * (mu['m00'] * mu['m11'] - mu['m10'] * mu['m01'])
+    denom = ((mu['m00'] * mu['m20'] - mu['m10'] * mu['m10']) - (mu['m00'] * mu['m02'] - mu['m01'] * mu['m01']))
+    P_angle = 0.5 * math.atan2(num, denom)
+    if P_angle > math.pi / 2:
+        P_angle -= math.pi
+    return P_angle
+
+
+def boxLength(contour):
+    # minAreaRect corners and the two side lengths in px
+    bound_4 = cv2.boxPoints(cv2.minAreaRect(contour))
+    bound_4_len = np.linalg.norm(bound_4[0] - bound_4[1]), np.linalg.norm(bound_4[1] - bound_4[2])
+    return bound_4, bound_4_len
+
+
+def take_pictures(camera_index=camera_index, calib_dir=calibration_dir):
+    cap = openCapture(camera_index)
 
     while 1:
         # Capture frame-by-frame
         ret, image = cap.read()
         gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
 
-        cv2.imshow('raw', gray)
-        gray = cv2.GaussianBlur(gray, (5, 5), 0)
-        cv2.threshold(gray, 150, 255, cv2.THRESH_BINARY, gray)
-        done = cv2.morphologyEx(gray, cv2.MORPH_OPEN, cv2.getStructuringElement(cv2.MORPH_RECT,(5,5)))
-        edges = cv2.Canny(gray, 100, 200)
-
-        # Display the resulting frame
-        contours, _ = cv2.findContours(edges, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
-        contours_filtered = []
-
-        # Filter out large contours
-        for i in contours:
-            if len(i) > 20:
-                contours_filtered.append(i)
-
-        mu = [None]*len(contours_filtered)
-        mc = [None]*len(contours_filtered)
-
-        # Moments
-        for i in range(len(contours_filtered)):
-            mu[i] = cv2.moments(contours_filtered[i])
-
-        # Get the mass centers
-        for i in range(len(contours_filtered)):
-            if cv2.arcLength(contours_filtered[i], True) < 20:
-                continue
-            # add 1e-5 to avoid division by zero
-            mc[i] = (mu[i]['m10'] / (mu[i]['m00'] + 1e-5), mu[i]['m01'] / (mu[i]['m00'] + 1e-5))
-
+        if prompt.display:
+            cv2.imshow('raw', gray)
+        edges, contours_filtered = findContours(gray, calib_dir=calib_dir)
 
         # Check duplicates
         # Filter moments and centroids
-        mu_filtered = []
-        mc_filtered = []
-        contours_filterered = []
-
-        for i in range(len(contours_filtered)):
-            pushable = True
-            for j in range(len(contours_filterered)):
-                if distance(mc[i][0], mc[i][1], mc_filtered[j][0], mc_filtered[j][1]) < 30:
-                    pushable = False
-                    break
-            if pushable:
-                contours_filterered.append(contours_filtered[i])
-                mu_filtered.append(mu[i])
-                mc_filtered.append(mc[i])
-
+        contours_filterered, mu_filtered, mc_filtered = uniqueObjects(contours_filtered)
 
         drawing = np.zeros((edges.shape[0],edges.shape[1], 3), dtype=np.uint8)
         principal_angle = []
@@ -74,26 +110,18 @@ def take_pictures():
         for i in range(len(contours_filterered)):
             # Draw contours
             color = (np.random.randint(0,256), np.random.randint(0,256), np.random.randint(0,256))
-            cv2.drawContours(drawing, contours_filterered, i, color, 2)
-            bound_rect = cv2.minAreaRect(contours_filterered[i])
-            
-            bound_4 = cv2.boxPoints(bound_rect)
-            bound_4_len = np.linalg.norm(bound_4[0] - bound_4[1]), np.linalg.norm(bound_4[1] - bound_4[2])
+            cv2.drawContours(drawing, [contours_filterered[i].astype(np.int32)], 0, color, 2)
+            bound_4, bound_4_len = boxLength(contours_filterered[i])
             bounding_boxes.append(bound_4)
             print(bound_4)
-            actual_bound = bound_4_len * ratio
+            actual_bound = bound_4_len * pixelRatio(calib_dir)
             actual_legnth_of_boxes.append(actual_bound)
             print("length of bounding box: ", bound_4_len)
             print("actual length: ", actual_bound)
 
             cv2.circle(drawing, (int(mc_filtered[i][0]), int(mc_filtered[i][1])), 4, color, -1)
             # Principal angle
-            num = 2 * (mu_filtered[i]['m00'] * mu_filtered[i]['m11'] -mu_filtered[i]['m10'] *mu_filtered[i]['m01'])
-            denom = ((mu_filtered[i]['m00'] *mu_filtered[i]['m20'] -mu_filtered[i]['m10'] *mu_filtered[i]['m10']) - (mu_filtered[i]['m00'] *mu_filtered[i]['m02'] -mu_filtered[i]['m01'] *mu_filtered[i]['m01']))
-            P_angle = 0.5 * math.atan2( num, denom)
-
-            if P_angle > math.pi/ 2:
-                P_angle -= math.pi
+            P_angle = principalAngle(mu_filtered[i])
             m = math.tan(P_angle)
 
             x1 = mc_filtered[i][0] + 100
@@ -109,6 +137,9 @@ def take_pictures():
             print(i, P_angle * 180 / math.pi , mc_filtered[i])
             
             
+        if not prompt.display:
+            # unattended: the first frame is the picture
+            return mc_filtered, principal_angle, bounding_boxes, actual_legnth_of_boxes
         cv2.imshow('Contours', drawing)
         if cv2.waitKey() == ord('q'):
             cv2.destroyWindow('raw')
@@ -140,6 +171,16 @@ def mapping(act, image):
 # 382.30029
 # -177.4168
 
+def imageToActual(A, img_pos):
+    # pixel -> arm coordinates (mm) with img2actual, affine or homography;
+    # img_pos is a single (u, v) or an (n, 2) array
+    img_pos = np.asarray(img_pos, dtype=float)
+    pts = np.atleast_2d(img_pos)
+    p = np.matmul(np.asarray(A, dtype=float), np.vstack([pts.T, np.ones(len(pts))]))
+    p = (p[:2] / p[2]).T
+    return p[0] if img_pos.ndim == 1 else p
+
+
 def find_grabbing(p, e1, e2):
     v1 = [e1[0][0] - e1[1][0], e1[0][1] - e1[1][1]]
     v2 = [e2[0][0] - e2[1][0], e2[0][1] - e2[1][1]]
@@ -0,0 +1,54 @@
+# Import time benchmark: every module is imported in a fresh interpreter, so the
+# numbers include everything it pulls in. Run before / after touching imports.
+#   python3 importtime.py [module ...] [--repeat N]
+import sys
+import time
+import argparse
+import subprocess
+
+modules = ['pose', 'param', 'helper', 'connect', 'stacking', 'heightmap', 'validate', 'packing_greedy',
+           'packing_gurobi', 'packing_multi', 'portfolio', 'intrinsics', 'image', 'scene', 'tracker',
+           'detect', 'trace', 'calibration', 'visualize', 'main', 'checkout']
+
+
+def importTime(module, repeat=3):
+    # best wall time (ms) of `import module` in a new interpreter, minus the
+    # interpreter start-up; None if the module cannot be imported here
+    def run(code):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, '-c', code], capture_output=True)
+        return time.perf_counter() - start, result.returncode
+
+    base = min(run('pass')[0] for _ in range(repeat))
+    best = None
+    for _ in range(repeat):
+        elapsed, code = run('import ' + module)
+        if code != 0:
+            return None
+        best = elapsed if best is None else min(best, elapsed)
+    return (best - base) * 1000
+
+
+def heavyImports(module):
+    # third-party packages loaded by importing module
+    code = ('import sys; before = set(sys.modules); import %s; '
+            'print(" ".join(sorted(m for m in set(sys.modules) - before '
+            'if m.split(".")[0] in ("cv2", "pandas", "gurobipy", "matplotlib", "pyzbar", "PIL") '
+            'and "." not in m)))' % module)
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True)
+    return result.stdout.strip() if result.returncode == 0 else ''
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description='import time of each module')
+    parser.add_argument('modules', nargs='*', default=modules)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    for module in args.modules:
+        ms = importTime(module, args.repeat)
+        if ms is None:
+            print('%-16s   not importable here' % module)
+        else:
+            print('%-16s %8.1f ms   %s' % (module, ms, heavyImports(module)))
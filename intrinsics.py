@@ -0,0 +1,92 @@
+# Camera intrinsics / lens distortion from recorded checkerboard frames.
+# Saves camera_matrix.npy, dist_coeffs.npy and the cv2.initUndistortRectifyMap
+# tables (undistort_map_x.npy, undistort_map_y.npy) into calibration_data.
+# The detector only undistorts the contour points it extracts (see image.py);
+# the full-frame tables are for display / recording.
+import os
+import glob
+import argparse
+import numpy as np
+import cv2
+
+calib_dir = './calibration_data'
+
+
+def findCorners(filenames, pattern):
+    # pattern: inner corners per row and column of the checkerboard
+    objp = np.zeros((pattern[0] * pattern[1], 3), np.float32)
+    objp[:, :2] = np.mgrid[0:pattern[0], 0:pattern[1]].T.reshape(-1, 2)
+    criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.001)
+
+    obj_points, img_points, size = [], [], None
+    for f in filenames:
+        gray = cv2.cvtColor(cv2.imread(f), cv2.COLOR_BGR2GRAY)
+        size = gray.shape[::-1]
+        found, corners = cv2.findChessboardCorners(gray, pattern, None)
+        print(f, 'found' if found else 'no board')
+        if found:
+            corners = cv2.cornerSubPix(gray, corners, (11, 11), (-1, -1), criteria)
+            obj_points.append(objp)
+            img_points.append(corners)
+    return obj_points, img_points, size
+
+
+def calibrate(filenames, pattern):
+    obj_points, img_points, size = findCorners(filenames, pattern)
+    if len(obj_points) < 3:
+        raise ValueError('need at least 3 frames with the board, got %d' % len(obj_points))
+    rms, K, D, _, _ = cv2.calibrateCamera(obj_points, img_points, size, None, None)
+    print('reprojection rms: %.3f px' % rms)
+    return K, D, size
+
+
+def save(K, D, size):
+    # new camera matrix = K keeps the pixel scale that pixel2mm / img2actual expect
+    map_x, map_y = cv2.initUndistortRectifyMap(K, D, None, K, size, cv2.CV_32FC1)
+    np.save(os.path.join(calib_dir, 'camera_matrix.npy'), K)
+    np.save(os.path.join(calib_dir, 'dist_coeffs.npy'), D)
+    np.save(os.path.join(calib_dir, 'undistort_map_x.npy'), map_x)
+    np.save(os.path.join(calib_dir, 'undistort_map_y.npy'), map_y)
+    print('camera_matrix: ', K)
+    print('dist_coeffs: ', D.ravel())
+    print('\'%s\' saved' % calib_dir)
+
+
+def loadLens(path=calib_dir):
+    # (camera_matrix, dist_coeffs), or None when the camera was never calibrated
+    K = os.path.join(path, 'camera_matrix.npy')
+    D = os.path.join(path, 'dist_coeffs.npy')
+    if not (os.path.exists(K) and os.path.exists(D)):
+        return None
+    return np.load(K), np.load(D)
+
+
+def undistortContours(contours, lens):
+    # undistort only the extracted contour points, all contours in one call
+    if lens is None or len(contours) == 0:
+        return contours
+    K, D = lens
+    lengths = [len(c) for c in contours]
+    pts = np.concatenate(contours).astype(np.float32)
+    pts = cv2.undistortPoints(pts, K, D, P=K)
+    return np.split(pts, np.cumsum(lengths)[:-1])
+
+
+def undistortFrame(frame, path=calib_dir):
+    # full-frame remap with the saved tables, for display and recordings
+    map_x = np.load(os.path.join(path, 'undistort_map_x.npy'), mmap_mode='r')
+    map_y = np.load(os.path.join(path, 'undistort_map_y.npy'), mmap_mode='r')
+    return cv2.remap(frame, np.asarray(map_x), np.asarray(map_y), cv2.INTER_LINEAR)
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description='lens distortion calibration from checkerboard frames')
+    parser.add_argument('frames', help='directory with the recorded checkerboard frames')
+    parser.add_argument('--pattern', type=int, nargs=2, default=[9, 6], metavar=('COLS', 'ROWS'),
+                        help='inner corners of the board')
+    args = parser.parse_args()
+
+    filenames = sorted(glob.glob(os.path.join(args.frames, '*.png')) + glob.glob(os.path.join(args.frames, '*.jpg')))
+    K, D, size = calibrate(filenames, tuple(args.pattern))
+    save(K, D, size)
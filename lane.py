@@ -0,0 +1,127 @@
+# Lane configuration: one camera, one arm and the calibration, catalog and packing
+# settings that go with them. Loaded once from JSON / YAML, validated, and then
+# passed to the detector, arm client, catalog and packer instead of the globals in
+# param.py, so several lanes can run side by side.
+#
+#   {"name": "lane1", "camera_index": 0, "arm_ip": "169.254.222.243",
+#    "calibration_dir": "./calibration_data/lane1", "container_size": [95, 150, 80]}
+#
+# Keys left out keep the values of param.py.
+import os
+import json
+from dataclasses import dataclass, fields
+import param
+from pose import CartesianPose
+
+
+def _tuples(value):
+    # JSON / YAML lists -> tuples, so the config stays hashable and immutable
+    if isinstance(value, (list, tuple)):
+        return tuple(_tuples(v) for v in value)
+    return value
+
+
+@dataclass(frozen=True)
+class LaneConfig:
+    name: str = 'lane0'
+    # camera device number, a recorded video file to replay, or 'bus:NAME' (framebus.py)
+    camera_index: object = param.camera_index
+    arm_ip: str = param.arm_ip
+    arm_port: int = param.arm_port
+    calibration_dir: str = param.calibration_dir
+    catalog_path: str = param.catalog_path
+    # staging slots (x, y) on the table and the container corner for the arm
+    inter_slots: tuple = _tuples(param.inter_slots)
+    packing_origin: tuple = (param.packing_pose_x, param.packing_pose_y)
+    container_size: tuple = _tuples(param.container_size)
+    container_sizes: tuple = _tuples(param.container_sizes)
+    margin: float = param.margin
+    packing_budget: float = param.packing_budget
+
+    def __post_init__(self):
+        errors = []
+        for f in fields(self):
+            value = getattr(self, f.name)
+            if f.type is str and not isinstance(value, str):
+                errors.append('%s must be a string' % f.name)
+            elif f.type is int and (isinstance(value, bool) or not isinstance(value, int)):
+                errors.append('%s must be an integer' % f.name)
+            elif f.type is float and (isinstance(value, bool) or not isinstance(value, (int, float))):
+                errors.append('%s must be a number' % f.name)
+        if not errors:
+            if isinstance(self.camera_index, bool) or not isinstance(self.camera_index, (int, str)) or \
+                    (isinstance(self.camera_index, int) and self.camera_index < 0):
+                errors.append('camera_index must be a camera number >= 0 or a video file')
+            if not 0 < self.arm_port < 65536:
+                errors.append('arm_port must be in 1..65535')
+            if self.margin < 0:
+                errors.append('margin must be >= 0')
+            if self.packing_budget <= 0:
+                errors.append('packing_budget must be > 0')
+            if not self.inter_slots or not all(_isPoint(p, 2) for p in self.inter_slots):
+                errors.append('inter_slots must be a list of [x, y]')
+            if not _isPoint(self.packing_origin, 2):
+                errors.append('packing_origin must be [x, y]')
+            if not _isSize(self.container_size):
+                errors.append('container_size must be [x, y, z] > 0')
+            if not self.container_sizes or not all(_isSize(c) for c in self.container_sizes):
+                errors.append('container_sizes must be a list of [x, y, z] > 0')
+        if errors:
+            raise ValueError('lane %r: %s' % (self.name, '; '.join(errors)))
+
+    # ---------------------------------------- POSES ----------------------------------------
+
+    def interPoses(self):
+        # (inter_pos, inter_pos_rise) for this lane's staging slots, as in param.py
+        inter_pos = [CartesianPose(x, y, -210, 0, 0, 180) for x, y in self.inter_slots]
+        inter_pos_rise = [CartesianPose(x, y, 0, 0, 0, 180) for x, y in self.inter_slots]
+        return inter_pos, inter_pos_rise
+
+    def packingPose(self):
+        x, y = self.packing_origin
+        return CartesianPose(x, y, *param.packing_pose.values[2:], cmd=param.packing_pose.cmd)
+
+
+def _isPoint(p, n):
+    return isinstance(p, tuple) and len(p) == n and \
+        all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in p)
+
+
+def _isSize(p):
+    return _isPoint(p, 3) and all(v > 0 for v in p)
+
+
+def fromDict(data):
+    known = {f.name for f in fields(LaneConfig)}
+    unknown = sorted(set(data) - known)
+    if unknown:
+        raise ValueError('unknown lane keys: %s' % ', '.join(unknown))
+    return LaneConfig(**{k: _tuples(v) for k, v in data.items()})
+
+
+def loadLane(path):
+    # one lane from a .json / .yaml file (a YAML file needs PyYAML)
+    with open(path) as f:
+        if os.path.splitext(path)[1].lower() in ('.yaml', '.yml'):
+            try:
+                import yaml
+            except ImportError:
+                raise ImportError('PyYAML is needed to read %s, or use a .json lane file' % path)
+            data = yaml.safe_load(f)
+        else:
+            data = json.load(f)
+    if not isinstance(data, dict):
+        raise ValueError('%s: expected a mapping of lane settings' % path)
+    data.setdefault('name', os.path.splitext(os.path.basename(path))[0])
+    return fromDict(data)
+
+
+default_lane = LaneConfig()
+
+
+if __name__ == "__main__":
+
+    import sys
+    lane = loadLane(sys.argv[1]) if len(sys.argv) > 1 else default_lane
+    for f in fields(lane):
+        print('%-16s %s' % (f.name, getattr(lane, f.name)))
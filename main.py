@@ -1,14 +1,30 @@
-import socket
-import sys
+import time
+import argparse
 import numpy as np
-import cv2
-import math
-from image import take_pictures, mapping
+from image import imageToActual, imageToActualMatrix
+from fusion import fusedPictures
 from connect import connect2Arm
-from detect import *
-from trace import *
-from helper import *
-from packing_gurobi import *
+from detect import detect
+from trace import traceRoute, GetReady
+from helper import GetSizeBySN, GetAttrBySN
+from param import inter_pos_general, rise_packing, rise_pose, view_clear_pose, temp_pose, man_pose_J_adj, \
+    open_grip, close_grip, go_home, packing_travel, metrics_port, min_support, motion_select, \
+    push_start, push_back, push_gap
+from lane import loadLane, default_lane
+from packing_multi import packMulti
+from portfolio import solvePortfolio
+from validate import validatePlan, describe
+from pose import CartesianPose, sendCommands, packingTarget
+from tracker import RoiTracker
+from scene import SceneModel
+from prompt import waitForArm
+from motion import MotionSocket
+from speed import SpeedScheduler, planClearance
+from reach import Workspace, carried, placementProblems, posesProblems
+from scan import ScanStats, footprintFaces
+from travel import reduceTravel, planTime, handlingCost, sequencePlan
+import prompt
+import metrics
 
 # json implementation, fast
 # import json
@@ -22,9 +38,6 @@ from packing_gurobi import *
 # print(df['weight'][1]) # 20
 
 
-A = np.load('./calibration_data/img2actual.npy')
-pixel2mm = np.load('./calibration_data/pixel2mm.npy')
-
 number_of_objects = 1
 step_by_step = True
 
@@ -34,212 +47,349 @@ step_by_step = True
 def checkPoint(val):
     if step_by_step:
         print(val)
-        input()
+        waitForArm()
 
 
-if __name__ == "__main__":
-    pixel2mm -= 0.1
-    mc, p_angle, bbox, actual_length_box = take_pictures()
+def recentre(s, tracker, p_hat):
+    # release the object, move out of the camera view and re-measure only
+    # this object's centroid around where it was put down
+    sendCommands(s, open_grip, rise_pose, view_clear_pose)
+    checkPoint("re-centroiding at ({:.1f}, {:.1f})".format(p_hat[0], p_hat[1]))
+    # the arm has to be out of the view before any frame is used: its estimated motion
+    # time, then the tracker waits for the object to be seen at rest
+    s.wait()
+    found = tracker.remeasure(p_hat)
+    if found is not None:
+        (p_hat[0], p_hat[1]), angle = found
+        print("re-centroided to ({:.1f}, {:.1f}), angle {:.1f}".format(p_hat[0], p_hat[1], angle))
+    else:
+        print("re-centroiding not confirmed, kept ({:.1f}, {:.1f})".format(p_hat[0], p_hat[1]))
+    return p_hat
+
+
+def redetect(s, tracker, scene, mc, p_angle, actual_length_box, pending):
+    # after an item left the table: re-detect the items still on it (indices pending) that
+    # lie in a changed part of the frame; only those tiles are segmented again
+    s.wait()
+    tracker.flush()
+    frame = tracker.grab()
+    if frame is None:
+        return
+    scene.update(frame)
+    inside = lambda c, r: r[0] <= c[0] < r[2] and r[1] <= c[1] < r[3]
+    for j in pending:
+        if not any(inside(mc[j], r) for r in scene.last_regions):
+            continue
+        obj = scene.nearest(mc[j])
+        if obj is None:
+            print("item {} not found again, kept at its first detection".format(j))
+            continue
+        mc[j], p_angle[j] = obj.centroid, obj.angle
+        actual_length_box[j] = np.array((max(obj.length), min(obj.length))) * tracker.pixel2mm
+        print("item {} re-detected at {}, angle {:.1f}".format(j, mc[j], p_angle[j]))
+
+
+def packBasket(lane, xs, ys, zs, ws, fs, upright=None, travel=packing_travel):
+    # portfolio of MILP / greedy / local search under the packing_budget latency limit;
+    # returns [(container_size, packing_result), ...], several boxes when the basket does not fit one
+    # upright: per item, None after traceRoute, else the index of the dimension it was picked
+    # upright by (it is put down without GetReady); orientations are chosen with their regrasp time
+    # travel: second stage, same boxes with less staging -> container motion (travel.py)
+    # every box is put in in the placement order of travel.sequencePlan
+    start = time.time()
+    handling = [handlingCost(u) for u in (upright or [None] * len(xs))]
+    def accept(item_info, item_size, container_size):
+        # every placement reachable and lowered in without hitting the walls / packed items
+        return placementProblems(item_info, item_size, container_size, lane.packing_origin,
+                                 tool_z=lane.packingPose().values[2])
+    packing_result, height, strategy = solvePortfolio(lane.container_size, [xs, ys, zs], enlarge=True,
+                                                      budget=lane.packing_budget, margin=lane.margin,
+                                                      weight=ws, fragility=fs, handling=handling, accept=accept)
+    if packing_result is None:
+        # the basket does not fit one box: split it, the boxes are packed one after another;
+        # within what is left of the budget, greedy placement once it is spent
+        boxes = packMulti(lane.container_sizes, [xs, ys, zs], enlarge=True, weight=ws, fragility=fs,
+                          margin=lane.margin, handling=handling,
+                          budget=max(lane.packing_budget - (time.time() - start), 0))
+    else:
+        print("packed by {}, height {:.1f} mm".format(strategy, height))
+        boxes = [(lane.container_size, packing_result)]
+    sizes = [[v + lane.margin for v in xs], [v + lane.margin for v in ys], [v + lane.margin for v in zs]]
+    for k, (container, packing_result) in enumerate(boxes):
+        if travel:
+            before = planTime(packing_result, lane.inter_slots, lane.packing_origin, handling)
+            packing_result, after, conflicts = reduceTravel(packing_result, sizes, container, lane.inter_slots,
+                                                            lane.packing_origin, ws, fs, handling, accept)
+            print("placement motion {:.1f} s -> {:.1f} s".format(before, after))
+        else:
+            packing_result, conflicts = sequencePlan(packing_result, sizes, lane.inter_slots, lane.packing_origin,
+                                                     ws, fs)
+        for i, j in conflicts:
+            print("ORDER CHECK: item {} is in the way of putting in item {} in any order".format(j, i))
+        boxes[k] = (container, packing_result)
+    return boxes
+
+
+# pack = packBasket or anything with the same signature (e.g. a shared packing pool)
+# on_item(seq) is called after each item has been put in its box
+
+def main(lane=default_lane, pack=packBasket, on_item=None):
+    basket_start = time.perf_counter()
+    A = imageToActualMatrix(lane.calibration_dir)
+    inter_pos, inter_pos_rise = lane.interPoses()
+    packing_pose = lane.packingPose()
+    with metrics.timer('detection'):
+        mc, p_angle, bbox, actual_length_box, confidence = fusedPictures(lane.camera_index, lane.calibration_dir)
     print(bbox)
 
-    s = connect2Arm()
+    # the arm starts at home (camera view); move times are estimated, and with motion_select free
+    # moves are sent as PTP or MOVL, whichever is faster
+    for line in posesProblems(inter_pos + inter_pos_rise + [packing_pose]):
+        waitForArm("REACH CHECK: " + line)
+    s = MotionSocket(connect2Arm(lane.arm_ip, lane.arm_port), select=motion_select)
+    speed = SpeedScheduler()
+    # items already put down in the staging slots
+    staged = Workspace()
+    scan_stats = ScanStats(lane=lane.name)
+    tracker = RoiTracker(A, camera_index=lane.camera_index, calib_dir=lane.calibration_dir)
+    # the table as the arm left it: re-detection between items only looks at what changed
+    scene = SceneModel(calib_dir=lane.calibration_dir)
+    s.wait()
+    tracker.flush()
+    frame = tracker.grab()
+    if frame is not None:
+        scene.update(frame)
     inter_pose_register = {}
     xs = []; ys = []; zs = []
+    ws = []; fs = []
+    # dimension each item stands on when it skips traceRoute / GetReady (None otherwise)
+    upright = []
+    # seconds each item took to stage (metrics: item time end to end)
+    staging_time = {}
     number_of_objects = len(mc)
-    isCube = []
     print("Object count: {}".format(number_of_objects))
     for i in range(0, number_of_objects):
+        item_start = time.perf_counter()
         
         # compute the actual position
-        img_p = [[mc[i][0]], [mc[i][1]], [1]]
-        p_hat = np.matmul(A, img_p)
-        p_hat = np.reshape(p_hat, 3)
+        p_hat = imageToActual(A, mc[i])
 
         # move above the target
-        val = 'MOVP ' + str(p_hat[0]) + ' ' + str(p_hat[1]) + ' 0 ' + str(-p_angle[i]) + ' 0 180\n'
+        val = CartesianPose(p_hat[0], p_hat[1], 0, -p_angle[i], 0, 180)
+        for line in posesProblems([val, val.offset(dz=-190)]):
+            waitForArm("REACH CHECK: {}, move the item".format(line))
         checkPoint(val)
-        s.sendall(val.encode('ascii'))
+        sendCommands(s, speed.to('transit') + [val])
         
 
         # move down to reach the target
-        val = 'MOVP ' + str(p_hat[0]) + ' ' + str(p_hat[1]) + ' -190 ' + str(-p_angle[i]) + ' 0 180\n'
+        val = val.offset(dz=-190)
         checkPoint(val)
-        s.sendall(val.encode('ascii'))
-        
-
-        # close the gripper
-        s.sendall(close_grip.encode('ascii'))
+        # close the gripper (the item is not identified yet: fragile until detect says otherwise)
+        sendCommands(s, speed.to('approach', fragility=1) + [val, close_grip])
+        sendCommands(s, speed.to('regrasp', fragility=1))
         
 
-        face, grabbing, SN = detect(i, s, actual_length_box[i])
+        face, grabbing, SN = detect(i, s, actual_length_box[i], lane.camera_index, lane.catalog_path, scan_stats)
         inter_pose_register[i] = SN
-        object_size = GetSizeBySN(SN)
+        object_size = GetSizeBySN(SN, lane.catalog_path)
         xs.append(object_size[0]); ys.append(object_size[1]); zs.append(object_size[2])
+        weight, fragility = GetAttrBySN(SN, lane.catalog_path)
+        ws.append(weight); fs.append(fragility)
         print("face: {} grabbing {}".format(face, grabbing))
         if SN not in [18, 19, 10 , 11]:
-            traceRoute(s,i, SN, face, grabbing)
+            sendCommands(s, speed.to('regrasp', weight, fragility))
+            traceRoute(s,i, SN, face, grabbing, lane.catalog_path)
+            upright.append(None)
+        else:
+            upright.append((2, 0, 1)[int(footprintFaces(object_size, face)[0][0])])
         
         # ==========================================
         # ReCalibrating the centroid of object 
         # with the manipulator
-        val = 'MOVP ' + str(p_hat[0]) + ' ' + str(p_hat[1]) + ' 0 ' + '90 0 180\n'
+        val = CartesianPose(p_hat[0], p_hat[1], 0, 90, 0, 180)
         checkPoint(val)
-        s.sendall(val.encode('ascii'))
+        sendCommands(s, speed.to('approach', weight, fragility) + [val])
          # move down to reach the target
         
-        val = 'MOVP ' + str(p_hat[0]) + ' ' + str(p_hat[1]) + ' -200 ' + '90 0 180\n'
+        val = val.offset(dz=-200)
         checkPoint(val)
         s.sendall(val.encode('ascii'))
-        input()
-        s.sendall(open_grip.encode('ascii'))
-        s.sendall("GOHOME\n".encode('ascii'))
-        s.sendall("MOVJ # # # # # 0\n".encode('ascii'))
-        input("press enter when arm is at home")
-        mc_temp, p_angle__ , bbox__, actual__ = take_pictures()
-
-        for centroid in mc_temp:
-
-            img_p = [[centroid[0]], [centroid[1]], [1]]
-            actual_p = np.matmul(A, img_p)
-            actual_p = np.reshape(actual_p, 3)
-            x = actual_p[0]
-            y = actual_p[1]
-            dist = np.sqrt( (p_hat[0] - x)**2 + (p_hat[1] - y)**2)
-            if dist < 20:
-                p_hat[0] = x
-                p_hat[1] = y
-                break
+        waitForArm()
+        # the fused confidence is from before the pick: the item is re-measured where it was put down
+        print("detection confidence {:.2f}".format(confidence[i]))
+        p_hat = recentre(s, tracker, p_hat)
         # ==========================================
-        val = 'MOVP ' + str(p_hat[0]) + ' ' + str(p_hat[1]) + ' 0 ' + '90 0 180\n'
+        val = CartesianPose(p_hat[0], p_hat[1], 0, 90, 0, 180)
         checkPoint(val)
         s.sendall(val.encode('ascii'))
         
 
         # move down to reach the target
-        val = 'MOVP ' + str(p_hat[0]) + ' ' + str(p_hat[1]) + ' -205 ' + '90 0 180\n'
+        val = val.offset(dz=-205)
         checkPoint(val)
         s.sendall(val.encode('ascii'))
         
 
+        # check the way down into the staging slot against the items already staged
+        slot = inter_pos[i].values[:3]
+        hit = staged.path([inter_pos_rise[i].values[:3], slot], *carried(object_size))
+        if hit is not None:
+            waitForArm("REACH CHECK: staging slot {} hits {}".format(i, hit[1]))
+        staged.add(np.array(slot) - (object_size[0] / 2, object_size[1] / 2, object_size[2]),
+                   np.array(slot) + (object_size[0] / 2, object_size[1] / 2, 0), 'staged item %d' % i)
         # close the gripper
-        s.sendall(close_grip.encode('ascii'))
-        s.sendall(rise_pose.encode('ascii'))
-        s.sendall(inter_pos_rise[i].encode('ascii'))
-        s.sendall(inter_pos[i].encode('ascii'))
-        s.sendall(open_grip.encode('ascii'))
-        s.sendall(inter_pos_rise[i].encode('ascii'))
-        s.sendall("GOHOME\n".encode('ascii'))
+        sendCommands(s, [close_grip] + speed.to('transit', weight, fragility) +
+                     [rise_pose, inter_pos_rise[i], inter_pos[i], open_grip] + speed.to('transit') +
+                     [inter_pos_rise[i], go_home])
+        staging_time[i] = time.perf_counter() - item_start
+        if scene.reference is not None:
+            redetect(s, tracker, scene, mc, p_angle, actual_length_box, range(i + 1, number_of_objects))
 
         
 
-    packing_result = packing(container_size, [xs, ys, zs],True, True)
+    with metrics.timer('packing'):
+        boxes = pack(lane, xs, ys, zs, ws, fs, upright)
+    if len(boxes) == 1 and prompt.display:
+        from visualize import visualizePlan
+        sizes = [[v + lane.margin for v in xs], [v + lane.margin for v in ys], [v + lane.margin for v in zs]]
+        visualizePlan(boxes[0][1], sizes, boxes[0][0])
+    clearances = []
+    for container, packing_result in boxes:
+        # renumber the items of each box before checking it on its own
+        seqs = [item[0] for item in packing_result]
+        local = [(n,) + tuple(item[1:]) for n, item in enumerate(packing_result)]
+        raw = [[[xs, ys, zs][k][seq] for seq in seqs] for k in range(3)]
+        sizes = [[v + lane.margin for v in raw[k]] for k in range(3)]
+        # the real sizes, lane.margin apart
+        report = validatePlan(local, raw, container, lane.margin, min_support)
+        for line in describe(report):
+            print("PLAN CHECK: " + line)
+        if not report.ok:
+            # nothing has been put in a box yet
+            raise RuntimeError("packing plan for the {} box failed the check, not executed".format(container))
+        # free space around each item when it goes in, sets its insertion speed
+        clearance = planClearance(local, sizes, container, lane.margin)
+        clearances.append([clearance[n] for n in range(len(local))])
     # packing result returns
     # index of interpose, (x, y, z), mapping for a, b, c to which axis.
     # 3 1.0 10.5 0.0 ['y', 'x', 'z']
     # 0 1.5 13.5 0.0 ['z', 'y', 'x']
     print("******** PACKING RESULT ************")
-    for i in packing_result:
-        print(i)
+    for container, packing_result in boxes:
+        print(container)
+        for i in packing_result:
+            print(i)
     s.sendall(inter_pos_general.encode('ascii'))
-    input("****** Intermediate phase completed!...")
+    waitForArm("****** Intermediate phase completed!...")
     
-    for item in packing_result:
+    for box_no, (container, packing_result) in enumerate(boxes):
+        if box_no > 0:
+            waitForArm("****** Box full, place an empty {} box and press enter".format(container))
+        for n, item in enumerate(packing_result):
+            item_start = time.perf_counter()
         
-        s.sendall(inter_pos_general.encode('ascii'))
-        seq, packing_x, packing_y, packing_z, [o1, o2, o3] = item
-        s.sendall(inter_pos_rise[seq].encode('ascii'))
-        s.sendall(inter_pos[seq].encode('ascii'))
-        # ======================================================== manipulate the object
-        # man pose here
-        block_size = 0
-        s.sendall(close_grip.encode('ascii'))
-        s.sendall(rise_pose.encode('ascii'))
+            seq, packing_x, packing_y, packing_z, [o1, o2, o3] = item
+            weight, fragility = ws[seq], fs[seq]
+            # ======================================================== manipulate the object
+            # man pose here
+            block_size = 0
+            sendCommands(s, speed.to('transit') + [inter_pos_general, inter_pos_rise[seq], inter_pos[seq],
+                         close_grip] + speed.to('transit', weight, fragility) + [rise_pose])
         
-        input("Get ready.....")
-        if inter_pose_register[seq] not in [18, 19, 10, 11]:
-            s.sendall(temp_pose.encode('ascii'))
-            s.sendall(man_pose_J_adj.encode('ascii'))
+            waitForArm("Get ready.....")
+            if inter_pose_register[seq] not in [18, 19, 10, 11]:
+                sendCommands(s, speed.to('regrasp', weight, fragility) + [temp_pose, man_pose_J_adj])
             
-            block_size = GetReady(s, inter_pose_register[seq], [o1, o2, o3])
-        # ======================================================== calibrate
-        else:
-            block_size = 50
+                block_size = GetReady(s, inter_pose_register[seq], [o1, o2, o3], lane.catalog_path)
+            # ======================================================== calibrate
+            else:
+                block_size = 50
 
-        # ReCalibrating the centroid of object 
-        # with the manipulator
-        val = 'MOVP ' + str(p_hat[0]) + ' ' + str(p_hat[1]) + ' 0 ' + '90 0 180\n'
-        checkPoint(val)
-        s.sendall(val.encode('ascii'))
-         # move down to reach the target
+            # ReCalibrating the centroid of object 
+            # with the manipulator
+            val = CartesianPose(p_hat[0], p_hat[1], 0, 90, 0, 180)
+            checkPoint(val)
+            sendCommands(s, speed.to('approach', weight, fragility) + [val])
+             # move down to reach the target
         
-        val = 'MOVP ' + str(p_hat[0]) + ' ' + str(p_hat[1]) + ' -190 ' + '90 0 180\n'
-        checkPoint(val)
-        s.sendall(val.encode('ascii'))
-        s.sendall(open_grip.encode('ascii'))
-        s.sendall("GOHOME\n".encode('ascii'))
-        s.sendall("MOVJ # # # # # 0\n".encode('ascii'))
-        input("press enter when arm is at home")
-        mc_temp, p_angle__ , bbox__, actual__ = take_pictures()
-
-        for centroid in mc_temp:
-
-            img_p = [[centroid[0]], [centroid[1]], [1]]
-            actual_p = np.matmul(A, img_p)
-            actual_p = np.reshape(actual_p, 3)
-            x = actual_p[0]
-            y = actual_p[1]
-            dist = np.sqrt( (p_hat[0] - x)**2 + (p_hat[1] - y)**2)
-            if dist < 20:
-                p_hat[0] = x
-                p_hat[1] = y
-                break
-        # ==========================================
-        val = 'MOVP ' + str(p_hat[0]) + ' ' + str(p_hat[1]) + ' 0 ' + '90 0 180\n'
-        checkPoint(val)
-        s.sendall(val.encode('ascii'))
+            val = val.offset(dz=-190)
+            checkPoint(val)
+            s.sendall(val.encode('ascii'))
+            p_hat = recentre(s, tracker, p_hat)
+            # ==========================================
+            val = CartesianPose(p_hat[0], p_hat[1], 0, 90, 0, 180)
+            checkPoint(val)
+            s.sendall(val.encode('ascii'))
         
 
-        # move down to reach the target
-        val = 'MOVP ' + str(p_hat[0]) + ' ' + str(p_hat[1]) + ' -200 ' + '90 0 180\n'
-        checkPoint(val)
-        s.sendall(val.encode('ascii'))
+            # move down to reach the target
+            val = val.offset(dz=-200)
+            checkPoint(val)
+            s.sendall(val.encode('ascii'))
         
 
-        # close the gripper
-        s.sendall(close_grip.encode('ascii'))
-        s.sendall(rise_pose.encode('ascii'))
-        
-        # # packing pose
-        s.sendall("MOVP {} {} 0 -0.54 2.69 -178.876\n".format(packing_pose_x + packing_x, packing_pose_y + packing_y + 180).encode('ascii'))
-        s.sendall(packing_pose.format(packing_pose_x + packing_x, packing_pose_y + packing_y + 180).encode('ascii'))
-        s.sendall(open_grip.encode('ascii'))
-        s.sendall(close_grip.encode('ascii'))
-        s.sendall(open_grip.encode('ascii'))
-        input()
-        s.sendall(rise_packing.encode('ascii'))
-        # s.sendall(close_grip.encode('ascii'))
-        input()
-        s.sendall(packing_pose.format(packing_pose_x + packing_x, packing_pose_y + packing_y + 260).encode('ascii'))
-        input("block size is: {}".format(block_size))
-        s.sendall("SETPTPSPEED 3\n".encode('ascii'))
-        s.sendall("SETLINESPEED 20\n".encode('ascii'))
-        input()
-        s.sendall(packing_pose.format(packing_pose_x + packing_x, packing_pose_y + packing_y + block_size/2 + 40).encode('ascii'))
-
-        s.sendall("SETPTPSPEED 15\n".encode('ascii'))
-        s.sendall("SETLINESPEED 35\n".encode('ascii'))
-        input()
-        s.sendall(rise_packing.encode('ascii'))
-        s.sendall(open_grip.encode('ascii'))
-        s.sendall("GOHOME\n".encode('ascii'))
-        # # pushing pose
-        # # push
-        # # GOHOME
-        # input("")
+            # close the gripper
+            # # packing pose
+            sendCommands(s, [close_grip] + speed.to('transit', weight, fragility) +
+                         [rise_pose, packingTarget(packing_pose, packing_x, packing_y + push_start, z=0, cmd='MOVP')] +
+                         speed.to('approach', weight, fragility) +
+                         [packingTarget(packing_pose, packing_x, packing_y + push_start),
+                          open_grip, close_grip, open_grip])
+            waitForArm()
+            s.sendall(rise_packing.encode('ascii'))
+            # s.sendall(close_grip.encode('ascii'))
+            waitForArm()
+            s.sendall(packingTarget(packing_pose, packing_x, packing_y + push_back).encode('ascii'))
+            waitForArm("block size is: {}".format(block_size))
+            # only this move slows down for fragile / heavy items and tight spots
+            sendCommands(s, speed.to('insertion', weight, fragility, clearances[box_no][n]))
+            waitForArm()
+            sendCommands(s, packingTarget(packing_pose, packing_x, packing_y + block_size/2 + push_gap))
+            waitForArm()
+            sendCommands(s, speed.to('approach', weight, fragility) + [rise_packing, open_grip] +
+                         speed.to('transit') + [go_home])
+            metrics.observe('item', staging_time[seq] + time.perf_counter() - item_start)
+            metrics.count('items')
+            if on_item is not None:
+                on_item(seq)
+            # # pushing pose
+            # # push
+            # # GOHOME
+            # input("")
     
 
     # go home
-    go_home = 'GOHOME\n'
-    s.sendall(go_home.encode('ascii'))
-    s.sendall(open_grip.encode('ascii'))
+    sendCommands(s, go_home, open_grip)
+    metrics.observe('basket', time.perf_counter() - basket_start)
+    metrics.count('baskets')
+    print(s.report())
+    print(scan_stats.report())
+    print(metrics.summary())
     s.close()
+    tracker.release()
+    return number_of_objects
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description='checkout: pick, identify and pack a basket')
+    parser.add_argument('--lane', metavar='FILE', help='lane config (.json / .yaml), param.py values by default')
+    parser.add_argument('--metrics-port', type=int, default=metrics_port,
+                        help='local HTTP endpoint of the metrics (0: off)')
+    parser.add_argument('--bus', action='store_true',
+                        help='publish the camera on a frame bus, every reader of the lane shares it')
+    args = parser.parse_args()
+    if args.metrics_port:
+        metrics.serve(args.metrics_port)
+    lane = loadLane(args.lane) if args.lane else default_lane
+    if args.bus:
+        from orchestrator import shareCameras
+        (lane,), captures = shareCameras([lane])
+        try:
+            main(lane)
+        finally:
+            for capture in captures:
+                capture.stop()
+    else:
+        main(lane)
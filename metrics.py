@@ -0,0 +1,262 @@
+# In-process metrics: counters and HDR-style latency histograms.
+# Every thread records into its own shard (no locks on the hot path, about a microsecond
+# per call); a snapshot merges the shards. Histograms keep log-linear buckets of the
+# value in microseconds, 2**(SUB_BITS - 1) per power of two (worst relative error 1/16),
+# so any quantile can be read back. Exported in the Prometheus text format over a local
+# HTTP endpoint (/metrics, /summary) and as a plain-text summary:
+#
+#   with metrics.timer('detection'):
+#       ...
+#   metrics.count('qr_decodes', result='found')
+#   metrics.serve(9108)
+#
+#   python3 metrics.py --url http://localhost:9108     summary of a running process
+import time
+import threading
+from contextlib import contextmanager
+from param import metrics_buckets
+
+PREFIX = 'checkout_'
+SUB_BITS = 5
+
+
+def bucketOf(us):
+    # value (integer microseconds) -> bucket index
+    b = us.bit_length()
+    if b <= SUB_BITS:
+        return us
+    shift = b - SUB_BITS
+    return (shift << (SUB_BITS - 1)) + (us >> shift)
+
+
+def bucketBounds(index):
+    # [lo, hi) of a bucket, microseconds
+    if index < 1 << SUB_BITS:
+        return index, index + 1
+    shift = (index >> (SUB_BITS - 1)) - 1
+    top = index - (shift << (SUB_BITS - 1))
+    return top << shift, (top + 1) << shift
+
+
+class Shard:
+    __slots__ = ('counters', 'histograms')
+
+    def __init__(self):
+        # (name, labels) -> value / [bucket counts {index: n}, sum (s), count]
+        self.counters = {}
+        self.histograms = {}
+
+
+_local = threading.local()
+_shards = []
+_shards_lock = threading.Lock()
+_help = {}
+
+
+def _shard():
+    shard = getattr(_local, 'shard', None)
+    if shard is None:
+        shard = _local.shard = Shard()
+        # the only lock: once per thread
+        with _shards_lock:
+            _shards.append(shard)
+    return shard
+
+
+def describe(name, text):
+    # HELP line of a metric
+    _help[name] = text
+
+
+def count(name, value=1, **labels):
+    counters = _shard().counters
+    key = (name, tuple(sorted(labels.items())))
+    counters[key] = counters.get(key, 0) + value
+
+
+def observe(name, seconds, **labels):
+    histograms = _shard().histograms
+    key = (name, tuple(sorted(labels.items())))
+    h = histograms.get(key)
+    if h is None:
+        h = histograms[key] = [{}, 0.0, 0]
+    k = bucketOf(max(int(seconds * 1e6), 0))
+    h[0][k] = h[0].get(k, 0) + 1
+    h[1] += seconds
+    h[2] += 1
+
+
+@contextmanager
+def timer(name, **labels):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, **labels)
+
+
+def snapshot():
+    # merged copy of every thread's shard: {'counters': {key: value}, 'histograms': {key: [...]}};
+    # a series being updated while it is read may be off by that one update
+    with _shards_lock:
+        shards = list(_shards)
+    counters, histograms = {}, {}
+    for shard in shards:
+        for key, value in list(shard.counters.items()):
+            counters[key] = counters.get(key, 0) + value
+        for key, (buckets, total, n) in list(shard.histograms.items()):
+            h = histograms.setdefault(key, [{}, 0.0, 0])
+            for k, c in list(buckets.items()):
+                h[0][k] = h[0].get(k, 0) + c
+            h[1] += total
+            h[2] += n
+    return {'counters': counters, 'histograms': histograms}
+
+
+def combine(snapshots):
+    # {source: snapshot} of several processes -> one snapshot, every series labelled with
+    # its source as lane=...
+    counters, histograms = {}, {}
+    for source, snap in snapshots.items():
+        for (name, labels), value in snap['counters'].items():
+            counters[name, (('lane', source),) + labels] = value
+        for (name, labels), h in snap['histograms'].items():
+            histograms[name, (('lane', source),) + labels] = h
+    return {'counters': counters, 'histograms': histograms}
+
+
+def quantile(h, q):
+    # upper bound (s) of the bucket holding quantile q of histogram h
+    buckets, _, n = h
+    if n == 0:
+        return 0.0
+    rank, seen = q * n, 0
+    for k in sorted(buckets):
+        seen += buckets[k]
+        if seen >= rank:
+            return bucketBounds(k)[1] / 1e6
+    return bucketBounds(max(buckets))[1] / 1e6
+
+
+def _labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{%s}' % ','.join('%s="%s"' % (k, str(v).replace('\\', '\\\\').replace('"', '\\"')) for k, v in pairs)
+
+
+def prometheus(snap=None):
+    # Prometheus text exposition format; histograms on the metrics_buckets bounds (s)
+    snap = snapshot() if snap is None else snap
+    lines = []
+    for kind, series in (('counter', snap['counters']), ('histogram', snap['histograms'])):
+        names = sorted(set(name for name, _ in series))
+        for name in names:
+            full = PREFIX + name + ('_total' if kind == 'counter' else '_seconds')
+            if name in _help:
+                lines.append('# HELP %s %s' % (full, _help[name]))
+            lines.append('# TYPE %s %s' % (full, kind))
+            for (n, labels), value in sorted(series.items(), key=lambda s: (s[0][0], s[0][1])):
+                if n != name:
+                    continue
+                if kind == 'counter':
+                    lines.append('%s%s %s' % (full, _labels(labels), value))
+                    continue
+                buckets, total, n_obs = value
+                cumulative, ks = 0, sorted(buckets)
+                for le in metrics_buckets:
+                    # buckets lying wholly below the bound
+                    while ks and bucketBounds(ks[0])[1] <= le * 1e6:
+                        cumulative += buckets[ks.pop(0)]
+                    lines.append('%s_bucket%s %d' % (full, _labels(labels, [('le', repr(float(le)))]), cumulative))
+                lines.append('%s_bucket%s %d' % (full, _labels(labels, [('le', '+Inf')]), n_obs))
+                lines.append('%s_sum%s %.6f' % (full, _labels(labels), total))
+                lines.append('%s_count%s %d' % (full, _labels(labels), n_obs))
+    return '\n'.join(lines) + '\n'
+
+
+def summary(snap=None):
+    # one line per series: count, mean and quantiles of the histograms, counter values
+    snap = snapshot() if snap is None else snap
+    lines = []
+    if snap['histograms']:
+        lines.append('%-48s %8s %9s %9s %9s %9s %9s' % ('latency (s)', 'count', 'mean', 'p50', 'p90', 'p99', 'max'))
+    for (name, labels), h in sorted(snap['histograms'].items()):
+        lines.append('%-48s %8d %9.4f %9.4f %9.4f %9.4f %9.4f' % (
+            name + _labels(labels), h[2], h[1] / max(h[2], 1), quantile(h, 0.5), quantile(h, 0.9),
+            quantile(h, 0.99), quantile(h, 1.0)))
+    if snap['counters']:
+        lines.append('%-48s %8s' % ('counters', ''))
+    for (name, labels), value in sorted(snap['counters'].items()):
+        lines.append('%-48s %8s' % (name + _labels(labels), value))
+    return '\n'.join(lines)
+
+
+def serve(port, host='127.0.0.1', source=snapshot):
+    # local HTTP endpoint in a daemon thread: /metrics (Prometheus), /summary (text);
+    # source() gives the snapshot to export
+    from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            path = self.path.split('?', 1)[0]
+            if path == '/metrics':
+                body, kind = prometheus(source()), 'text/plain; version=0.0.4'
+            elif path == '/summary':
+                body, kind = summary(source()) + '\n', 'text/plain'
+            else:
+                self.send_error(404)
+                return
+            data = body.encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', kind)
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+describe('detection', 'tabletop detection of a basket (fused frames)')
+describe('qr_decode', 'QR code reading at one scan pose')
+describe('qr_decodes', 'QR code readings by result')
+describe('arm_command_estimated', 'estimated duration of the commands sent, by command')
+describe('arm_commands', 'commands sent to the arm, by command')
+describe('packing', 'packing a basket, as the lane waits for it')
+describe('item', 'staging and placing one item, end to end')
+describe('basket', 'one basket, end to end')
+describe('items', 'items put in their box')
+describe('baskets', 'baskets packed')
+describe('prompts', 'operator prompts answered')
+
+
+if __name__ == "__main__":
+
+    import argparse
+    parser = argparse.ArgumentParser(description='metrics summary of a running checkout / orchestrator')
+    parser.add_argument('--url', default=None, help='endpoint, e.g. http://localhost:9108')
+    parser.add_argument('--raw', action='store_true', help='Prometheus text instead of the summary')
+    args = parser.parse_args()
+    if args.url:
+        from urllib.request import urlopen
+        with urlopen(args.url.rstrip('/') + ('/metrics' if args.raw else '/summary'), timeout=5) as reply:
+            print(reply.read().decode('utf-8'), end='')
+    else:
+        # cost of the hot path
+        n = 200000
+        start = time.perf_counter()
+        for k in range(n):
+            observe('bench', k * 1e-6, cmd='MOVL')
+        t_observe = (time.perf_counter() - start) / n
+        start = time.perf_counter()
+        for k in range(n):
+            count('bench', cmd='MOVL')
+        t_count = (time.perf_counter() - start) / n
+        print('observe %.2f us, count %.2f us per call' % (t_observe * 1e6, t_count * 1e6))
+        print(summary())
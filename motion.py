@@ -0,0 +1,341 @@
+# Motion-time model of the arm and per-move command selection.
+# The arm is modelled by its DH table (HIWIN RA605-710, nominal values), joint
+# limits and top joint speeds; PTP moves (MOVJ / MOVP) are joint-interpolated with
+# a trapezoidal profile at SETPTPSPEED % of the top speeds, MOVL moves follow the
+# straight line at SETLINESPEED mm/s and are checked sample by sample against the
+# joint speeds. Targets given in Cartesian space are solved with a local
+# (damped least squares) IK seeded from the current joints, so the solution is the
+# configuration the controller would reach from there.
+#
+# MotionSocket wraps the arm socket and keeps the estimated time of what it sends for
+# the report; with select=True every MOVP / MOVJ (free-space move) is sent as
+# whichever of PTP and MOVL is faster, MOVL moves (path matters) are kept.
+import math
+import time
+import numpy as np
+from pose import CartesianPose, JointPose, parse
+import metrics
+
+# DH (standard convention): a, alpha (deg), d, theta offset (deg); mm
+DH = np.array([[30.0, -90.0, 375.0, 0.0],
+               [340.0, 0.0, 0.0, -90.0],
+               [40.0, -90.0, 0.0, 0.0],
+               [0.0, 90.0, 338.0, 0.0],
+               [0.0, -90.0, 0.0, 0.0],
+               [0.0, 0.0, 86.5, 0.0]])
+JOINT_MIN = np.array([-165.0, -125.0, -55.0, -190.0, -115.0, -360.0])
+JOINT_MAX = np.array([165.0, 85.0, 185.0, 190.0, 115.0, 360.0])
+# top joint speeds (deg/s) at SETPTPSPEED 100
+JOINT_SPEED = np.array([370.0, 290.0, 370.0, 435.0, 435.0, 720.0])
+HOME = np.array([0.0, 0.0, 0.0, 0.0, -90.0, 0.0])
+# controller base frame in the DH frame: origin at shoulder height, turned about z;
+# the controller's tool z points into the flange (flipped about x)
+BASE_Z = 375.0
+BASE_ROT = -90.0
+# controller tool point (gripper tip) ahead of the flange along the tool axis (mm)
+TOOL_LENGTH = 120.0
+# time to reach full speed (s), joint and linear moves
+PTP_ACCEL_TIME = 0.25
+LINE_ACCEL_TIME = 0.2
+# top tool rotation speed (deg/s) during MOVL
+LINE_ROT_SPEED = 180.0
+# gripper / IO commands, time until the next move can start (s)
+IO_TIME = 0.3
+# MOVL path samples for the joint speed / reachability check
+LINE_SAMPLES = 20
+
+
+def _rot(axis, deg):
+    c, s = math.cos(math.radians(deg)), math.sin(math.radians(deg))
+    if axis == 'x':
+        return np.array([[1, 0, 0], [0, c, -s], [0, s, c]])
+    if axis == 'y':
+        return np.array([[c, 0, s], [0, 1, 0], [-s, 0, c]])
+    return np.array([[c, -s, 0], [s, c, 0], [0, 0, 1]])
+
+
+def eulerToMatrix(rx, ry, rz):
+    # controller angles: fixed x, y, z rotations (R = Rz Ry Rx)
+    return _rot('z', rz) @ _rot('y', ry) @ _rot('x', rx)
+
+
+def matrixToEuler(R):
+    ry = math.degrees(math.asin(-max(-1.0, min(1.0, R[2, 0]))))
+    if abs(R[2, 0]) < 1 - 1e-9:
+        rx = math.degrees(math.atan2(R[2, 1], R[2, 2]))
+        rz = math.degrees(math.atan2(R[1, 0], R[0, 0]))
+    else:
+        rx = math.degrees(math.atan2(-R[1, 2], R[1, 1]))
+        rz = 0.0
+    return rx, ry, rz
+
+
+def toModel(values):
+    # controller pose (x, y, z, rx, ry, rz) -> flange (position, rotation) in the DH frame
+    Rb = _rot('z', BASE_ROT)
+    R = Rb @ eulerToMatrix(*values[3:6]) @ _rot('x', 180)
+    p = Rb @ np.array(values[:3], dtype=float) + np.array([0.0, 0.0, BASE_Z]) - TOOL_LENGTH * R[:, 2]
+    return p, R
+
+
+def fromModel(p, R):
+    # inverse of toModel
+    Rb = _rot('z', BASE_ROT)
+    pc = Rb.T @ (p + TOOL_LENGTH * R[:, 2] - np.array([0.0, 0.0, BASE_Z]))
+    return list(pc) + list(matrixToEuler(Rb.T @ R @ _rot('x', 180)))
+
+
+def transform(q, n=6):
+    # 4x4 pose of frame n (the flange for n = 6) for joints q (deg)
+    T = np.eye(4)
+    for (a, alpha, d, offset), qi in zip(DH[:n], q[:n]):
+        th = math.radians(qi + offset)
+        al = math.radians(alpha)
+        ct, st, ca, sa = math.cos(th), math.sin(th), math.cos(al), math.sin(al)
+        T = T @ np.array([[ct, -st * ca, st * sa, a * ct],
+                          [st, ct * ca, -ct * sa, a * st],
+                          [0, sa, ca, d],
+                          [0, 0, 0, 1]])
+    return T
+
+
+def forward(q):
+    # joints (deg) -> (position mm, rotation matrix) of the flange
+    T = transform(q)
+    return T[:3, 3], T[:3, :3]
+
+
+def _error(q, p, R, rot_scale):
+    pq, Rq = forward(q)
+    dR = R @ Rq.T
+    # rotation vector of the remaining rotation
+    angle = math.acos(max(-1.0, min(1.0, (np.trace(dR) - 1) / 2)))
+    if angle < 1e-9:
+        w = np.zeros(3)
+    else:
+        w = angle / (2 * math.sin(angle)) * np.array([dR[2, 1] - dR[1, 2], dR[0, 2] - dR[2, 0], dR[1, 0] - dR[0, 1]])
+    return np.concatenate([p - pq, rot_scale * w])
+
+
+def inverse(p, R, seed, tol=0.05, max_iter=100, rot_scale=200.0, damping=1.0):
+    # local IK from seed (deg); None when it does not converge inside the joint limits
+    q = np.array(seed, dtype=float)
+    for _ in range(max_iter):
+        e = _error(q, p, R, rot_scale)
+        if np.abs(e).max() < tol:
+            return q if np.all(q >= JOINT_MIN - 1e-6) and np.all(q <= JOINT_MAX + 1e-6) else None
+        J = np.zeros((6, 6))
+        for k in range(6):
+            dq = np.zeros(6)
+            dq[k] = 1e-3
+            J[:, k] = (e - _error(q + dq, p, R, rot_scale)) / 1e-3
+        step = J.T @ np.linalg.solve(J @ J.T + damping ** 2 * np.eye(6), e)
+        # keep each step small so the solution stays on the seed's branch
+        step *= min(1.0, 10.0 / max(np.abs(step).max(), 1e-9))
+        q = np.clip(q + step, JOINT_MIN, JOINT_MAX)
+    return None
+
+
+def trapezoid(distance, speed, accel_time):
+    # time to cover distance with top speed and a linear ramp of accel_time
+    if distance <= 0 or speed <= 0:
+        return 0.0
+    if distance >= speed * accel_time:
+        return distance / speed + accel_time
+    return 2 * math.sqrt(distance * accel_time / speed)
+
+
+class Motion:
+    # arm state (joints, speed settings) and the time of each command
+
+    def __init__(self, joints=HOME, ptp_speed=15.0, line_speed=35.0):
+        self.joints = None if joints is None else np.array(joints, dtype=float)
+        self.ptp_speed = ptp_speed
+        self.line_speed = line_speed
+
+    def copy(self):
+        return Motion(self.joints, self.ptp_speed, self.line_speed)
+
+    def pose(self):
+        # current flange pose as (position, rotation), None if unknown
+        return None if self.joints is None else forward(self.joints)
+
+    def target(self, command):
+        # joints a move ends at, None if unknown / unreachable
+        if self.joints is None:
+            return None
+        if isinstance(command, JointPose):
+            return np.array([c if v is None else v for v, c in zip(command.values, self.joints)])
+        cur = fromModel(*forward(self.joints))
+        v = [c if x is None else x for x, c in zip(command.values, cur)]
+        p, R = toModel(v)
+        q = inverse(p, R, self.joints)
+        if q is None:
+            # large base turns: start from the current joints with J1 facing the target
+            seed = self.joints.copy()
+            seed[0] = np.clip(math.degrees(math.atan2(p[1], p[0])), JOINT_MIN[0], JOINT_MAX[0])
+            q = inverse(p, R, seed)
+        return q
+
+    def ptpTime(self, q1):
+        d = np.abs(q1 - self.joints)
+        speed = JOINT_SPEED * self.ptp_speed / 100.0
+        return max(trapezoid(dk, vk, PTP_ACCEL_TIME) for dk, vk in zip(d, speed))
+
+    def lineTime(self, q1):
+        # None when the straight line leaves the workspace / joint limits
+        p0, R0 = forward(self.joints)
+        p1, R1 = forward(q1)
+        length = float(np.linalg.norm(p1 - p0))
+        rot = math.degrees(math.acos(max(-1.0, min(1.0, (np.trace(R1 @ R0.T) - 1) / 2))))
+        t = max(trapezoid(length, self.line_speed, LINE_ACCEL_TIME), rot / LINE_ROT_SPEED)
+        # joints along the path: each segment no faster than the top joint speeds
+        q = self.joints
+        e0, e1 = np.array(matrixToEuler(R0)), np.array(matrixToEuler(R1))
+        joint_time = 0.0
+        for k in range(1, LINE_SAMPLES + 1):
+            s = k / float(LINE_SAMPLES)
+            qk = inverse(p0 + s * (p1 - p0), eulerToMatrix(*(e0 + s * _angleDiff(e1, e0))), q)
+            if qk is None or np.abs(qk - q).max() > 45:
+                return None
+            joint_time += np.max(np.abs(qk - q) / JOINT_SPEED)
+            q = qk
+        return max(t, joint_time)
+
+    def time(self, command):
+        # estimated seconds for command from the current state (None if unknown)
+        cmd = command.cmd
+        if cmd in ('SETPTPSPEED', 'SETLINESPEED'):
+            return 0.0
+        if cmd == 'GOHOME':
+            return None if self.joints is None else self.ptpTime(HOME)
+        if not isinstance(command, (CartesianPose, JointPose)):
+            return IO_TIME
+        q1 = self.target(command)
+        if q1 is None:
+            return None
+        return self.lineTime(q1) if cmd == 'MOVL' else self.ptpTime(q1)
+
+    def apply(self, command, q1=None):
+        # update the state after command was sent
+        cmd = command.cmd
+        if cmd == 'SETPTPSPEED':
+            self.ptp_speed = float(command.text.split()[1])
+        elif cmd == 'SETLINESPEED':
+            self.line_speed = float(command.text.split()[1])
+        elif cmd == 'GOHOME':
+            self.joints = HOME.copy()
+        elif isinstance(command, (CartesianPose, JointPose)):
+            self.joints = self.target(command) if q1 is None else q1
+
+    def choose(self, command):
+        # (command to send, its time, time of the original); MOVL is kept as is,
+        # MOVP / MOVJ become MOVL when the straight line is faster
+        original = self.time(command)
+        if command.cmd not in ('MOVP', 'MOVJ') or original is None:
+            return command, original, original
+        q1 = self.target(command)
+        line = self.lineTime(q1)
+        if line is None or line >= original:
+            return command, original, original
+        if isinstance(command, JointPose):
+            command = CartesianPose(*fromModel(*forward(q1)), cmd='MOVL')
+        else:
+            command = command.withCmd('MOVL')
+        return command, line, original
+
+
+def _angleDiff(a, b):
+    return (a - b + 180.0) % 360.0 - 180.0
+
+
+def estimate(commands, motion=None):
+    # total seconds of a command sequence (commands with unknown time count 0)
+    motion = Motion() if motion is None else motion.copy()
+    total = 0.0
+    for command in commands:
+        command = parse(command)
+        t = motion.time(command)
+        total += t or 0.0
+        motion.apply(command)
+    return total
+
+
+class MotionSocket:
+    # drop-in wrapper of the arm socket estimating the time of the moves sent;
+    # select: also choose the command type of free moves (the commands are sent as given otherwise)
+
+    def __init__(self, sock, motion=None, select=False):
+        self.sock = sock
+        self.motion = Motion() if motion is None else motion
+        self.select = select
+        self.time_sent = 0.0
+        self.time_original = 0.0
+        # estimated time (time.time()) the arm finishes the commands sent so far
+        self.busy_until = 0.0
+        self.changed = 0
+
+    def sendall(self, data):
+        out = []
+        for line in data.decode('ascii').splitlines():
+            if not line.strip():
+                continue
+            command = parse(line)
+            if self.select:
+                chosen, t, t0 = self.motion.choose(command)
+            else:
+                chosen, t = command, self.motion.time(command)
+                t0 = t
+            if chosen is not command:
+                self.changed += 1
+            self.time_sent += t or 0.0
+            self.time_original += t0 or 0.0
+            self.busy_until = max(self.busy_until, time.time()) + (t or 0.0)
+            metrics.count('arm_commands', cmd=chosen.cmd)
+            if t is not None:
+                metrics.observe('arm_command_estimated', t, cmd=chosen.cmd)
+            self.motion.apply(chosen)
+            out.append(chosen.encode('ascii'))
+        self.sock.sendall(b''.join(out))
+
+    def wait(self, margin=0.5):
+        # the controller does not report when a move is done: sleep until the estimated end
+        # of the commands sent, plus margin seconds
+        time.sleep(max(self.busy_until + margin - time.time(), 0.0))
+
+    def saved(self):
+        return self.time_original - self.time_sent
+
+    def report(self):
+        if not self.select:
+            return 'motion: %.1f s estimated (command selection off)' % self.time_sent
+        return 'motion: %.1f s estimated, %.1f s saved by %d MOVL substitutions' % (
+            self.time_sent, self.saved(), self.changed)
+
+    def close(self):
+        self.sock.close()
+
+    def __getattr__(self, name):
+        return getattr(self.sock, name)
+
+
+if __name__ == "__main__":
+
+    # time of the staging / packing moves as written and with command selection
+    from param import inter_pos, inter_pos_rise, inter_pos_general, packing_pose, rise_packing, \
+        close_grip, open_grip, go_home, rise_pose
+    from pose import packingTarget
+    sequence = [go_home]
+    for i in range(len(inter_pos)):
+        sequence += [inter_pos_general, inter_pos_rise[i], inter_pos[i], close_grip, rise_pose,
+                     packingTarget(packing_pose, 40, 220, z=0, cmd='MOVP'), packingTarget(packing_pose, 40, 220),
+                     open_grip, rise_packing, go_home]
+
+    class _Null:
+        def sendall(self, data):
+            pass
+    for ptp, line in ((3, 20), (15, 35), (3, 200), (15, 200)):
+        s = MotionSocket(_Null(), Motion(ptp_speed=ptp, line_speed=line), select=True)
+        for c in sequence:
+            s.sendall(c.encode('ascii'))
+        print('SETPTPSPEED %3d SETLINESPEED %3d: %s' % (ptp, line, s.report()))
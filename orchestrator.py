@@ -0,0 +1,304 @@
+# Multi-lane orchestrator: runs several checkout stations from one host.
+# Each lane is one worker process with its own camera, arm connection and staging
+# state (main.main with the lane's LaneConfig). All lanes share one packing pool
+# and the memory-mapped catalog (catalog.py). The orchestrator
+# aggregates throughput and keeps track of every lane's health.
+#
+#   python3 orchestrator.py lanes/a.json lanes/b.json
+#   python3 orchestrator.py --sim 3 --feed recorded.avi --baskets 2
+#   python3 orchestrator.py --bus lanes/a.json     # camera published once on a frame bus
+import time
+import queue
+import threading
+import argparse
+import multiprocessing as mp
+from dataclasses import replace
+from concurrent.futures import ProcessPoolExecutor
+from lane import loadLane, default_lane
+from helper import catalog
+from param import metrics_port
+from framebus import startCapture
+import metrics
+
+# a running lane that has made no progress for this long (s, plus one operator prompt)
+# is flagged as stalled
+stall_after = 10.0
+heartbeat = 1.0
+
+
+def progress(snap):
+    # work done by a lane process: every counter of its metrics (arm commands, QR decodes,
+    # operator prompts, items, baskets) only grows while its work loop moves on
+    return sum(snap['counters'].values())
+
+
+class LaneStats:
+    __slots__ = ('name', 'state', 'started', 'last_seen', 'progress', 'progressed', 'items', 'baskets',
+                 'errors', 'last_error')
+
+    def __init__(self, name):
+        self.name = name
+        self.state = 'starting'
+        self.started = time.time()
+        self.last_seen = self.started
+        # last progress count and when it last went up
+        self.progress = 0
+        self.progressed = self.started
+        self.items = 0
+        self.baskets = 0
+        self.errors = 0
+        self.last_error = None
+
+
+def shareCameras(lanes):
+    # one capture process per camera of the lanes (lanes sharing a camera share it), the
+    # lanes read it from its frame bus (camera_index 'bus:NAME'): fusion, QR scans and
+    # re-centroiding in a lane no longer open the device one after another
+    captures = {}
+    shared = []
+    for lane in lanes:
+        source = lane.camera_index
+        if not (isinstance(source, str) and source.startswith('bus:')):
+            if source not in captures:
+                captures[source] = startCapture(source)
+            lane = replace(lane, camera_index='bus:' + captures[source].name)
+        shared.append(lane)
+    return shared, list(captures.values())
+
+
+def _pack(lane, args):
+    # runs in the shared packing pool
+    from main import packBasket
+    return packBasket(lane, *args)
+
+
+def _laneWorker(lane, events, requests, replies, baskets, delay):
+    import prompt
+    prompt.unattended(delay)
+    import main as checkout
+
+    def pack(lane, xs, ys, zs, ws, fs, upright=None):
+        requests.put((lane.name, lane, (xs, ys, zs, ws, fs, upright)))
+        boxes = replies.get()
+        if isinstance(boxes, Exception):
+            raise boxes
+        return boxes
+
+    def on_item(seq):
+        events.put((lane.name, 'item', time.time(), seq))
+
+    def beat():
+        # the lane's metrics ride along with the heartbeat; the orchestrator tells a live
+        # but stuck lane by its progress count not going up
+        while True:
+            snap = metrics.snapshot()
+            events.put((lane.name, 'alive', time.time(), progress(snap)))
+            events.put((lane.name, 'metrics', time.time(), snap))
+            time.sleep(heartbeat)
+    threading.Thread(target=beat, daemon=True).start()
+
+    events.put((lane.name, 'running', time.time(), None))
+    done = 0
+    while baskets is None or done < baskets:
+        try:
+            checkout.main(lane, pack=pack, on_item=on_item)
+        except Exception as e:
+            message = '%s: %s' % (type(e).__name__, ' '.join(str(e).split()))
+            events.put((lane.name, 'error', time.time(), message))
+            return
+        done += 1
+        events.put((lane.name, 'basket', time.time(), done))
+    events.put((lane.name, 'stopped', time.time(), None))
+
+
+class Orchestrator:
+
+    def __init__(self, lanes, pack_workers=2, baskets=None, delay=0.0):
+        # baskets = per lane, None runs until stop(); delay = seconds per operator prompt
+        names = [lane.name for lane in lanes]
+        if len(set(names)) != len(names):
+            raise ValueError('lane names must be unique: %s' % names)
+        self.lanes = lanes
+        self.pack_workers = pack_workers
+        self.baskets = baskets
+        self.delay = delay
+        self.stats = {lane.name: LaneStats(lane.name) for lane in lanes}
+        # latest metrics snapshot of every lane process
+        self.metrics = {}
+        self._lock = threading.Lock()
+        self._running = False
+
+    def start(self):
+        # compile the catalogs once if needed; every lane process maps the same file
+        for path in set(lane.catalog_path for lane in self.lanes):
+            catalog(path)
+        self.started = time.time()
+        self.events = mp.Queue()
+        self.requests = mp.Queue()
+        self.replies = {lane.name: mp.Queue() for lane in self.lanes}
+        self.pool = ProcessPoolExecutor(max_workers=self.pack_workers)
+        self.workers = {lane.name: mp.Process(target=_laneWorker, name=lane.name,
+                                              args=(lane, self.events, self.requests, self.replies[lane.name],
+                                                    self.baskets, self.delay))
+                        for lane in self.lanes}
+        self._running = True
+        self._threads = [threading.Thread(target=self._collect, daemon=True),
+                         threading.Thread(target=self._dispatch, daemon=True)]
+        for t in self._threads:
+            t.start()
+        for w in self.workers.values():
+            w.start()
+        return self
+
+    def _dispatch(self):
+        # packing requests from the lanes -> shared pool -> reply queue of that lane
+        while self._running:
+            try:
+                name, lane, args = self.requests.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            future = self.pool.submit(_pack, lane, args)
+
+            def reply(future, name=name):
+                error = future.exception()
+                self.replies[name].put(error if error is not None else future.result())
+            future.add_done_callback(reply)
+
+    def _collect(self):
+        while self._running:
+            try:
+                name, kind, t, payload = self.events.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            with self._lock:
+                stats = self.stats[name]
+                stats.last_seen = t
+                if kind == 'alive':
+                    if payload > stats.progress:
+                        stats.progress = payload
+                        stats.progressed = t
+                elif kind == 'metrics':
+                    self.metrics[name] = payload
+                elif kind == 'item':
+                    stats.items += 1
+                elif kind == 'basket':
+                    stats.baskets += 1
+                elif kind == 'error':
+                    stats.errors += 1
+                    stats.last_error = payload
+                    stats.state = 'error'
+                elif kind in ('running', 'stopped'):
+                    stats.state = kind
+                if kind in ('running', 'item', 'basket'):
+                    stats.progressed = t
+
+    def throughput(self):
+        # (items / min, baskets / min) over all lanes since start
+        minutes = max(time.time() - self.started, 1e-6) / 60.0
+        with self._lock:
+            items = sum(s.items for s in self.stats.values())
+            baskets = sum(s.baskets for s in self.stats.values())
+        return items / minutes, baskets / minutes
+
+    def health(self):
+        # {lane: (state, items, baskets, seconds since last progress, last error)}
+        now = time.time()
+        result = {}
+        with self._lock:
+            for name, s in self.stats.items():
+                state = s.state
+                worker = self.workers[name]
+                if state in ('starting', 'running') and not worker.is_alive():
+                    state = 'dead (exit %s)' % worker.exitcode
+                elif state == 'running' and now - s.progressed > stall_after + self.delay:
+                    state = 'stalled'
+                result[name] = (state, s.items, s.baskets, now - s.progressed, s.last_error)
+        return result
+
+    def report(self):
+        items, baskets = self.throughput()
+        lines = ['%.1f items/min  %.2f baskets/min  (%.0f s)' % (items, baskets, time.time() - self.started)]
+        for name, (state, n_items, n_baskets, age, error) in self.health().items():
+            line = '  %-10s %-16s %4d items %3d baskets  progress %.1fs ago' % (name, state, n_items, n_baskets, age)
+            if error:
+                line += '  ' + error
+            lines.append(line)
+        return '\n'.join(lines)
+
+    def snapshot(self):
+        # metrics of all lanes, labelled lane=...
+        with self._lock:
+            return metrics.combine(dict(self.metrics))
+
+    def done(self):
+        return not any(w.is_alive() for w in self.workers.values())
+
+    def wait(self, report_every=10.0):
+        next_report = time.time() + report_every
+        try:
+            while not self.done():
+                time.sleep(0.2)
+                if time.time() >= next_report:
+                    print(self.report())
+                    next_report += report_every
+        except KeyboardInterrupt:
+            pass
+        # let the last events arrive
+        time.sleep(0.5)
+
+    def stop(self):
+        for w in self.workers.values():
+            if w.is_alive():
+                w.terminate()
+        for w in self.workers.values():
+            w.join()
+        self._running = False
+        for t in self._threads:
+            t.join()
+        self.pool.shutdown(cancel_futures=True)
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description='run several checkout lanes')
+    parser.add_argument('lanes', nargs='*', help='lane config files (.json / .yaml)')
+    parser.add_argument('--sim', type=int, default=0, help='add this many lanes on simulated arms')
+    parser.add_argument('--feed', help='recorded video used as the camera of the simulated lanes')
+    parser.add_argument('--baskets', type=int, default=None, help='baskets per lane (default: run until ^C)')
+    parser.add_argument('--pack-workers', type=int, default=2)
+    parser.add_argument('--delay', type=float, default=0.0, help='seconds per operator prompt')
+    parser.add_argument('--report-every', type=float, default=10.0)
+    parser.add_argument('--metrics-port', type=int, default=metrics_port,
+                        help='local HTTP endpoint of the lanes\' metrics (0: off)')
+    parser.add_argument('--bus', action='store_true', help='publish every lane camera on a frame bus')
+    args = parser.parse_args()
+
+    lanes = [loadLane(path) for path in args.lanes]
+    arms = []
+    if args.sim:
+        from simarm import SimArm
+        for k in range(args.sim):
+            arm = SimArm(name='sim%d' % k).start()
+            arms.append(arm)
+            lanes.append(replace(default_lane, name=arm.name, arm_ip=arm.host, arm_port=arm.port,
+                                 camera_index=args.feed if args.feed else default_lane.camera_index))
+    if not lanes:
+        parser.error('no lanes: give lane files and / or --sim N')
+    captures = []
+    if args.bus:
+        lanes, captures = shareCameras(lanes)
+        for capture in captures:
+            print('camera bus %s, frames %s' % (capture.name, capture.shape))
+
+    orchestrator = Orchestrator(lanes, args.pack_workers, args.baskets, args.delay).start()
+    if args.metrics_port:
+        metrics.serve(args.metrics_port, source=orchestrator.snapshot)
+    orchestrator.wait(args.report_every)
+    orchestrator.stop()
+    for capture in captures:
+        capture.stop()
+    print(orchestrator.report())
+    print(metrics.summary(orchestrator.snapshot()))
+    for arm in arms:
+        print('%s: %d commands, %d malformed' % (arm.name, arm.count(), len(arm.errors)))
+        arm.stop()
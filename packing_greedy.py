@@ -0,0 +1,147 @@
+# Greedy placement engine: items are placed one by one, in the given order, at the
+# candidate corner that keeps the stack lowest. Same input / output as
+# packing_gurobi.packing, in milliseconds instead of a MILP solve.
+import numpy as np
+from itertools import permutations
+from param import margin, max_load_on_fragile, min_support, handling_weight, unhandled_cost
+from stacking import planInfo, stackLoads
+from heightmap import HeightMap
+
+AXES = 'xyz'
+
+
+def orientations(dims, handling=None):
+    # (extent on x, y, z), axis of each item dimension, handling cost (s) for each distinct
+    # rotation; of the rotations with the same extents the one with the cheapest handling,
+    # rotations costing unhandled_cost or more are not allowed
+    best = {}
+    for p in permutations(range(3)):
+        ext = tuple(dims[k] for k in p)
+        ori = [AXES[p.index(k)] for k in range(3)]
+        cost = 0.0 if handling is None else handling[tuple(ori)]
+        if cost >= unhandled_cost:
+            continue
+        if ext not in best or cost < best[ext][1]:
+            best[ext] = (ori, cost)
+    return [(np.array(ext, dtype=float), ori, cost) for ext, (ori, cost) in best.items()]
+
+
+def placeItem(container_size, lo, hi, n, dims, heavy, fragile, min_support, handling=None,
+              handling_weight=handling_weight):
+    # best (lo, orientation) for one item given the n boxes placed so far, or None
+    A, B, C = container_size
+    xs = np.unique(np.concatenate([[0.0], hi[:n, 0]]))
+    ys = np.unique(np.concatenate([[0.0], hi[:n, 1]]))
+    cx, cy = np.meshgrid(xs, ys, indexing='ij')
+    cx, cy = cx.ravel(), cy.ravel()
+
+    best = None
+    for ext, ori, cost in orientations(dims, handling):
+        ok = (cx + ext[0] <= A + 1e-6) & (cy + ext[1] <= B + 1e-6)
+        px, py = cx[ok], cy[ok]
+        if len(px) == 0:
+            continue
+        if n:
+            # xy overlap of every candidate footprint with every placed box
+            w = np.minimum(px[:, None] + ext[0], hi[None, :n, 0]) - np.maximum(px[:, None], lo[None, :n, 0])
+            d = np.minimum(py[:, None] + ext[1], hi[None, :n, 1]) - np.maximum(py[:, None], lo[None, :n, 1])
+            area = np.clip(w, 0, None) * np.clip(d, 0, None)
+            under = area > 1e-9
+            pz = np.where(under, hi[None, :n, 2], 0.0).max(axis=1)
+            touching = under & (np.abs(hi[None, :n, 2] - pz[:, None]) < 0.5)
+            support = np.where(touching, area, 0.0).sum(axis=1) / (ext[0] * ext[1])
+            support[pz <= 0] = 1.0
+            feasible = (pz + ext[2] <= C + 1e-6) & (support >= min_support)
+            if heavy:
+                feasible &= ~(under & fragile[None, :n]).any(axis=1)
+        else:
+            pz = np.zeros(len(px))
+            feasible = ext[2] <= C + 1e-6 + pz
+        if not feasible.any():
+            continue
+        # lowest top (plus the handling cost as height), then lowest bottom, then back-left corner
+        score = np.lexsort((px, py, pz, pz + ext[2]))
+        k = score[feasible[score]][0]
+        key = (pz[k] + ext[2] + handling_weight * cost, pz[k], py[k], px[k])
+        if best is None or key < best[0]:
+            best = (key, np.array([px[k], py[k], pz[k]]), ext, ori)
+    return best
+
+
+def placeItemMap(hmap, dims, heavy, min_support, handling=None, handling_weight=handling_weight):
+    # placeItem on a height map: every grid corner is a candidate, not only box corners
+    best = None
+    for ext, ori, cost in orientations(dims, handling):
+        pos = hmap.bestPosition(ext, min_support, heavy)
+        if pos is None:
+            continue
+        key = (pos[2] + ext[2] + handling_weight * cost, pos[2], pos[1], pos[0])
+        if best is None or key < best[0]:
+            best = (key, np.array(pos), ext, ori)
+    return best
+
+
+def overloaded(lo, hi, weight, fragile, max_load):
+    # some fragile box carries more than max_load in all (the MILP's load-bearing rule)
+    return bool((stackLoads(lo, hi, weight)[fragile] > max_load).any())
+
+
+# order = item indices in placement order (default: largest volume first)
+# resolution = place on a HeightMap with cells of this size (mm) instead of at box corners
+# (None, the default: box corners; see param.heightmap_resolution)
+# handling = [{orientation tuple: seconds}, ...] per item (travel.handlingCost)
+
+def greedyPacking(container_size, item_size, enlarge=False, order=None, weight=None, fragility=None,
+                  max_load=max_load_on_fragile, min_support=min_support, resolution=None, handling=None,
+                  handling_weight=handling_weight, **kwargs):
+    n_item = len(item_size[0])
+    dims = [[item_size[k][i] + (margin if enlarge else 0) for k in range(3)] for i in range(n_item)]
+    if order is None:
+        order = sorted(range(n_item), key=lambda i: -dims[i][0] * dims[i][1] * dims[i][2])
+
+    lo = np.zeros((n_item, 3))
+    hi = np.zeros((n_item, 3))
+    placed_fragile = np.zeros(n_item, dtype=bool)
+    placed = []
+    orientation = [None] * n_item
+    hmap = None if resolution is None else HeightMap(container_size, resolution)
+    checking = weight is not None and fragility is not None
+    for n, i in enumerate(order):
+        cost = None if handling is None else handling[i]
+        # heavy: kept off fragile boxes; tried when the item alone is over max_load, or when
+        # the load it adds to the fragile boxes below would be
+        for heavy in ((True,) if checking and weight[i] > max_load else (False, True)):
+            if hmap is None:
+                best = placeItem(container_size, lo[placed], hi[placed], n, dims[i], heavy,
+                                 placed_fragile[:n], min_support, cost, handling_weight)
+            else:
+                best = placeItemMap(hmap, dims[i], heavy, min_support, cost, handling_weight)
+            if best is None or not checking:
+                break
+            idx = placed + [i]
+            lo[i], hi[i] = best[1], best[1] + best[2]
+            if not overloaded(lo[idx], hi[idx], np.asarray(weight, dtype=float)[idx],
+                              np.asarray(fragility)[idx] > 0, max_load):
+                break
+            best = None
+        if best is None:
+            return None
+        _, pos, ext, ori = best
+        if hmap is not None:
+            hmap.place(pos[0], pos[1], ext, pos[2], fragile=fragility is not None and fragility[i] > 0)
+        lo[i] = pos
+        hi[i] = pos + ext
+        orientation[i] = ori
+        if fragility is not None:
+            placed_fragile[n] = fragility[i] > 0
+        placed.append(i)
+    return planInfo(lo, hi, orientation)
+
+
+if __name__ == "__main__":
+
+    from param import container_size, item_size
+    item_info = greedyPacking(container_size, item_size)
+    for item in item_info:
+        seq, x, y, z, [o1, o2, o3] = item
+        print(seq, '%.1f'%x, '%.1f'%y, '%.1f'%z, [o1, o2, o3])
@@ -1,9 +1,8 @@
-import gurobipy as gp
-from gurobipy import GRB
-from time import process_time
-from functools import cmp_to_key
-from param import *
-from visualize import visualize
+import numpy as np
+from time import process_time, time
+from itertools import permutations
+from param import margin, max_load_on_fragile, min_support, handling_weight, unhandled_cost
+from stacking import violations, placementOrder, supportFraction
 
 def enlargeItemSize(item_size):
     n_size = len(item_size[0])
@@ -12,17 +11,6 @@ def enlargeItemSize(item_size):
             item_size[i][j] += margin
     return item_size
 
-def compare(item1, item2):
-    [seq1, x1, y1, z1, ori1] = item1
-    [seq2, x2, y2, z2, ori2] = item2
-    bool2int = lambda b: 1 if b else -1
-    if abs(z1 - z2) > 0.1:
-        return bool2int(z1 > z2)
-    elif abs(y1 - y2) > 0.1:
-        return bool2int(y1 > y2)
-    else:
-        return bool2int(x1 > x2)
-    
 def extractOrientation(variables):
     values = {'e_am' : [], 'e_an' : [], 'e_al' : [],
               'e_bm' : [], 'e_bn' : [], 'e_bl' : [],
@@ -70,11 +58,34 @@ def extractOrientation(variables):
 # container_size = [x, y, z]
 # item_size = [[x1, x2, x3, ...], [y1, y2, y3, ...], [z1, z2, z3, ...]]
 
-def packing(container_size, item_size, enlarge=False, visualization=False):
+# weight = [w1, w2, ...], fragility = [f1, f2, ...] (optional, from obj_info.csv)
+# handling = [{orientation tuple: seconds}, ...] per item (travel.handlingCost), optional;
+#            orientations costing unhandled_cost or more are not allowed
+# gravity=False skips the settling re-solves (enough to test feasibility)
+# time_limit = seconds for the whole call, the best solution found so far is used
+# returns None when the items do not fit in the container (or nothing was found in time),
+# or when the result still breaks the load-bearing rules / leaves an item hanging in the air
+
+def packing(container_size, item_size, enlarge=False, visualization=False, gravity=True, verbose=True,
+            weight=None, fragility=None, max_load=max_load_on_fragile, min_support=min_support,
+            stability_weight=0.1, fragile_penalty=1.0, max_rounds=10, time_limit=None, handling=None,
+            handling_weight=handling_weight):
+
+    # gurobipy is only needed once a model is built
+    import gurobipy as gp
+    from gurobipy import GRB
 
     # ---------------------------------------- MODEL ---------------------------------------- 
 
     model = gp.Model("packing")
+    model.Params.OutputFlag = int(verbose)
+    deadline = None if time_limit is None else time() + time_limit
+
+    def solve():
+        if deadline is not None:
+            model.Params.TimeLimit = max(deadline - time(), 0.01)
+        model.optimize()
+        return model.SolCount > 0
 
     # ---------------------------------------- PARAMETERS ---------------------------------------- 
 
@@ -128,9 +139,23 @@ def packing(container_size, item_size, enlarge=False, visualization=False):
     #   max height
     max_height = model.addVar(lb=0, name='max_height')
 
+    # orientation as one of the 6 axis permutations, only needed for its handling cost
+    perms = list(permutations('xyz'))
+    if handling is not None:
+        r = model.addVars(n_item, len(perms), vtype=GRB.BINARY, name='r')
+
     # ---------------------------------------- OBJECTIVE ----------------------------------------
 
-    model.setObjective(max_height, GRB.MINIMIZE)
+    # heavy items low: weighted mean bottom height as a stability penalty
+    objective = max_height
+    if weight is not None and sum(weight) > 0:
+        objective = objective + stability_weight * gp.quicksum(weight[i] * z[i] for i in range(n_item)) / sum(weight)
+    # regrasp time of the chosen orientations, as height
+    if handling is not None:
+        objective = objective + handling_weight * gp.quicksum(handling[i][p] * r[i, k] for i in range(n_item)
+                                                              for k, p in enumerate(perms)
+                                                              if handling[i][p] < unhandled_cost)
+    model.setObjective(objective, GRB.MINIMIZE)
 
     # ---------------------------------------- CONSTRAINT ----------------------------------------
 
@@ -168,6 +193,20 @@ def packing(container_size, item_size, enlarge=False, visualization=False):
         model.addConstr(e_am[i] + e_bm[i] + e_cm[i] == 2, name='orientation_selection_sum_m_%d'%i)
         model.addConstr(e_an[i] + e_bn[i] + e_cn[i] == 2, name='orientation_selection_sum_n_%d'%i)
         model.addConstr(e_al[i] + e_bl[i] + e_cl[i] == 2, name='orientation_selection_sum_l_%d'%i)
+
+        # permutation k puts dimension M / N / L on axis perms[k][0 / 1 / 2]
+        if handling is not None:
+            model.addConstr(r.sum(i, '*') == 1, name='orientation_perm_%d'%i)
+            # orientations the item cannot be put in with
+            for k, p in enumerate(perms):
+                if handling[i][p] >= unhandled_cost:
+                    model.addConstr(r[i, k] == 0, name='orientation_fixed_%d_%d'%(i, k))
+            e = {('x', 0): e_am, ('x', 1): e_an, ('x', 2): e_al,
+                 ('y', 0): e_bm, ('y', 1): e_bn, ('y', 2): e_bl,
+                 ('z', 0): e_cm, ('z', 1): e_cn, ('z', 2): e_cl}
+            for (axis, dim), var in e.items():
+                model.addConstr(1 - var[i] == gp.quicksum(r[i, k] for k, p in enumerate(perms) if p[dim] == axis),
+                                name='orientation_perm_%s%d_%d'%(axis, dim, i))
         
         # non-overlapping
         for j in range(n_item):
@@ -175,17 +214,79 @@ def packing(container_size, item_size, enlarge=False, visualization=False):
             model.addConstr(y[j] - y[i] - b[i] >= -U * o_y[i, j], name='overlapping_y_0_%d_%d'%(i,j))
             model.addConstr(z[j] - z[i] - c[i] >= -U * o_z[i, j], name='overlapping_z_0_%d_%d'%(i,j))
             if j > i:
-                model.addConstr(o_x[i, j] + o_x[j, i] + o_y[i, j] + o_y[j, i] + o_z[j, i] + o_z[j, i] <= 5, name='overlapping_sum_%d_%d'%(i,j))
+                model.addConstr(o_x[i, j] + o_x[j, i] + o_y[i, j] + o_y[j, i] + o_z[i, j] + o_z[j, i] <= 5, name='overlapping_sum_%d_%d'%(i,j))
 
         # max height
         model.addConstr(max_height >= z[i] + c[i], name='max_height_%d'%i)
 
-    model.optimize()
+    if not solve():
+        if verbose:
+            print("packing infeasible, status %d" % model.Status)
+        return None
+
+    # ---------------------------------------- LOAD BEARING ----------------------------------------
+    # constraints are only added for the pairs the current solution actually stacks,
+    # then the model is re-solved
+
+    # 5 when item i is above item j with overlapping footprints
+    stacked = lambda i, j: o_x[i, j] + o_x[j, i] + o_y[i, j] + o_y[j, i] + o_z[i, j]
+
+    def current():
+        lo = np.array([[x[i].x, y[i].x, z[i].x] for i in range(n_item)])
+        return lo, lo + np.array([[a[i].x, b[i].x, c[i].x] for i in range(n_item)])
+
+    def broken():
+        # hard rules the current solution breaks (a light item on a fragile one is only penalised)
+        heavy, _, unsupported = violations(*current(), weight, fragility, max_load, min_support)
+        return heavy + unsupported
+
+    cuts = set()
+    checking = (weight is not None and fragility is not None) or min_support > 0
+    for _ in range(max_rounds if checking else 0):
+        heavy, light, unsupported = violations(*current(), weight, fragility, max_load, min_support)
+        added = 0
+        for i, j in heavy:
+            if ('heavy', i, j) not in cuts:
+                cuts.add(('heavy', i, j))
+                model.addConstr(stacked(i, j) <= 4, name='fragile_%d_%d'%(i,j))
+                added += 1
+        for i, j in light:
+            if ('light', i, j) not in cuts:
+                cuts.add(('light', i, j))
+                p = model.addVar(vtype=GRB.BINARY, name='fragile_penalty_%d_%d'%(i,j))
+                model.addConstr(stacked(i, j) <= 4 + p, name='fragile_soft_%d_%d'%(i,j))
+                objective = objective + fragile_penalty * weight[i] * p
+                added += 1
+        for i, j in unsupported:
+            if ('support', i, j) not in cuts:
+                # when i is over j, it may overhang j by at most d on each side
+                cuts.add(('support', i, j))
+                d = (1 - min_support) * min(M[i], N[i], L[i])
+                off = U * (5 - stacked(i, j))
+                model.addConstr(x[i] >= x[j] - d - off, name='support_x_0_%d_%d'%(i,j))
+                model.addConstr(x[i] + a[i] <= x[j] + a[j] + d + off, name='support_x_1_%d_%d'%(i,j))
+                model.addConstr(y[i] >= y[j] - d - off, name='support_y_0_%d_%d'%(i,j))
+                model.addConstr(y[i] + b[i] <= y[j] + b[j] + d + off, name='support_y_1_%d_%d'%(i,j))
+                added += 1
+        if added == 0 or (deadline is not None and time() > deadline):
+            break
+        model.setObjective(objective, GRB.MINIMIZE)
+        if not solve():
+            if verbose:
+                print("packing infeasible with load-bearing rules, status %d" % model.Status)
+            return None
+    # out of rounds / time with cuts still missing
+    if checking and broken():
+        if verbose:
+            print("packing still breaks the load-bearing rules: %s" % broken())
+        return None
 
     # ---------------------------------------- GRAVITY ----------------------------------------
 
     fixed = [False] * n_item
-    for i in range(n_item):
+    for i in range(n_item if gravity else 0):
+        if deadline is not None and time() > deadline:
+            break
         
         # find the highest non-fixed item
         max_height_id = None
@@ -209,13 +310,26 @@ def packing(container_size, item_size, enlarge=False, visualization=False):
         model.addConstr(b[max_height_id] == b[max_height_id].x, name='fixed_b%d'%max_height_id)
         model.addConstr(c[max_height_id] == c[max_height_id].x, name='fixed_c%d'%max_height_id)
 
-        model.optimize()
+        if not solve():
+            return None
+
+    # settling moves items: check the rules again, and that nothing is left in the air
+    # (settling cut short by the time limit)
+    if gravity:
+        lo, hi = current()
+        floating = [int(i) for i in np.nonzero(supportFraction(lo, hi) <= 0)[0]]
+        if floating or (checking and broken()):
+            if verbose:
+                print("settled packing invalid: floating %s, %s" % (floating, broken() if checking else []))
+            return None
 
     # ---------------------------------------- RESULT ----------------------------------------
-    print("\ntime: ", process_time(), "sec")
+    if verbose:
+        print("\ntime: ", process_time(), "sec")
 
     ret_x, ret_y, ret_z, orientation = None, None, None, None
-    if model.Status == GRB.OPTIMAL:
+    item_info = None
+    if model.SolCount > 0:
 
         # position
         getValue = lambda var: var.x
@@ -233,12 +347,18 @@ def packing(container_size, item_size, enlarge=False, visualization=False):
         # orientation
         orientation = extractOrientation(model.getVars())
 
-        # sort by z, then x, then y
+        # in an order every item can be lowered in (stacking.placementOrder)
+        lo = np.array([x_pos, y_pos, z_pos]).T
+        hi = lo + np.array([a_len, b_len, c_len]).T
         item_info = list(zip(range(n_item), ret_x, ret_y, ret_z, orientation))
-        item_info.sort(key=cmp_to_key(compare))
+        order, conflicts = placementOrder(lo, hi)
+        if conflicts and verbose:
+            print("no placement order puts in every item freely: %s" % conflicts)
+        item_info = [item_info[i] for i in order]
 
         # visualize
         if visualization:
+            from visualize import visualize
             seq = list(map(lambda item : item[0], item_info))
             visualize(seq, container_size, x_pos, y_pos, z_pos, a_len, b_len, c_len, shrink_ratio=5)
             for i in range(n_item):
@@ -255,6 +375,7 @@ def packing(container_size, item_size, enlarge=False, visualization=False):
 
 if __name__ == "__main__":
 
+    from param import container_size, item_size
     item_info = packing(container_size, item_size, enlarge=False, visualization=True)
     for item in item_info:
         seq, x, y, z, [o1, o2, o3] = item
@@ -0,0 +1,142 @@
+# Multi-container packing: split a basket over several boxes.
+# Items are assigned first-fit-decreasing by volume; every assignment is checked
+# with the single-container placement engine (packing_gurobi.packing by default, greedy
+# placement when gurobipy is not installed), so each container only ever solves a small model. Every feasibility check has its
+# own time limit: an assignment the engine cannot place in time counts as not fitting.
+# Given a budget, the checks share it, and once it is spent the rest is done by the
+# fallback engine (greedy, milliseconds).
+import time
+import importlib.util
+from param import margin, container_sizes, multi_solve_limit
+from packing_greedy import greedyPacking, orientations
+
+
+def volume(size):
+    return size[0] * size[1] * size[2]
+
+
+def defaultEngine():
+    # the MILP when gurobipy is installed, greedy placement otherwise
+    if importlib.util.find_spec('gurobipy') is None:
+        return greedyPacking
+    from packing_gurobi import packing
+    return packing
+
+
+def fitsAlone(container, dims, handling=None):
+    # some allowed orientation of the item fits in the empty container
+    return any(all(e <= c for e, c in zip(ext, container)) for ext, _, _ in orientations(dims, handling))
+
+
+class Bin:
+    __slots__ = ('kind', 'items', 'used')
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.items = []
+        self.used = 0
+
+
+def _solve(engine, container, dims, items, gravity, weight=None, fragility=None, handling=None, time_limit=None):
+    sizes = [[dims[i][k] for i in items] for k in range(3)]
+    options = {}
+    if time_limit is not None:
+        options['time_limit'] = time_limit
+    if weight is not None:
+        options['weight'] = [weight[i] for i in items]
+    if fragility is not None:
+        options['fragility'] = [fragility[i] for i in items]
+    if handling is not None:
+        options['handling'] = [handling[i] for i in items]
+    return engine(container, sizes, gravity=gravity, verbose=False, **options)
+
+
+# INPUT
+# containers = [[x, y, z], ...]  available container types (any number of each)
+# item_size = [[x1, x2, ...], [y1, y2, ...], [z1, z2, ...]]
+# costs = cost of one container of each type, volume by default
+# weight, fragility, handling = per-item attributes passed on to the engine
+# time_limit = seconds per feasibility check (the engine's time_limit), None for no limit
+# budget = seconds for the whole call, None for no limit; past it fallback replaces engine
+# engine = single-container placement, defaultEngine() if None
+
+def packMulti(containers, item_size, costs=None, enlarge=False, engine=None, weight=None, fragility=None,
+              margin=margin, handling=None, time_limit=multi_solve_limit, budget=None, fallback=greedyPacking):
+    if engine is None:
+        engine = defaultEngine()
+    attrs = {'weight': weight, 'fragility': fragility, 'handling': handling}
+    deadline = None if budget is None else time.time() + budget
+
+    def solve(container, items, gravity):
+        limit = None if gravity else time_limit
+        if deadline is not None:
+            left = deadline - time.time()
+            if left <= 0:
+                return _solve(fallback, container, dims, items, gravity, **attrs)
+            limit = left if limit is None else min(limit, left)
+        return _solve(engine, container, dims, items, gravity, time_limit=limit, **attrs)
+    n_item = len(item_size[0])
+    dims = [[item_size[k][i] + (margin if enlarge else 0) for k in range(3)] for i in range(n_item)]
+    if costs is None:
+        costs = [volume(c) for c in containers]
+    kinds = sorted(range(len(containers)), key=lambda k: costs[k])
+
+    bins = []
+    for i in sorted(range(n_item), key=lambda i: -volume(dims[i])):
+        placed = False
+        for b in bins:
+            container = containers[b.kind]
+            if b.used + volume(dims[i]) > volume(container):
+                continue
+            if solve(container, b.items + [i], False) is not None:
+                b.items.append(i)
+                b.used += volume(dims[i])
+                placed = True
+                break
+        if placed:
+            continue
+        # open the cheapest container the item fits in
+        fitting = [k for k in kinds if fitsAlone(containers[k], dims[i], None if handling is None else handling[i])]
+        if not fitting:
+            raise ValueError('item %d %s does not fit in any container' % (i, dims[i]))
+        b = Bin(fitting[0])
+        b.items.append(i)
+        b.used = volume(dims[i])
+        bins.append(b)
+
+    # try to move each box to a cheaper container type
+    for b in bins:
+        for k in kinds:
+            if costs[k] >= costs[b.kind]:
+                break
+            if b.used <= volume(containers[k]) and \
+                    solve(containers[k], b.items, False) is not None:
+                b.kind = k
+                break
+
+    result = []
+    for b in bins:
+        item_info = solve(containers[b.kind], b.items, True)
+        if item_info is None and deadline is not None:
+            # out of time while placing: the fallback placement
+            item_info = _solve(fallback, containers[b.kind], dims, b.items, True, **attrs)
+        if item_info is None:
+            raise RuntimeError('placement failed for items %s' % b.items)
+        # local index -> basket index
+        item_info = [(b.items[seq], x, y, z, ori) for seq, x, y, z, ori in item_info]
+        result.append((containers[b.kind], item_info))
+    return result
+
+
+# OUTPUT
+# [(container_size, [(item#, centroid_x, centroid_y, bottom_z, ['z', 'x', 'y']), ...]), ...]
+
+if __name__ == "__main__":
+
+    item_size = [[50, 50, 60, 55, 60, 40, 50, 50, 60],
+                 [50, 45, 45, 50, 50, 30, 50, 45, 45],
+                 [50, 30, 30, 35, 30, 30, 50, 30, 30]]
+    for container, item_info in packMulti(container_sizes, item_size, enlarge=True):
+        print(container)
+        for seq, x, y, z, ori in item_info:
+            print('  ', seq, '%.1f' % x, '%.1f' % y, '%.1f' % z, ori)
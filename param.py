@@ -1,57 +1,140 @@
-import numpy as np
-import math
+from pose import Command, CartesianPose, JointPose
+
+# Default lane (see lane.py to run other cameras / arms)
+camera_index = 2
+arm_ip = "169.254.222.242"
+arm_port = 8000
+calibration_dir = './calibration_data'
+# compiled catalog, rebuilt from obj_info.csv next to it when that changes (catalog.py)
+catalog_path = './obj_data/obj_info.npy'
 
 # Serial number
 SN = ''
 number_of_objects = 3
 # Each of inter_pos's elem is a command to move to inter_pos[i]
 
-scan_pos = 'MOVJ -2.5 -3.8 -24.6 9.9 26.7 -8.7\n'
-scan_pos_inv = 'MOVJ # # # # # 171.3\n'
-
-inter_pos_general = "MOVJ 90 # # # # #\n"
-inter_pos = ['MOVP -558 -72 -210 0 0 180\n',
-            'MOVP -351 -72 -210 0 0 180\n',
-            'MOVP -558 38 -210 0 0 180\n',
-            'MOVP -351 38 -210 0 0 180\n',
-            'MOVP -558 148 -210 0 0 180\n',
-            'MOVP -351 148 -210 0 0 180\n']
-inter_pos_rise = ['MOVP -558 -72 0 0 0 180\n',
-            'MOVP -351 -72 0 0 0 180\n',
-            'MOVP -558 38 0 0 0 180\n',
-            'MOVP -351 38 0 0 0 180\n',
-            'MOVP -558 148 0 0 0 180\n',
-            'MOVP -351 148 0 0 0 180\n',]
+scan_pos = JointPose(-2.5, -3.8, -24.6, 9.9, 26.7, -8.7)
+scan_pos_inv = JointPose('#', '#', '#', '#', '#', 171.3)
+
+inter_pos_general = JointPose(90, '#', '#', '#', '#', '#')
+inter_slots = [(-558, -72), (-351, -72),
+               (-558, 38), (-351, 38),
+               (-558, 148), (-351, 148)]
+inter_pos = [CartesianPose(x, y, -210, 0, 0, 180) for x, y in inter_slots]
+inter_pos_rise = [CartesianPose(x, y, 0, 0, 0, 180) for x, y in inter_slots]
 
 # Box size 200mm 130mm
 # Need to consider the object size and dimension
 
 packing_pose_x = 520
 packing_pose_y = -302
-packing_pose = "MOVL {} {} -245 -0.54 2.69 -178.876\n"
-rise_packing = "MOVP # # 0 # # #\n"
-pushing_pose = "MOVP 495.41 23.75 -245 # # #\n"
-calib_pose = "MOVP 0 430 -195 91.382 2.781 181.137\n"
+# container corner; packing() positions are offsets from here (see pose.packingTarget)
+packing_pose = CartesianPose(packing_pose_x, packing_pose_y, -245, -0.54, 2.69, -178.876, cmd='MOVL')
+rise_packing = CartesianPose('#', '#', 0, '#', '#', '#')
+# packing moves (main.py), container y offsets (mm) from the item's spot: it is put down
+# push_start past it, the gripper goes back to push_back and pushes it in -y until it is
+# push_gap behind the item (the container is open on +y)
+push_start = 180
+push_back = 260
+push_gap = 40
+pushing_pose = CartesianPose(495.41, 23.75, -245, '#', '#', '#')
+calib_pose = CartesianPose(0, 430, -195, 91.382, 2.781, 181.137)
 # The calib_pose is of the height of the flattest object's centroid height.
 
-man_pose_J = "MOVJ 40.5 -82.33 40.63 0.02 -50.6 175.24\n"
-man_pose_J_adj = "MOVJ 40.5 -84.5 41.3 0.02 -47.3 175.24\n"
-man_pose_inv = "MOVJ 40.5 -81.31 38.5 0.02 -49.79 #\n"
-man_pose_inv_adj = "MOVJ 40.5 -81.31 38.5 0.02 -49.79 #\n"
+man_pose_J = JointPose(40.5, -82.33, 40.63, 0.02, -50.6, 175.24)
+man_pose_J_adj = JointPose(40.5, -84.5, 41.3, 0.02, -47.3, 175.24)
+man_pose_inv = JointPose(40.5, -81.31, 38.5, 0.02, -49.79, '#')
+man_pose_inv_adj = JointPose(40.5, -81.31, 38.5, 0.02, -49.79, '#')
 # 40.5 -82.32 40.62 0 -47.71 85.25
-Rotate_gripper_90 = "MOVJ # # # # # 85.25\n"
-rise_pose = "MOVP # # -50 # # #\n"
-temp_pose = "MOVJ 40.5 -33.8 -22.15 0 -33.53 179.26\n"
-woman_pose = 'MOVJ 40 -79.98 -5.82 -5.09 77.5 179.25\n'
+Rotate_gripper_90 = JointPose('#', '#', '#', '#', '#', 85.25)
+rise_pose = CartesianPose('#', '#', -50, '#', '#', '#')
+temp_pose = JointPose(40.5, -33.8, -22.15, 0, -33.53, 179.26)
+woman_pose = JointPose(40, -79.98, -5.82, -5.09, 77.5, 179.25)
+home_j6 = JointPose('#', '#', '#', '#', '#', 0)
+# swing the base towards the staging slots so the camera sees the table
+view_clear_pose = JointPose(90, '#', '#', '#', '#', '#')
 
-close_grip = 'OUTPUT 48 ON\n'
-open_grip = 'OUTPUT 48 OFF\n'
+close_grip = Command('OUTPUT 48 ON')
+open_grip = Command('OUTPUT 48 OFF')
+go_home = Command('GOHOME')
 
 # 7x5x2
 
 # packing gurobi
 
 margin = 5
+# load-bearing rules (weights as in obj_info.csv)
+max_load_on_fragile = 10
+min_support = 0.6
+# portfolio solver: latency budget per basket (s), accepted gap to the height lower bound
+packing_budget = 5.0
+packing_gap = 0.05
+# local search stops after this many swaps in a row without a lower plan
+local_search_patience = 50
+# cell size of the height map used by the grid placement engine (mm), None: not used by the
+# portfolio. The grid tries every cell corner, not only box corners, but rounds footprints
+# up to whole cells and costs more per item at fine cells; it has packed higher than the
+# corner engine on sample baskets, so it is only worth turning on next to it
+heightmap_resolution = None
+# arm speeds per motion phase: (SETPTPSPEED %, SETLINESPEED mm/s) for a light, robust item;
+# never below speed_min (the old insertion speed)
+speed_profiles = {'transit': (30, 100), 'approach': (15, 35), 'regrasp': (15, 35), 'insertion': (10, 35)}
+speed_min = (3, 20)
+fragile_speed_factor = 0.5
+heavy_weight = 15
+heavy_speed_factor = 0.7
+# inserting with less free space than this (mm) slows down proportionally
+insertion_clearance = 20.0
+# motion.MotionSocket: send free moves (MOVP / MOVJ) as PTP or MOVL, whichever the motion
+# model estimates faster; off, the model only estimates and reports the move times
+motion_select = False
+# placement motion (travel.py): carrying speed (mm/s) and the time (s) of each
+# trace.GetReady regrasp branch, nominal
+# second packing stage: same boxes, shortest placement motion
+packing_travel = True
+travel_speed = 100.0
+regrasp_time = {'none': 0.0, 'rotate': 8.0, 'roll': 20.0, 'roll_rotate': 26.0, 'flip': 30.0, 'flip_rotate': 36.0}
+# handling cost in the packing engines: mm of plan height one second of regrasp is worth;
+# items put down as picked (no traceRoute / GetReady) cannot be turned: any orientation
+# that does not keep them upright as they were picked costs unhandled_cost (s), and the
+# engines never choose an orientation costing that much
+handling_weight = 0.1
+unhandled_cost = 1000.0
+# placement order (stacking.placementOrder / travel.sequencePlan): time (s) of switching the
+# arm speeds between items of different speed profiles, plans up to sequence_exact items
+# are ordered exactly (all subsets), larger ones greedily
+speed_change_time = 0.5
+sequence_exact = 10
+# metrics (metrics.py): local HTTP endpoint port (None: off), histogram bounds (s) of the
+# Prometheus export
+metrics_port = 9108
+metrics_buckets = [0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300]
+# multi-frame detection (fusion.py): frames per picture, centroid (mm) / angle (deg)
+# spread at which the confidence drops to 0, objects seen in fewer frames are noise;
+# detections at least fusion_confident are shown as confident
+fusion_window = 10
+fusion_centroid_tol = 2.0
+fusion_angle_tol = 3.0
+fusion_min_seen = 0.5
+fusion_confident = 0.8
+# QR scan statistics (scan.py): which scan found the code, per SN and footprint face;
+# footprints within footprint_tol (mm, summed over both edges) identify the candidates,
+# and their order is used once they have scan_min_observations scans recorded
+scan_stats_path = './obj_data/scan_stats.json'
+footprint_tol = 6.0
+scan_min_observations = 3
+# reachability grid (reach.py), rebuilt when the arm model changes; node spacing (mm)
+reach_path = './calibration_data/reach.npz'
+reach_step = 10.0
+# workspace for the collision checks (controller coordinates, mm): table / container
+# floor height, gripper box above the tool point, container wall thickness
+floor_z = -280
+gripper_size = (30, 30, 150)
+container_wall = 5
 container_size = [95, 150, 80]
+# boxes available when a basket has to be split (packing_multi)
+container_sizes = [[95, 150, 80], [150, 200, 100]]
+# time limit (s) of each feasibility check there, running out of time counts as infeasible
+multi_solve_limit = 1.0
 item_size = [[50, 50, 60], [50, 45, 45], [50, 30, 30]]
 
@@ -0,0 +1,187 @@
+# Portfolio packing: several strategies run at once in worker processes, the best
+# plan found so far is shared, and everything is stopped as soon as the plan is
+# good enough or the latency budget for the basket is spent.
+import time
+import random
+import itertools
+import multiprocessing as mp
+import queue
+from param import margin, packing_budget, packing_gap, heightmap_resolution, min_support, local_search_patience
+from stacking import planBoxes, planHeight, settle, planInfo
+from packing_greedy import greedyPacking
+from validate import validatePlan, describe
+
+
+def lowerBound(container_size, dims):
+    # no plan can be lower than the stacked volume over the floor, or than the
+    # smallest side of any item
+    volume = sum(d[0] * d[1] * d[2] for d in dims)
+    return max(volume / float(container_size[0] * container_size[1]), max(min(d) for d in dims))
+
+
+def _orders(dims, kind, seed=0):
+    n = len(dims)
+    if kind == 'volume':
+        return sorted(range(n), key=lambda i: -dims[i][0] * dims[i][1] * dims[i][2])
+    if kind == 'footprint':
+        return sorted(range(n), key=lambda i: -sorted(dims[i])[1] * sorted(dims[i])[2])
+    if kind == 'longest':
+        return sorted(range(n), key=lambda i: -max(dims[i]))
+    order = list(range(n))
+    random.Random(seed).shuffle(order)
+    return order
+
+
+def _height(item_info, item_size):
+    return planHeight(*planBoxes(item_info, item_size))
+
+# ---------------------------------------- STRATEGIES ----------------------------------------
+# every strategy puts (name, height, item_info) on out for each plan it finds;
+# best.value is the lowest height reported by any worker
+
+
+def milpStrategy(out, best, container_size, item_size, options, time_limit):
+    from packing_gurobi import packing
+    item_info = packing(container_size, [list(r) for r in item_size], gravity=False, verbose=False,
+                        time_limit=time_limit, **options)
+    if item_info is not None:
+        # cheap settling instead of the gravity re-solves
+        lo, hi = planBoxes(item_info, item_size)
+        orientation = {seq: ori for seq, _, _, _, ori in item_info}
+        lo, hi = settle(lo, hi)
+        item_info = planInfo(lo, hi, [orientation[i] for i in range(len(lo))])
+        out.put(('milp', _height(item_info, item_size), item_info))
+
+
+def greedyStrategy(out, best, container_size, item_size, options, kind, resolution=None):
+    dims = list(zip(*item_size))
+    item_info = greedyPacking(container_size, item_size, order=_orders(dims, kind), resolution=resolution,
+                              **options)
+    if item_info is not None:
+        name = 'greedy-' + kind if resolution is None else 'heightmap-' + kind
+        out.put((name, _height(item_info, item_size), item_info))
+
+
+def localSearchStrategy(out, best, container_size, item_size, options, seed, patience=local_search_patience):
+    # swap two items of the placement order, keep the swap when the plan gets lower; stops
+    # once every pair was tried or patience swaps in a row gave nothing lower
+    rng = random.Random(seed)
+    dims = list(zip(*item_size))
+    order = _orders(dims, 'volume')
+    cur = None
+    item_info = greedyPacking(container_size, item_size, order=order, **options)
+    if item_info is not None:
+        cur = _height(item_info, item_size)
+    pairs = list(itertools.combinations(range(len(order)), 2))
+    untried = rng.sample(pairs, len(pairs))
+    stale = 0
+    while untried and stale < patience:
+        i, j = untried.pop()
+        order[i], order[j] = order[j], order[i]
+        item_info = greedyPacking(container_size, item_size, order=order, **options)
+        h = None if item_info is None else _height(item_info, item_size)
+        if h is not None and (cur is None or h < cur - 1e-6):
+            cur = h
+            if h < best.value - 1e-6:
+                out.put(('local', h, item_info))
+            untried = rng.sample(pairs, len(pairs))
+            stale = 0
+        else:
+            order[i], order[j] = order[j], order[i]
+            stale += 1
+
+
+def defaultStrategies(budget):
+    strategies = [(milpStrategy, (budget,)),
+                  (greedyStrategy, ('volume',)),
+                  (greedyStrategy, ('footprint',)),
+                  (greedyStrategy, ('longest',)),
+                  (localSearchStrategy, (1,)),
+                  (localSearchStrategy, (2,))]
+    if heightmap_resolution is not None:
+        strategies.append((greedyStrategy, ('volume', heightmap_resolution)))
+    return strategies
+
+
+def _run(strategy, args, out, best, container_size, item_size, options):
+    try:
+        strategy(out, best, container_size, item_size, options, *args)
+    finally:
+        out.put(None)
+
+
+# INPUT same as packing_gurobi.packing
+# budget = hard latency limit (s), target = stop as soon as a plan is this low (mm);
+# by default within packing_gap of the lower bound
+# accept(item_info, item_size, container_size) -> problems; plans with problems are rejected
+# (e.g. reach.placementProblems: unreachable or colliding placements)
+# returns (item_info, height, strategy name), item_info is None if nothing was found in time
+
+def solvePortfolio(container_size, item_size, enlarge=False, budget=packing_budget, target=None,
+                   strategies=None, verbose=True, margin=margin, accept=None, **options):
+    start = time.time()
+    deadline = start + budget
+    n_item = len(item_size[0])
+    # plans are checked on the real sizes, margin apart
+    raw_size = [list(item_size[k]) for k in range(3)]
+    clearance = margin if enlarge else 0.0
+    item_size = [[item_size[k][i] + (margin if enlarge else 0) for i in range(n_item)] for k in range(3)]
+    if target is None:
+        target = lowerBound(container_size, list(zip(*item_size))) * (1 + packing_gap)
+    if strategies is None:
+        strategies = defaultStrategies(budget)
+
+    out = mp.Queue()
+    best = mp.Value('d', float('inf'), lock=False)
+    workers = [mp.Process(target=_run, args=(strategy, args, out, best, container_size, item_size, options),
+                          daemon=True) for strategy, args in strategies]
+    for w in workers:
+        w.start()
+
+    result = (None, float('inf'), None)
+    running = len(workers)
+    try:
+        while running and result[1] > target:
+            try:
+                msg = out.get(timeout=max(deadline - time.time(), 0))
+            except queue.Empty:
+                break
+            if msg is None:
+                running -= 1
+                continue
+            name, height, item_info = msg
+            if height < result[1]:
+                report = validatePlan(item_info, raw_size, container_size, clearance,
+                                      options.get('min_support', min_support))
+                if not report.ok:
+                    if verbose:
+                        print("%s: plan rejected, %s" % (name, '; '.join(describe(report))))
+                    continue
+                problems = accept(item_info, item_size, container_size) if accept is not None else []
+                if problems:
+                    if verbose:
+                        print("%s: plan rejected, %s" % (name, '; '.join(problems)))
+                    continue
+                result = (item_info, height, name)
+                best.value = height
+                if verbose:
+                    print("%.3fs %s: %.1f mm (target %.1f)" % (time.time() - start, name, height, target))
+    finally:
+        for w in workers:
+            if w.is_alive():
+                w.terminate()
+        for w in workers:
+            w.join()
+    return result
+
+
+if __name__ == "__main__":
+
+    from param import container_size
+    rng = random.Random(0)
+    item_size = [[rng.choice([30, 40, 50, 60]) for _ in range(8)] for k in range(3)]
+    item_info, height, name = solvePortfolio(container_size, item_size, enlarge=True)
+    print(name, height)
+    if item_info is not None:
+        for seq, x, y, z, [o1, o2, o3] in item_info:
+            print(seq, '%.1f' % x, '%.1f' % y, '%.1f' % z, [o1, o2, o3])
@@ -0,0 +1,165 @@
+# Pose / command library for the arm controller.
+# Every pose is validated once and keeps its encoded bytes, so sending a pose
+# costs no string formatting or encoding at runtime.
+# '#' (or None) keeps the current value of that axis on the controller.
+
+import math
+
+WILDCARD = '#'
+PRECISION = 3
+
+CARTESIAN_CMDS = ('MOVP', 'MOVL')
+JOINT_CMDS = ('MOVJ',)
+
+
+def formatValue(v, precision=PRECISION):
+    # fixed precision, trailing zeros stripped: 180.0 -> '180', -0.5401 -> '-0.54'
+    if v is None or v == WILDCARD:
+        return WILDCARD
+    text = '%.*f' % (precision, v)
+    if '.' in text:
+        text = text.rstrip('0').rstrip('.')
+    if text == '-0':
+        text = '0'
+    return text
+
+
+def _checkValues(values, n):
+    if len(values) != n:
+        raise ValueError('expected %d values, got %d' % (n, len(values)))
+    checked = []
+    for v in values:
+        if v is None or v == WILDCARD:
+            checked.append(None)
+            continue
+        v = float(v)
+        if not math.isfinite(v):
+            raise ValueError('pose value must be finite, got %r' % v)
+        checked.append(v)
+    return tuple(checked)
+
+
+class Command:
+    # A plain controller command, e.g. 'GOHOME', 'OUTPUT 48 ON', 'SETPTPSPEED 3'
+    __slots__ = ('text', '_bytes')
+
+    def __init__(self, text):
+        text = text.strip()
+        if not text:
+            raise ValueError('empty command')
+        self.text = text
+        self._bytes = (text + '\n').encode('ascii')
+
+    @property
+    def cmd(self):
+        return self.text.split(' ', 1)[0]
+
+    def encode(self, encoding='ascii'):
+        # drop-in replacement for str.encode('ascii') at the old call sites
+        return self._bytes
+
+    def __str__(self):
+        return self.text + '\n'
+
+    def __repr__(self):
+        return '%s(%r)' % (type(self).__name__, self.text)
+
+    def __eq__(self, other):
+        return isinstance(other, Command) and self._bytes == other._bytes
+
+    def __hash__(self):
+        return hash(self._bytes)
+
+
+class _Pose(Command):
+    __slots__ = ('values',)
+    N_AXES = 6
+    COMMANDS = ()
+
+    def __init__(self, cmd, *values):
+        if cmd not in self.COMMANDS:
+            raise ValueError('%s does not accept %r' % (type(self).__name__, cmd))
+        self.values = _checkValues(values, self.N_AXES)
+        Command.__init__(self, ' '.join([cmd] + [formatValue(v) for v in self.values]))
+
+    def isComplete(self):
+        return None not in self.values
+
+    def resolve(self, current):
+        # fill the wildcards from a known pose of the same kind
+        values = [c if v is None else v for v, c in zip(self.values, current.values)]
+        return self._rebuild(values)
+
+
+class CartesianPose(_Pose):
+    # x y z (mm), rx ry rz (deg)
+    __slots__ = ()
+    COMMANDS = CARTESIAN_CMDS
+
+    def __init__(self, x, y, z, rx, ry, rz, cmd='MOVP'):
+        _Pose.__init__(self, cmd, x, y, z, rx, ry, rz)
+
+    def offset(self, dx=0, dy=0, dz=0):
+        values = list(self.values)
+        for k, d in enumerate((dx, dy, dz)):
+            if d:
+                if values[k] is None:
+                    raise ValueError('cannot offset a wildcard axis')
+                values[k] += d
+        return CartesianPose(*values, cmd=self.cmd)
+
+    def withCmd(self, cmd):
+        return CartesianPose(*self.values, cmd=cmd)
+
+    def _rebuild(self, values):
+        return CartesianPose(*values, cmd=self.cmd)
+
+    x = property(lambda self: self.values[0])
+    y = property(lambda self: self.values[1])
+    z = property(lambda self: self.values[2])
+
+
+class JointPose(_Pose):
+    # j1 .. j6 (deg)
+    __slots__ = ()
+    COMMANDS = JOINT_CMDS
+
+    def __init__(self, j1, j2, j3, j4, j5, j6):
+        _Pose.__init__(self, 'MOVJ', j1, j2, j3, j4, j5, j6)
+
+    def _rebuild(self, values):
+        return JointPose(*values)
+
+
+def parse(text):
+    # 'MOVP -558 -72 -210 0 0 180\n' -> CartesianPose, 'GOHOME' -> Command
+    if isinstance(text, Command):
+        return text
+    tokens = text.split()
+    if not tokens:
+        raise ValueError('empty command')
+    cmd, args = tokens[0], tokens[1:]
+    if cmd in CARTESIAN_CMDS:
+        return CartesianPose(*args, cmd=cmd)
+    if cmd in JOINT_CMDS:
+        return JointPose(*args)
+    return Command(text)
+
+
+def packingTarget(origin, packing_x, packing_y, z=None, cmd=None):
+    # container position (mm, from packing()) -> arm coordinates
+    # origin is the container corner pose (packing_pose_x, packing_pose_y in param.py);
+    # this is the only place where that offset is applied
+    values = list(origin.values)
+    values[0] += packing_x
+    values[1] += packing_y
+    if z is not None:
+        values[2] = z
+    return CartesianPose(*values, cmd=cmd or origin.cmd)
+
+
+def sendCommands(s, *commands):
+    # one buffered write for a batch of commands instead of one sendall each
+    if len(commands) == 1 and isinstance(commands[0], (list, tuple)):
+        commands = commands[0]
+    s.sendall(b''.join(c.encode('ascii') for c in commands))
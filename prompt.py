@@ -0,0 +1,29 @@
+# Operator prompts and preview windows.
+# The checkout process waits for the operator after arm moves (waitForArm) and
+# shows camera previews (display). Unattended lanes (orchestrator.py, simulated
+# arms) call unattended() so nothing blocks on stdin or needs a screen.
+import time
+import metrics
+
+handler = input
+display = True
+
+
+def waitForArm(msg=''):
+    reply = handler(msg)
+    # one step of the work loop (orchestrator.py judges a lane's progress by it)
+    metrics.count('prompts')
+    return reply
+
+
+def unattended(delay=0.0):
+    # prompts are printed and take `delay` seconds instead of waiting for enter
+    global handler, display
+
+    def wait(msg=''):
+        if msg:
+            print(msg)
+        time.sleep(delay)
+        return ''
+    handler = wait
+    display = False
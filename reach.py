@@ -0,0 +1,338 @@
+# Reachability grid and swept-volume collision checks for placements and staging poses.
+#
+# ReachGrid: the arm's reachable workspace for the tool pointing down (every pick,
+# staging and packing pose), built offline from the kinematics in motion.py. J1 only
+# turns the arm about the base axis, so the workspace is a table over (radius, height)
+# in the base frame plus the J1 limits; building it solves the closed-form IK of each
+# node (spherical wrist), a query is a couple of array lookups.
+#
+# Workspace: axis-aligned boxes (staged items, container walls, packed items) and the
+# volume swept by the gripper and the item it carries moving along a straight segment
+# (slab test of the segment against the obstacles grown by the carried box).
+#
+#   python3 reach.py --build              rebuild the grid
+#   python3 reach.py                      check the staging / packing poses of param.py
+import os
+import math
+import numpy as np
+from functools import lru_cache
+from motion import DH, JOINT_MIN, JOINT_MAX, BASE_Z, BASE_ROT, TOOL_LENGTH, transform, forward
+from stacking import planBoxes
+from param import reach_path, reach_step, floor_z, gripper_size, container_wall, packing_pose, push_start, \
+    push_back, push_gap
+
+# grid extent (tool point) in the base (DH) frame, mm
+R_MAX = 1000.0
+Z_MIN = -400.0
+Z_MAX = 1200.0
+# tool pointing down (any turn about the tool axis only moves J6)
+TOOL_DOWN = np.diag([1.0, -1.0, -1.0])
+
+
+def _fit(angle, k):
+    # angle (deg) moved by whole turns into the limits of joint k, None if it does not fit
+    for a in (angle, angle - 360.0, angle + 360.0):
+        if JOINT_MIN[k] - 1e-6 <= a <= JOINT_MAX[k] + 1e-6:
+            return a
+    return None
+
+
+def solutions(p, R, tol=0.05):
+    # closed-form IK, every configuration inside the joint limits (deg); verified by forward()
+    a2 = DH[1, 0]
+    a3, d4, d6 = DH[2, 0], DH[3, 2], DH[5, 2]
+    L3 = math.hypot(a3, d4)
+    phi = math.atan2(d4, a3)
+    w = p - d6 * R[:, 2]
+    result = []
+    base = math.degrees(math.atan2(w[1], w[0]))
+    for q1 in (base, base + 180.0):
+        q1 = _fit(q1, 0)
+        if q1 is None:
+            continue
+        # wrist centre in frame 1: a planar 2-link problem for J2, J3
+        T1 = transform([q1], 1)
+        u, v, _ = T1[:3, :3].T @ (w - T1[:3, 3])
+        K = (u * u + v * v - a2 * a2 - L3 * L3) / (2 * a2)
+        if abs(K) > L3:
+            continue
+        for sign in (1.0, -1.0):
+            t3 = sign * math.acos(K / L3) - phi
+            vx, vy = a2 + a3 * math.cos(t3) - d4 * math.sin(t3), a3 * math.sin(t3) + d4 * math.cos(t3)
+            t2 = math.atan2(v, u) - math.atan2(vy, vx)
+            q2 = _fit(math.degrees(t2) - DH[1, 3], 1)
+            q3 = _fit(math.degrees(t3) - DH[2, 3], 2)
+            if q2 is None or q3 is None:
+                continue
+            # wrist: R3_6 = Rz(q4) Ry(-q5) Rz(q6)
+            M = transform([q1, q2, q3], 3)[:3, :3].T @ R
+            beta = math.acos(max(-1.0, min(1.0, M[2, 2])))
+            for b in (beta, -beta):
+                if abs(math.sin(b)) < 1e-9:
+                    t4, t6 = 0.0, math.atan2(M[1, 0], M[0, 0])
+                else:
+                    s = math.copysign(1.0, math.sin(b))
+                    t4 = math.atan2(s * M[1, 2], s * M[0, 2])
+                    t6 = math.atan2(s * M[2, 1], -s * M[2, 0])
+                q = [q1, q2, q3, _fit(math.degrees(t4), 3), _fit(-math.degrees(b), 4), _fit(math.degrees(t6), 5)]
+                if None in q:
+                    continue
+                q = np.array(q)
+                pq, Rq = forward(q)
+                if np.abs(pq - p).max() < tol and np.abs(Rq - R).max() < 1e-3:
+                    result.append(q)
+    return result
+
+
+def _signature(step):
+    # what the grid depends on; a grid built for another model is rebuilt
+    return np.concatenate([DH.ravel(), JOINT_MIN, JOINT_MAX, [BASE_Z, BASE_ROT, TOOL_LENGTH, step, R_MAX, Z_MIN, Z_MAX]])
+
+
+class ReachGrid:
+
+    def __init__(self, front, back, step):
+        # front / back: node reachable with J1 facing the point / turned away from it
+        # (reaching over the base); a cell counts only if all four of its nodes do
+        self.step = step
+        self.front = front
+        self.back = back
+        self.cells = [g[:-1, :-1] & g[1:, :-1] & g[:-1, 1:] & g[1:, 1:] for g in (front, back)]
+        self.n_r, self.n_z = self.cells[0].shape
+
+    @classmethod
+    def build(cls, step=reach_step):
+        rs = np.arange(0.0, R_MAX + step / 2, step)
+        zs = np.arange(Z_MIN, Z_MAX + step / 2, step)
+        front = np.zeros((len(rs), len(zs)), dtype=bool)
+        back = np.zeros_like(front)
+        for i, r in enumerate(rs):
+            for k, z in enumerate(zs):
+                # on the y axis both J1 = 90 (facing) and J1 = -90 (turned away) are inside the
+                # limits; the flange is TOOL_LENGTH above the tool point
+                for q in solutions(np.array([0.0, r, z + TOOL_LENGTH]), TOOL_DOWN):
+                    if q[0] > 0:
+                        front[i, k] = True
+                    else:
+                        back[i, k] = True
+        return cls(front, back, step)
+
+    def save(self, path=reach_path):
+        tmp = path + '.tmp.npz'
+        np.savez(tmp, front=self.front, back=self.back, signature=_signature(self.step))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path=reach_path, step=reach_step):
+        data = np.load(path)
+        signature = _signature(step)
+        if data['signature'].shape != signature.shape or not np.allclose(data['signature'], signature):
+            raise ValueError('%s was built for another arm model' % path)
+        return cls(data['front'], data['back'], step)
+
+    def _cell(self, x, y, z):
+        # controller coordinates -> (radius cell, height cell, J1 facing the point (deg))
+        c, s = math.cos(math.radians(BASE_ROT)), math.sin(math.radians(BASE_ROT))
+        bx, by = c * x - s * y, s * x + c * y
+        i = int(math.hypot(bx, by) // self.step)
+        k = int((z + BASE_Z - Z_MIN) // self.step)
+        return i, k, math.degrees(math.atan2(by, bx))
+
+    def reachable(self, x, y, z):
+        # tool pointing down at (x, y, z) in controller coordinates
+        i, k, theta = self._cell(x, y, z)
+        if not (0 <= i < self.n_r and 0 <= k < self.n_z):
+            return False
+        if self.cells[0][i, k] and _fit(theta, 0) is not None:
+            return True
+        back = theta + 180.0 if theta < 0 else theta - 180.0
+        return bool(self.cells[1][i, k]) and _fit(back, 0) is not None
+
+    def reachableMany(self, points):
+        # vectorized reachable() over an (n, 3) array
+        p = np.atleast_2d(np.asarray(points, dtype=float))
+        c, s = math.cos(math.radians(BASE_ROT)), math.sin(math.radians(BASE_ROT))
+        bx, by = c * p[:, 0] - s * p[:, 1], s * p[:, 0] + c * p[:, 1]
+        i = np.floor(np.hypot(bx, by) / self.step).astype(int)
+        k = np.floor((p[:, 2] + BASE_Z - Z_MIN) / self.step).astype(int)
+        inside = (i >= 0) & (i < self.n_r) & (k >= 0) & (k < self.n_z)
+        i, k = np.where(inside, i, 0), np.where(inside, k, 0)
+        theta = np.degrees(np.arctan2(by, bx))
+        back = np.where(theta < 0, theta + 180.0, theta - 180.0)
+        front_ok = self.cells[0][i, k] & (theta >= JOINT_MIN[0]) & (theta <= JOINT_MAX[0])
+        back_ok = self.cells[1][i, k] & (back >= JOINT_MIN[0]) & (back <= JOINT_MAX[0])
+        return inside & (front_ok | back_ok)
+
+
+@lru_cache(maxsize=None)
+def reachGrid(path=reach_path, step=reach_step):
+    # the grid of this arm model, built (and saved) on first use if missing or stale
+    try:
+        return ReachGrid.load(path, step)
+    except (OSError, ValueError, KeyError):
+        grid = ReachGrid.build(step)
+        if os.path.isdir(os.path.dirname(path) or '.'):
+            grid.save(path)
+        return grid
+
+
+# ---------------------------------------- COLLISIONS ----------------------------------------
+
+def carried(ext):
+    # (lo, hi) offsets from the tool point of the gripper and the item it holds by its
+    # top face, ext = item extent along x, y, z
+    gx, gy, gz = gripper_size
+    ex, ey, ez = ext
+    lo = np.array([-max(gx, ex) / 2, -max(gy, ey) / 2, -ez])
+    hi = np.array([max(gx, ex) / 2, max(gy, ey) / 2, gz])
+    return lo, hi
+
+
+class Workspace:
+    # axis-aligned obstacles (controller coordinates, mm)
+
+    def __init__(self):
+        self.lo = np.zeros((0, 3))
+        self.hi = np.zeros((0, 3))
+        self.labels = []
+
+    def add(self, lo, hi, label=None):
+        self.lo = np.vstack([self.lo, np.reshape(lo, (-1, 3))])
+        self.hi = np.vstack([self.hi, np.reshape(hi, (-1, 3))])
+        self.labels += [label] * (len(self.lo) - len(self.labels))
+        return self
+
+    def remove(self, label):
+        keep = np.array([l != label for l in self.labels], dtype=bool)
+        self.lo, self.hi = self.lo[keep], self.hi[keep]
+        self.labels = [l for l in self.labels if l != label]
+
+    def addContainer(self, origin, container_size, label='container', open_back=False):
+        # walls around [origin, origin + container_size] on the floor (-x, +x, -y, +y);
+        # open_back leaves out the +y wall
+        x0, y0 = origin
+        X, Y, Z = container_size
+        t = container_wall
+        z0, z1 = floor_z, floor_z + Z
+        walls = 3 if open_back else 4
+        self.add([[x0 - t, y0 - t, z0], [x0 + X, y0 - t, z0], [x0 - t, y0 - t, z0], [x0 - t, y0 + Y, z0]][:walls],
+                 [[x0, y0 + Y + t, z1], [x0 + X + t, y0 + Y + t, z1], [x0 + X + t, y0, z1], [x0 + X + t, y0 + Y + t, z1]][:walls],
+                 label)
+        return self
+
+    def sweep(self, a, b, lo, hi, tol=0.5):
+        # indices of the obstacles hit by the box [p + lo, p + hi] moving from a to b
+        if not len(self.lo):
+            return np.zeros(0, dtype=int)
+        a = np.asarray(a, dtype=float)
+        d = np.asarray(b, dtype=float) - a
+        # obstacles grown by the moving box (less tol: touching is not a collision)
+        glo = self.lo - np.asarray(hi) + tol
+        ghi = self.hi - np.asarray(lo) - tol
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t0 = (glo - a) / d
+            t1 = (ghi - a) / d
+        still = d == 0
+        inside = (a >= glo) & (a <= ghi)
+        enter = np.where(still, np.where(inside, -np.inf, np.inf), np.minimum(t0, t1)).max(axis=1)
+        leave = np.where(still, np.where(inside, np.inf, -np.inf), np.maximum(t0, t1)).min(axis=1)
+        return np.nonzero((enter <= leave) & (leave >= 0) & (enter <= 1))[0]
+
+    def path(self, points, lo, hi, tol=0.5):
+        # first collision along a polyline of tool positions: (segment, label) or None
+        for n in range(len(points) - 1):
+            hit = self.sweep(points[n], points[n + 1], lo, hi, tol)
+            if len(hit):
+                return n, self.labels[hit[0]]
+        return None
+
+
+# ---------------------------------------- CHECKS ----------------------------------------
+
+def placementProblems(item_info, item_size, container_size, origin, grid=None, clear_z=0.0,
+                      tool_z=packing_pose.values[2]):
+    # plan in placement order -> problems (empty list: every item can be put in), along the
+    # packing moves of main.py: the item is lowered from clear_z to tool_z push_start past
+    # its spot and let go, the gripper rises, goes down to tool_z at push_back and pushes the
+    # item in -y until it is push_gap behind it. Every tool pose must be reachable, the item
+    # and the gripper must not hit the walls or the items already in (nor the gripper the
+    # item it has just let go); the container is open on +y, where the items come in
+    grid = reachGrid() if grid is None else grid
+    lo, hi = planBoxes(item_info, item_size)
+    base = np.array([origin[0], origin[1], floor_z])
+    ws = Workspace().addContainer(origin, container_size, open_back=True)
+    gripper = carried((0.0, 0.0, 0.0))
+    problems = []
+    for item in item_info:
+        seq = item[0]
+        ext = hi[seq] - lo[seq]
+        x = origin[0] + (lo[seq, 0] + hi[seq, 0]) / 2
+        y = origin[1] + (lo[seq, 1] + hi[seq, 1]) / 2
+        start, back, stop = y + push_start, y + push_back, y + ext[1] / 2 + push_gap
+        for p in ((x, start, clear_z), (x, start, tool_z), (x, back, tool_z), (x, stop, tool_z)):
+            if not grid.reachable(*p):
+                problems.append('item %d: (%.0f, %.0f, %.0f) out of reach' % ((seq,) + p))
+        hit = ws.path([(x, start, clear_z), (x, start, tool_z)], *carried(ext))
+        if hit is not None:
+            problems.append('item %d: putting it down hits %s' % (seq, hit[1]))
+        # the item where it was let go, in the way of the gripper going behind it
+        # (from clear_z: rising straight out of it is not checked)
+        shift = np.array([0.0, push_start, 0.0])
+        ws.add(lo[seq] + base + shift, hi[seq] + base + shift, 'released')
+        hit = ws.path([(x, start, clear_z), (x, back, tool_z)], *gripper)
+        if hit is not None:
+            problems.append('item %d: the gripper going behind it hits %s' % (seq, hit[1]))
+        ws.remove('released')
+        # the push: the gripper and the item in front of it
+        hit = ws.path([(x, back, tool_z), (x, stop, tool_z)], *gripper)
+        if hit is not None:
+            problems.append('item %d: the gripper pushing it hits %s' % (seq, hit[1]))
+        hit = ws.path([(0.0, push_start, 0.0), (0.0, 0.0, 0.0)], lo[seq] + base, hi[seq] + base)
+        if hit is not None:
+            problems.append('item %d: pushing it in hits %s' % (seq, hit[1]))
+        ws.add(lo[seq] + base, hi[seq] + base, 'item %d' % seq)
+    return problems
+
+
+def posesProblems(poses, grid=None):
+    # Cartesian poses (wildcards skipped) that are out of reach
+    grid = reachGrid() if grid is None else grid
+    problems = []
+    for pose in poses:
+        x, y, z = pose.values[:3]
+        if None not in (x, y, z) and not grid.reachable(x, y, z):
+            problems.append('%s out of reach' % pose.text)
+    return problems
+
+
+if __name__ == "__main__":
+
+    import sys
+    import time
+    if '--build' in sys.argv:
+        start = time.time()
+        grid = ReachGrid.build()
+        grid.save()
+        print('%d x %d nodes, %.0f%% reachable, %.1f s -> %s' % (grid.front.shape + (
+            100.0 * (grid.front | grid.back).mean(), time.time() - start, reach_path)))
+        sys.exit(0)
+
+    from param import inter_pos, inter_pos_rise, packing_pose, container_size, packing_pose_x, packing_pose_y
+    grid = reachGrid()
+    for line in posesProblems(inter_pos + inter_pos_rise + [packing_pose]) or ['staging / packing poses reachable']:
+        print(line)
+    # query cost
+    points = np.random.default_rng(0).uniform([-800, -800, -400], [800, 800, 200], (100000, 3))
+    start = time.time()
+    ok = grid.reachableMany(points)
+    print('reachableMany: %.2f us / point, %.0f%% reachable' % ((time.time() - start) * 1e6 / len(points), 100 * ok.mean()))
+    start = time.time()
+    for x, y, z in points[:10000]:
+        grid.reachable(x, y, z)
+    print('reachable: %.2f us / query' % ((time.time() - start) * 1e6 / 10000))
+    ws = Workspace().addContainer((packing_pose_x, packing_pose_y), container_size)
+    lo, hi = carried((50, 50, 40))
+    start = time.time()
+    for n in range(1000):
+        ws.sweep((packing_pose_x + 40, packing_pose_y + 60, 0), (packing_pose_x + 40, packing_pose_y + 60, -250), lo, hi)
+    print('sweep: %.2f us / segment (%d obstacles)' % ((time.time() - start) * 1e3, len(ws.lo)))
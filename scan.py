@@ -0,0 +1,153 @@
+# Scan-pose ordering from the history of QR scans.
+# detect tries the code in up to six scans, in three grips of the item:
+#   grip     the item as picked         scan_pos, then scan_pos_inv (J6 turned)
+#   regrasp  turned 90 deg in the hand  scan_pos, scan_pos_inv
+#   roll     rolled over (woman_pose)   scan_pos, scan_pos_inv
+# For every SN and footprint face (the face seen from the camera, as in
+# detect.match2database) the scan that found the code is counted. When the picked item
+# can be told from its footprint, the candidates' counts give the order of the scans
+# inside each grip and whether the regrasp is put off until after the roll (the item
+# cannot be given back its picked grip once turned, and the roll is never put off).
+# Every lane keeps its counts in a file of its own and reads those of all lanes.
+import os
+import json
+import glob
+import numpy as np
+from param import scan_stats_path, footprint_tol, scan_min_observations
+
+ATTEMPTS = (('grip', 'scan'), ('grip', 'inv'), ('regrasp', 'scan'), ('regrasp', 'inv'),
+            ('roll', 'scan'), ('roll', 'inv'))
+STAGES = ('grip', 'regrasp', 'roll')
+DEFAULT_ORDER = tuple(range(len(ATTEMPTS)))
+
+
+def footprintFaces(dims, actual_length):
+    # (n, 3) catalog edges, measured footprint -> (face index, error) per item; faces are
+    # 0 = (a, b), 1 = (b, c), 2 = (a, c), ties broken as in detect.match2database
+    dims = np.atleast_2d(np.asarray(dims, dtype=float))
+    big, small = max(actual_length), min(actual_length)
+    a, b, c = dims[:, 0], dims[:, 1], dims[:, 2]
+    err = np.stack([abs(a - big) + abs(b - small), abs(b - big) + abs(c - small), abs(a - big) + abs(c - small)],
+                   axis=1)
+    face = np.argmin(err, axis=1)
+    return face, err[np.arange(len(dims)), face]
+
+
+def expectedScans(order, p):
+    # mean number of scans until the code is found, p = chance of each attempt; a code
+    # behind an attempt not in order is never found and costs every scan of the order
+    order = list(order)
+    expected = sum((n + 1) * p[k] for n, k in enumerate(order))
+    missed = sum(p[k] for k in range(len(p)) if k not in order)
+    return float(expected + missed * len(order))
+
+
+def _load(path):
+    with open(path) as f:
+        return {k: list(v) for k, v in json.load(f).items()}
+
+
+class ScanStats:
+
+    def __init__(self, path=scan_stats_path, lane=None):
+        # lane: counts written to path with the lane name before the extension; counts of
+        # path and of every lane's file are read
+        self.counts = {}
+        self.own = {}
+        self.path = path
+        # this session
+        self.items = 0
+        self.scans = 0
+        self.saved = 0.0
+        if not path:
+            return
+        root, ext = os.path.splitext(path)
+        if lane is not None:
+            self.path = '%s.%s%s' % (root, lane, ext)
+        for name in sorted(set([path] + glob.glob(glob.escape(root) + '.*' + ext))):
+            try:
+                counts = _load(name)
+            except (OSError, ValueError):
+                continue
+            if name == self.path:
+                self.own = {k: list(v) for k, v in counts.items()}
+            for k, v in counts.items():
+                total = self.counts.setdefault(k, [0] * len(ATTEMPTS))
+                for n, c in enumerate(v):
+                    total[n] += c
+
+    @staticmethod
+    def key(SN, face):
+        return '%d:%d' % (SN, face)
+
+    def record(self, SN, face, attempt, scans=None):
+        # attempt (index into ATTEMPTS) found the code of SN held with footprint face
+        for counts in (self.counts, self.own):
+            counts.setdefault(self.key(SN, face), [0] * len(ATTEMPTS))[attempt] += 1
+        self.items += 1
+        self.scans += attempt + 1 if scans is None else scans
+        self.save()
+
+    def save(self):
+        # this lane's file only, other lanes' counts are left to them; atomic
+        if not self.path:
+            return
+        tmp = '%s.%d.tmp' % (self.path, os.getpid())
+        with open(tmp, 'w') as f:
+            json.dump(self.own, f)
+        os.replace(tmp, self.path)
+
+    def candidates(self, actual_length, catalog):
+        # (SN, face) of the catalog items whose footprint matches the measured one
+        face, err = footprintFaces(np.stack([catalog.table['a'], catalog.table['b'], catalog.table['c']], axis=1),
+                                   actual_length)
+        match = np.nonzero(err <= footprint_tol)[0]
+        return [(int(catalog.sn[k]), int(face[k])) for k in match]
+
+    def countsOf(self, candidates):
+        total = np.zeros(len(ATTEMPTS))
+        for SN, face in candidates:
+            total += self.counts.get(self.key(SN, face), 0)
+        return total
+
+    def plan(self, candidates):
+        # (order of the attempts, expected scans, expected scans of the fixed order);
+        # every attempt is in the order, a regrasp that never found the code of the
+        # candidates comes last, after the roll
+        counts = self.countsOf(candidates)
+        n = counts.sum()
+        # chance of each attempt, one pseudo-count each so unseen attempts are not ruled out
+        p = (counts + 1.0) / (n + len(ATTEMPTS))
+        if not candidates or n < scan_min_observations:
+            e = expectedScans(DEFAULT_ORDER, p)
+            return DEFAULT_ORDER, e, e
+        order = []
+        later = []
+        for stage in STAGES:
+            ks = [k for k, (st, _) in enumerate(ATTEMPTS) if st == stage]
+            if stage == 'regrasp' and counts[ks].sum() == 0:
+                later = ks
+                continue
+            order += sorted(ks, key=lambda k: -counts[k])
+        order += later
+        expected, default = expectedScans(order, p), expectedScans(DEFAULT_ORDER, p)
+        if expected >= default:
+            return DEFAULT_ORDER, default, default
+        return tuple(order), expected, default
+
+    def report(self):
+        return 'scan: %d scans for %d items, %.1f scans saved (expected)' % (self.scans, self.items, self.saved)
+
+
+if __name__ == "__main__":
+
+    # plans for the catalog items from the recorded statistics
+    from helper import catalog
+    cat = catalog()
+    stats = ScanStats()
+    print('%d (SN, face) pairs recorded in %s' % (len(stats.counts), stats.path))
+    for key, counts in sorted(stats.counts.items()):
+        SN, face = (int(v) for v in key.split(':'))
+        order, expected, default = stats.plan([(SN, face)])
+        print('SN %3d face %d  %s  -> %s  %.2f scans (fixed order %.2f)' % (
+            SN, face, counts, ' '.join('%s/%s' % ATTEMPTS[k] for k in order), expected, default))
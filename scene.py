@@ -0,0 +1,188 @@
+# Persistent scene model for the tabletop camera.
+# Keeps a reference frame and the last known objects; each update only
+# re-segments the tiles that changed since the previous frame.
+import numpy as np
+import cv2
+import math
+from collections import namedtuple
+from image import findContours, uniqueObjects, principalAngle, boxLength, camera_index, pixelRatio
+from param import calibration_dir
+
+# centroid (px), angle (deg), box corners, side lengths (px), bounding rect (x, y, w, h)
+SceneObject = namedtuple('SceneObject', ['centroid', 'angle', 'box', 'length', 'rect'])
+
+
+def measureRegion(gray, x0=0, y0=0, x1=None, y1=None, calib_dir=calibration_dir):
+    # run the take_pictures pipeline on gray[y0:y1, x0:x1] only
+    crop = gray[y0:y1, x0:x1]
+    _, contours = findContours(crop, offset=(x0, y0), calib_dir=calib_dir)
+    contours, mu, mc = uniqueObjects(contours)
+    objects = []
+    for i in range(len(contours)):
+        box, length = boxLength(contours[i])
+        objects.append(SceneObject(mc[i], principalAngle(mu[i]) * 180 / math.pi, box, length,
+                                   cv2.boundingRect(contours[i])))
+    return objects
+
+
+class SceneModel:
+
+    def __init__(self, tile=32, diff_thresh=25, min_changed=0.01, match_dist=30, calib_dir=calibration_dir):
+        # tile: tile size (px); a tile is changed when more than min_changed of its
+        # pixels differ by more than diff_thresh from the reference frame
+        self.tile = tile
+        self.calib_dir = calib_dir
+        self.diff_thresh = diff_thresh
+        self.min_changed = min_changed
+        self.match_dist = match_dist
+        self.reference = None
+        self.objects = {}
+        self.next_id = 0
+        self.last_regions = []
+
+    def reset(self):
+        self.reference = None
+        self.objects = {}
+        self.last_regions = []
+
+    def changedTiles(self, gray):
+        t = self.tile
+        mask = cv2.absdiff(gray, self.reference) > self.diff_thresh
+        h, w = mask.shape
+        ph, pw = -h % t, -w % t
+        if ph or pw:
+            mask = np.pad(mask, ((0, ph), (0, pw)))
+        return mask.reshape(mask.shape[0] // t, t, mask.shape[1] // t, t).mean(axis=(1, 3)) > self.min_changed
+
+    def changedRegions(self, gray):
+        # pixel rectangles (x0, y0, x1, y1) of connected groups of changed tiles,
+        # grown by one tile and by the rects of objects they touch
+        tiles = self.changedTiles(gray)
+        if not tiles.any():
+            return []
+        t = self.tile
+        h, w = gray.shape
+        n, labels, stats, _ = cv2.connectedComponentsWithStats(tiles.astype(np.uint8), connectivity=8)
+        regions = []
+        for k in range(1, n):
+            tx, ty, tw, th = stats[k, :4]
+            x0, y0 = max((tx - 1) * t, 0), max((ty - 1) * t, 0)
+            x1, y1 = min((tx + tw + 1) * t, w), min((ty + th + 1) * t, h)
+            grown = True
+            while grown:
+                grown = False
+                for obj in self.objects.values():
+                    ox, oy, ow, oh = obj.rect
+                    ox0, oy0 = max(ox - t, 0), max(oy - t, 0)
+                    ox1, oy1 = min(ox + ow + t, w), min(oy + oh + t, h)
+                    if ox < x1 and ox + ow > x0 and oy < y1 and oy + oh > y0 and \
+                            not (x0 <= ox0 and y0 <= oy0 and x1 >= ox1 and y1 >= oy1):
+                        x0, y0 = min(x0, ox0), min(y0, oy0)
+                        x1, y1 = max(x1, ox1), max(y1, oy1)
+                        grown = True
+            regions.append((int(x0), int(y0), int(x1), int(y1)))
+        return mergeRects(regions)
+
+    def update(self, frame):
+        # returns {id: SceneObject}; ids stay the same for objects that did not move
+        # or moved less than match_dist px
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        if self.reference is None:
+            self.reference = gray.copy()
+            self.last_regions = [(0, 0, gray.shape[1], gray.shape[0])]
+            self._assign(measureRegion(gray, calib_dir=self.calib_dir), {})
+            return self.objects
+
+        regions = self.changedRegions(gray)
+        self.last_regions = regions
+        if not regions:
+            return self.objects
+        # the reference follows the re-segmented regions only: a slow drift elsewhere
+        # keeps adding up against it until its tiles count as changed
+        for x0, y0, x1, y1 in regions:
+            self.reference[y0:y1, x0:x1] = gray[y0:y1, x0:x1]
+
+        inside = lambda c, r: r[0] <= c[0] < r[2] and r[1] <= c[1] < r[3]
+        removed = {}
+        for obj_id, obj in list(self.objects.items()):
+            if any(inside(obj.centroid, r) for r in regions):
+                removed[obj_id] = self.objects.pop(obj_id)
+
+        found = []
+        for r in regions:
+            found.extend(measureRegion(gray, *r, calib_dir=self.calib_dir))
+        self._assign(found, removed)
+        return self.objects
+
+    def _assign(self, found, candidates):
+        # greedy nearest-centroid matching against the objects that were in a changed region
+        for obj in found:
+            best_id, best_dist = None, self.match_dist
+            for obj_id, old in candidates.items():
+                d = math.hypot(obj.centroid[0] - old.centroid[0], obj.centroid[1] - old.centroid[1])
+                if d < best_dist:
+                    best_id, best_dist = obj_id, d
+            if best_id is None:
+                best_id = self.next_id
+                self.next_id += 1
+            else:
+                del candidates[best_id]
+            self.objects[best_id] = obj
+
+    def nearest(self, centroid, max_dist=None):
+        # object closest to a pixel position, None if none within max_dist (match_dist)
+        max_dist = self.match_dist if max_dist is None else max_dist
+        best, best_dist = None, max_dist
+        for obj in self.objects.values():
+            d = math.hypot(obj.centroid[0] - centroid[0], obj.centroid[1] - centroid[1])
+            if d < best_dist:
+                best, best_dist = obj, d
+        return best
+
+    def results(self):
+        # same lists as take_pictures, in id order
+        ids = sorted(self.objects)
+        mc = [self.objects[i].centroid for i in ids]
+        angle = [self.objects[i].angle for i in ids]
+        box = [self.objects[i].box for i in ids]
+        actual = [np.array(self.objects[i].length) * pixelRatio(self.calib_dir) for i in ids]
+        return mc, angle, box, actual
+
+
+def mergeRects(rects):
+    # merge overlapping rectangles until none overlap
+    rects = list(rects)
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(rects)):
+            for j in range(i + 1, len(rects)):
+                a, b = rects[i], rects[j]
+                if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]:
+                    rects[i] = (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+                    del rects[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return rects
+
+
+if __name__ == "__main__":
+
+    cap = cv2.VideoCapture(camera_index)
+    scene = SceneModel()
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        objects = scene.update(frame)
+        if scene.last_regions:
+            print("changed:", scene.last_regions)
+            for obj_id in sorted(objects):
+                print(obj_id, objects[obj_id].centroid, '%.1f' % objects[obj_id].angle)
+        for x0, y0, x1, y1 in scene.last_regions:
+            cv2.rectangle(frame, (x0, y0), (x1, y1), (0, 0, 255), 1)
+        cv2.imshow('scene', frame)
+        if cv2.waitKey(1) == ord('q'):
+            break
@@ -0,0 +1,102 @@
+# Simulated arm controller: a TCP server that takes the same newline separated
+# command stream as the real arm, so connect2Arm / sendCommands talk to it
+# unchanged. Every command is logged with its arrival time; pose.parse checks
+# that it is a well formed command.
+import time
+import socket
+import threading
+from pose import parse
+
+
+class SimArm:
+
+    def __init__(self, host='127.0.0.1', port=0, name='sim'):
+        # port 0 picks a free port, see self.port once started
+        self.name = name
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind((host, port))
+        self.host, self.port = self.server.getsockname()
+        self.commands = []
+        self.errors = []
+        self.connections = 0
+        self._lock = threading.Lock()
+        self._thread = None
+        self._running = False
+
+    def start(self):
+        self.server.listen(4)
+        self.server.settimeout(0.2)
+        self._running = True
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+        self.server.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _serve(self):
+        while self._running:
+            try:
+                conn, _ = self.server.accept()
+            except socket.timeout:
+                continue
+            self.connections += 1
+            threading.Thread(target=self._client, args=(conn,), daemon=True).start()
+
+    def _client(self, conn):
+        conn.settimeout(0.2)
+        buf = b''
+        with conn:
+            while self._running:
+                try:
+                    data = conn.recv(4096)
+                except socket.timeout:
+                    continue
+                except OSError:
+                    break
+                if not data:
+                    break
+                buf += data
+                *lines, buf = buf.split(b'\n')
+                for line in lines:
+                    self._command(line.decode('ascii', 'replace'))
+
+    def _command(self, text):
+        with self._lock:
+            self.commands.append((time.time(), text))
+            try:
+                parse(text)
+            except ValueError as e:
+                self.errors.append((text, str(e)))
+
+    def count(self, cmd=None):
+        # number of commands received (of one kind, e.g. 'MOVL')
+        with self._lock:
+            if cmd is None:
+                return len(self.commands)
+            return sum(1 for _, text in self.commands if text.split(' ', 1)[0] == cmd)
+
+
+if __name__ == "__main__":
+
+    from connect import connect2Arm
+    from pose import sendCommands
+    from param import scan_pos, open_grip, close_grip, go_home
+    with SimArm() as arm:
+        s = connect2Arm(arm.host, arm.port)
+        sendCommands(s, scan_pos, close_grip, open_grip, go_home)
+        s.close()
+        time.sleep(0.5)
+        for t, text in arm.commands:
+            print('%.3f %s' % (t, text))
+        print('errors:', arm.errors)
@@ -0,0 +1,104 @@
+# Phase-aware arm speeds. Each motion phase has its own SETPTPSPEED (%) / SETLINESPEED
+# (mm/s) profile in param.speed_profiles, scaled down for fragile and heavy items and,
+# when inserting, for a tight clearance around the target. The scheduler remembers
+# what the controller is set to and only emits the SET*SPEED commands that change it:
+#
+#   sendCommands(s, speed.to('insertion', weight, fragility, clearance) + [pose])
+import numpy as np
+from pose import Command
+from stacking import planBoxes
+from param import speed_profiles, speed_min, fragile_speed_factor, heavy_weight, heavy_speed_factor, \
+    insertion_clearance
+
+PHASES = ('transit', 'approach', 'regrasp', 'insertion')
+
+
+def speedFactor(phase, weight=0.0, fragility=0, clearance=None):
+    # 1 for a light, robust item with room around it
+    factor = 1.0
+    if fragility:
+        factor *= fragile_speed_factor
+    if weight is not None and weight >= heavy_weight:
+        factor *= heavy_speed_factor
+    if phase == 'insertion' and clearance is not None:
+        factor *= min(1.0, max(0.0, clearance) / insertion_clearance)
+    return factor
+
+
+def planClearance(item_info, item_size, container_size, margin=0.0):
+    # item number -> free space (mm) around it in the horizontal plane when it is put in,
+    # i.e. to the container walls and to the items placed before it at the same height;
+    # item_size includes margin (as packed), so the physical gap is margin larger
+    lo, hi = planBoxes(item_info, item_size)
+    container = np.asarray(container_size, dtype=float)
+    clearance = {}
+    placed = []
+    for item in item_info:
+        seq = item[0]
+        gap = min(lo[seq, :2].min(), (container[:2] - hi[seq, :2]).min()) + margin / 2.0
+        if placed:
+            sep = np.maximum(lo[placed], lo[seq]) - np.minimum(hi[placed], hi[seq])
+            side = sep[:, 2] < 0
+            if side.any():
+                d = np.sqrt((np.maximum(sep[side, :2], 0) ** 2).sum(axis=1)) + margin
+                gap = min(gap, d.min())
+        clearance[seq] = float(gap)
+        placed.append(seq)
+    return clearance
+
+
+class SpeedScheduler:
+
+    def __init__(self, profiles=speed_profiles, floor=speed_min):
+        for phase in PHASES:
+            if phase not in profiles:
+                raise ValueError('no speed profile for phase %r' % phase)
+        self.profiles = profiles
+        self.floor = floor
+        # speeds the controller is set to, None = unknown (always sent)
+        self.ptp = None
+        self.line = None
+        self.sent = 0
+        self.skipped = 0
+
+    def profile(self, phase, weight=0.0, fragility=0, clearance=None):
+        # (SETPTPSPEED, SETLINESPEED) of a phase for an item
+        ptp, line = self.profiles[phase]
+        factor = speedFactor(phase, weight, fragility, clearance)
+        return max(self.floor[0], int(round(ptp * factor))), max(self.floor[1], int(round(line * factor)))
+
+    def to(self, phase, weight=0.0, fragility=0, clearance=None):
+        # commands switching to the phase's speeds, [] if they are already set
+        ptp, line = self.profile(phase, weight, fragility, clearance)
+        commands = []
+        if ptp != self.ptp:
+            commands.append(Command('SETPTPSPEED %d' % ptp))
+            self.ptp = ptp
+        if line != self.line:
+            commands.append(Command('SETLINESPEED %d' % line))
+            self.line = line
+        self.sent += len(commands)
+        self.skipped += 2 - len(commands)
+        return commands
+
+    def reset(self):
+        # controller state unknown again (e.g. reconnected)
+        self.ptp = self.line = None
+
+
+if __name__ == "__main__":
+
+    # speeds of every phase for the catalog items, and the commands a basket would send
+    from helper import catalog
+    cat = catalog()
+    scheduler = SpeedScheduler()
+    print('%4s %6s %4s  ' % ('SN', 'weight', 'frag') + '  '.join('%-12s' % p for p in PHASES))
+    for SN in cat.sn:
+        weight, fragility = cat.attrs(SN)
+        row = ['%3d/%-8d' % scheduler.profile(p, weight, fragility) for p in PHASES]
+        print('%4d %6.1f %4d  ' % (SN, weight, fragility) + '  '.join(row))
+    for SN in cat.sn:
+        weight, fragility = cat.attrs(SN)
+        for phase in ('transit', 'approach', 'insertion', 'approach', 'transit'):
+            scheduler.to(phase, weight, fragility, clearance=10.0)
+    print('%d speed commands sent, %d redundant ones skipped' % (scheduler.sent, scheduler.skipped))
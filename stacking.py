@@ -0,0 +1,274 @@
+# Contact graph, load-bearing checks and placement order for a packing plan.
+# Boxes are given as lo, hi: (n, 3) arrays of their min / max corners (mm).
+import numpy as np
+from param import gripper_size, sequence_exact, push_start, push_back, push_gap, packing_pose, floor_z
+
+
+def planBoxes(item_info, item_size):
+    # packing() output -> lo, hi indexed by item number
+    # item_info = [(seq, centroid_x, centroid_y, bottom_z, ['x', 'y', 'z']), ...]
+    # orientation[k] is the container axis of item dimension k (item_size[k])
+    n = len(item_info)
+    lo = np.zeros((n, 3))
+    hi = np.zeros((n, 3))
+    axis = {'x': 0, 'y': 1, 'z': 2}
+    for seq, x, y, z, orientation in item_info:
+        ext = np.zeros(3)
+        for k, ax in enumerate(orientation):
+            ext[axis[ax]] = item_size[k][seq]
+        lo[seq] = (x - ext[0] / 2, y - ext[1] / 2, z)
+        hi[seq] = lo[seq] + ext
+    return lo, hi
+
+
+def planInfo(lo, hi, orientation, order=None):
+    # lo, hi and per-item orientation -> packing() output, in placement order
+    if order is None:
+        order, _ = placementOrder(lo, hi)
+    return [(i, (lo[i, 0] + hi[i, 0]) / 2, (lo[i, 1] + hi[i, 1]) / 2, lo[i, 2], list(orientation[i]))
+            for i in order]
+
+
+def planHeight(lo, hi):
+    return hi[:, 2].max() if len(hi) else 0.0
+
+
+def settle(lo, hi):
+    # drop every box, lowest first, onto whatever is below its footprint
+    lo, hi = lo.copy(), hi.copy()
+    order = np.argsort(lo[:, 2])
+    for k, i in enumerate(order):
+        below = order[:k]
+        z = 0.0
+        if k:
+            under = below[overlapArea(lo, hi, i, below) > 0]
+            under = under[hi[under, 2] <= lo[i, 2] + 0.5]
+            if len(under):
+                z = hi[under, 2].max()
+        hi[i, 2] -= lo[i, 2] - z
+        lo[i, 2] = z
+    return lo, hi
+
+
+def overlapArea(lo, hi, i, j):
+    # xy overlap area of box i with each box in j (vectorized over j)
+    w = np.minimum(hi[i, 0], hi[j, 0]) - np.maximum(lo[i, 0], lo[j, 0])
+    d = np.minimum(hi[i, 1], hi[j, 1]) - np.maximum(lo[i, 1], lo[j, 1])
+    return np.clip(w, 0, None) * np.clip(d, 0, None)
+
+
+def contacts(lo, hi, tol=0.5):
+    # (i, j, area) arrays: box i rests directly on box j with that contact area
+    # tops are sorted once, so each box only looks at the boxes whose top is at its bottom
+    order = np.argsort(hi[:, 2])
+    tops = hi[order, 2]
+    start = np.searchsorted(tops, lo[:, 2] - tol, side='left')
+    stop = np.searchsorted(tops, lo[:, 2] + tol, side='right')
+    count = np.where(lo[:, 2] > tol, stop - start, 0)
+    i = np.repeat(np.arange(len(lo)), count)
+    j = order[np.repeat(start, count) + np.arange(count.sum()) - np.repeat(np.cumsum(count) - count, count)]
+    keep = i != j
+    i, j = i[keep], j[keep]
+    w = np.minimum(hi[i, 0], hi[j, 0]) - np.maximum(lo[i, 0], lo[j, 0])
+    d = np.minimum(hi[i, 1], hi[j, 1]) - np.maximum(lo[i, 1], lo[j, 1])
+    area = np.clip(w, 0, None) * np.clip(d, 0, None)
+    keep = area > 0
+    return i[keep], j[keep], area[keep]
+
+
+def contactGraph(lo, hi, tol=0.5):
+    # area[i, j] = contact area where box i rests directly on box j
+    area = np.zeros((len(lo), len(lo)))
+    i, j, a = contacts(lo, hi, tol)
+    area[i, j] = a
+    return area
+
+
+def supportFraction(lo, hi, area=None, tol=0.5):
+    # share of each box's footprint that rests on something (floor counts as full support)
+    if area is None:
+        i, _, a = contacts(lo, hi, tol)
+        supported = np.bincount(i, weights=a, minlength=len(lo))
+    else:
+        supported = area.sum(axis=1)
+    footprint = (hi[:, 0] - lo[:, 0]) * (hi[:, 1] - lo[:, 1])
+    frac = supported / footprint
+    frac[lo[:, 2] <= tol] = 1.0
+    return np.minimum(frac, 1.0)
+
+
+def stackLoads(lo, hi, weight, area=None, tol=0.5):
+    # weight each box carries from the boxes above it; a box passes its own weight
+    # plus its load down to its supporters in proportion to contact area
+    if area is None:
+        area = contactGraph(lo, hi, tol)
+    weight = np.asarray(weight, dtype=float)
+    load = np.zeros(len(lo))
+    total = area.sum(axis=1)
+    for i in np.argsort(-lo[:, 2]):
+        if total[i] > 0:
+            load += (weight[i] + load[i]) * area[i] / total[i]
+    return load
+
+
+def above(lo, hi, j):
+    # boxes anywhere above box j with an overlapping footprint
+    return np.nonzero((lo[:, 2] >= hi[j, 2] - 0.5) & (overlapArea(lo, hi, j, np.arange(len(lo))) > 0))[0]
+
+
+def violations(lo, hi, weight, fragility, max_load, min_support=0.0, tol=0.5):
+    # heavy: (item, fragile) pairs, for every fragile item loaded with more than max_load
+    #        the heaviest item above it
+    # light: (item, fragile) pairs of items resting directly on a fragile item within max_load
+    # unsupported: (item, supporter) pairs of items resting on less than min_support
+    area = contactGraph(lo, hi, tol)
+    heavy = []
+    light = []
+    if fragility is not None and weight is not None:
+        weight = np.asarray(weight, dtype=float)
+        fragile = np.asarray(fragility) > 0
+        load = stackLoads(lo, hi, weight, area)
+        for j in np.nonzero(fragile & (load > max_load))[0]:
+            over = above(lo, hi, j)
+            if len(over):
+                heavy.append((int(over[np.argmax(weight[over])]), int(j)))
+        for i, j in zip(*np.nonzero(area[:, fragile])):
+            j = int(np.nonzero(fragile)[0][j])
+            if (int(i), j) not in heavy:
+                light.append((int(i), j))
+    unsupported = []
+    if min_support > 0:
+        frac = supportFraction(lo, hi, area)
+        for i in np.nonzero(frac < min_support)[0]:
+            for j in np.nonzero(area[i])[0]:
+                unsupported.append((int(i), int(j)))
+    return heavy, light, unsupported
+
+
+# ---------------------------------------- PLACEMENT ORDER ----------------------------------------
+# Box j has to go in after box i when
+#   support: i rests on j
+#   access:  j reaches into the column the gripper and item i sweep down to i's spot
+#   push:    j is in the way of the y-push main.py puts i in with: i is let go push_start
+#            past its spot (+y) and slides in -y, pushed by the gripper from push_back until
+#            push_gap behind it, the gripper at the packing pose's height above the floor
+# (the gripper footprint is gripper_size around the item centre, as in reach.carried).
+
+def accessPairs(lo, hi, gripper=gripper_size, tol=0.5):
+    # (i, j) arrays: box j is in the way of lowering box i; boxes sorted by x once, so
+    # each column is only tested against the boxes starting before it ends
+    centre = (lo[:, :2] + hi[:, :2]) / 2
+    half = np.maximum(hi[:, :2] - lo[:, :2], np.asarray(gripper[:2], dtype=float)) / 2
+    col_lo, col_hi = centre - half, centre + half
+    order = np.argsort(lo[:, 0])
+    count = np.searchsorted(lo[order, 0], col_hi[:, 0] - tol, side='left')
+    i = np.repeat(np.arange(len(lo)), count)
+    j = order[np.arange(count.sum()) - np.repeat(np.cumsum(count) - count, count)]
+    keep = (i != j) & (hi[j, 0] > col_lo[i, 0] + tol) & (lo[j, 1] < col_hi[i, 1] - tol) & \
+        (hi[j, 1] > col_lo[i, 1] + tol) & (hi[j, 2] > lo[i, 2] + tol)
+    return i[keep], j[keep]
+
+
+def pushPairs(lo, hi, gripper=gripper_size, tol=0.5, start=push_start, back=push_back, gap=push_gap,
+              tool_z=packing_pose.values[2] - floor_z):
+    # (i, j) arrays: box j is in the way of pushing box i in; the sweeps of the item and of
+    # the gripper (tool_z: its bottom above the container floor) tested against every box
+    centre = (lo[:, :2] + hi[:, :2]) / 2
+    gx, gy, gz = (float(g) for g in gripper)
+    # item: its box, from start further in +y down to its spot
+    item_lo, item_hi = lo.copy(), hi.copy()
+    item_hi[:, 1] += start
+    # gripper: from back behind the item down to gap behind it
+    grip_lo = np.stack([centre[:, 0] - gx / 2, hi[:, 1] + gap - gy / 2,
+                        np.full(len(lo), tool_z)], axis=1)
+    grip_hi = np.stack([centre[:, 0] + gx / 2, centre[:, 1] + back + gy / 2, np.full(len(lo), tool_z + gz)], axis=1)
+    hit = np.zeros((len(lo), len(lo)), dtype=bool)
+    for s_lo, s_hi in ((item_lo, item_hi), (grip_lo, grip_hi)):
+        hit |= ((s_lo[:, None, :] < hi[None, :, :] - tol) & (s_hi[:, None, :] > lo[None, :, :] + tol)).all(axis=2)
+    np.fill_diagonal(hit, False)
+    i, j = np.nonzero(hit)
+    return i, j
+
+
+def _reaches(after, a, b):
+    # b can be reached from a along the edges
+    stack, seen = [a], {a}
+    while stack:
+        k = stack.pop()
+        if k == b:
+            return True
+        for m in after[k] - seen:
+            seen.add(m)
+            stack.append(m)
+    return False
+
+
+def precedence(lo, hi, gripper=gripper_size, tol=0.5):
+    # (after, conflicts): after[i] = boxes that have to go in after box i, acyclic;
+    # conflicts = (i, j) access / push pairs no order can satisfy (dropped from the graph):
+    # box j is in the way of putting box i in
+    after = [set() for _ in range(len(lo))]
+    for i, j, _ in zip(*contacts(lo, hi, tol)):
+        after[j].add(i)
+    conflicts = []
+    pairs = set(zip(*(k.tolist() for k in accessPairs(lo, hi, gripper, tol))))
+    pairs |= set(zip(*(k.tolist() for k in pushPairs(lo, hi, gripper, tol))))
+    # lowest blockers first, so the dropped pairs are the ones high in the stack
+    for i, j in sorted(pairs, key=lambda p: (lo[p[1], 2], lo[p[0], 2], p)):
+        if j in after[i]:
+            continue
+        if _reaches(after, j, i):
+            conflicts.append((i, j))
+        else:
+            after[i].add(j)
+    return after, conflicts
+
+
+def placementOrder(lo, hi, step=None, start=None, gripper=gripper_size, tol=0.5):
+    # (box indices in an order respecting precedence(), its conflicts); with step(a, b), the
+    # cost of putting box b in right after box a (start(b) for the first one), the order of
+    # least total cost, exact up to sequence_exact boxes and greedy above; ties by z, then y, then x
+    n = len(lo)
+    if n == 0:
+        return [], []
+    after, conflicts = precedence(lo, hi, gripper, tol)
+    need = [0] * n
+    for k in range(n):
+        for m in after[k]:
+            need[m] |= 1 << k
+    rank = sorted(range(n), key=lambda k: (round(lo[k, 2], 1), round(lo[k, 1], 1), round(lo[k, 0], 1)))
+    full = (1 << n) - 1
+    first = (lambda b: 0.0) if start is None else start
+    if step is None or n > sequence_exact:
+        order, done, last = [], 0, None
+        while done != full:
+            ready = [k for k in rank if not done >> k & 1 and need[k] & done == need[k]]
+            if step is not None:
+                ready.sort(key=lambda k: first(k) if last is None else step(last, k))
+            last = ready[0]
+            order.append(last)
+            done |= 1 << last
+        return order, conflicts
+    # cheapest order ending with box k over the boxes in mask
+    cost = {}
+    for k in rank:
+        if need[k] == 0:
+            cost[1 << k, k] = (first(k), None)
+    for mask in range(1, full + 1):
+        for k in rank:
+            if (mask, k) not in cost:
+                continue
+            c = cost[mask, k][0]
+            for m in rank:
+                if mask >> m & 1 or need[m] & mask != need[m]:
+                    continue
+                key = (mask | 1 << m, m)
+                cm = c + step(k, m)
+                if key not in cost or cm < cost[key][0] - 1e-9:
+                    cost[key] = (cm, k)
+    last = min((k for k in rank if (full, k) in cost), key=lambda k: cost[full, k][0])
+    order, mask = [], full
+    while last is not None:
+        order.append(last)
+        mask, last = mask & ~(1 << last), cost[mask, last][1]
+    return order[::-1], conflicts
@@ -0,0 +1,281 @@
+# Synthetic top-down tabletop frames for benchmarking the vision pipeline.
+# Catalog boxes (obj_info.csv sizes, lying on a random face) are drawn at random,
+# non-overlapping positions and angles as bright top faces on a dark table, under a
+# lighting field (level, gradient, vignette) with a drop shadow and sensor noise, and
+# optionally with a printed QR label encoding the SN (as detect.qrcodeReader reads it).
+# Every frame comes with its ground truth in the conventions of image.take_pictures:
+# centroid (px), principal angle (deg, (-90, 90]), top face side lengths (mm), corners.
+# Lighting and noise are precomputed, so a frame is a few polygon fills and one
+# vectorised pass: thousands of frames per second at 640 x 480.
+#
+#   python3 synth.py --frames 2000                  detection throughput / accuracy
+#   python3 synth.py --frames 200 --qr --pixel2mm 0.2 --objects 1
+#   python3 synth.py --frames 300 --video synth.avi (+ synth.avi.jsonl), replay with --feed
+import math
+import time
+import json
+from collections import namedtuple
+import numpy as np
+import cv2
+from param import catalog_path, calibration_dir
+
+# centroid (px), angle (deg), top face sides (long, short) in mm, corners (px), SN,
+# face (0 = (a, b), 1 = (b, c), 2 = (a, c) up, as scan.footprintFaces), height (mm)
+Truth = namedtuple('Truth', ['centroid', 'angle', 'length', 'box', 'SN', 'face', 'height'])
+
+FACES = ((0, 1, 2), (1, 2, 0), (0, 2, 1))
+SHIFT = 4
+
+
+class Lighting:
+    # table / box grey levels and the light falling on them; jitter = relative change of
+    # the overall level from frame to frame
+    __slots__ = ('table', 'box', 'level', 'gradient', 'direction', 'vignette', 'shadow', 'jitter')
+
+    def __init__(self, table=50, box=210, level=1.0, gradient=0.15, direction=30.0, vignette=0.2,
+                 shadow=(6, 4, 0.5), jitter=0.05):
+        # gradient: relative change of light across the frame along direction (deg);
+        # vignette: relative loss in the corners; shadow: (dx, dy) px offset and darkening
+        self.table = table
+        self.box = box
+        self.level = level
+        self.gradient = gradient
+        self.direction = direction
+        self.vignette = vignette
+        self.shadow = shadow
+        self.jitter = jitter
+
+    def field(self, size):
+        w, h = size
+        y, x = np.mgrid[0:h, 0:w].astype(np.float32)
+        u, v = (x - w / 2) / (w / 2), (y - h / 2) / (h / 2)
+        d = math.radians(self.direction)
+        light = 1 + self.gradient / 2 * (u * math.cos(d) + v * math.sin(d))
+        light *= 1 - self.vignette * (u * u + v * v) / 2
+        return (self.level * light).astype(np.float32)
+
+
+class SceneRenderer:
+
+    def __init__(self, catalog_path=catalog_path, size=(640, 480), pixel2mm=None, lighting=None, noise=4.0,
+                 qr=False, qr_size=0.6, min_side=10.0, gap=40, border=30, SNs=None, seed=0,
+                 calib_dir=calibration_dir):
+        # pixel2mm: mm per pixel (calibration by default); noise: std of the sensor noise (grey
+        # levels); qr_size: QR label side as a share of the shorter top side; items with a
+        # side under min_side mm are left out; gap / border: px between boxes / to the edges
+        from helper import catalog
+        if pixel2mm is None:
+            from image import pixelRatio
+            pixel2mm = float(pixelRatio(calib_dir))
+        self.size = size
+        self.pixel2mm = pixel2mm
+        self.lighting = Lighting() if lighting is None else lighting
+        self.qr = qr
+        self.qr_size = qr_size
+        self.gap = gap
+        self.border = border
+        self.rng = np.random.default_rng(seed)
+        cat = catalog(catalog_path)
+        dims = np.stack([cat.table['a'], cat.table['b'], cat.table['c']], axis=1).astype(float)
+        keep = dims.min(axis=1) >= min_side
+        if SNs is not None:
+            keep &= np.isin(cat.sn, SNs)
+        self.SNs = np.asarray(cat.sn)[keep]
+        self.dims = dims[keep]
+        if not len(self.SNs):
+            raise ValueError('no catalog items to draw')
+        self.light = self.lighting.field(size)
+        w, h = size
+        # noise pool a few frames long, each frame starts at a random offset
+        self.noise = (self.rng.normal(0, noise, size=4 * w * h + w * h).astype(np.float32) if noise > 0 else None)
+        self.codes = {}
+
+    def code(self, SN):
+        # QR module image (0 / 255) of an SN, with its quiet zone
+        if SN not in self.codes:
+            encoder = cv2.QRCodeEncoder.create()
+            self.codes[SN] = encoder.encode('%06d' % SN)
+        return self.codes[SN]
+
+    def _layout(self, n):
+        # (SN index, face, centre px, angle deg) of n boxes that do not touch
+        w, h = self.size
+        placed = []
+        for _ in range(n):
+            for _ in range(100):
+                k = int(self.rng.integers(len(self.SNs)))
+                face = int(self.rng.integers(3))
+                a, b, _ = (self.dims[k][j] for j in FACES[face])
+                r = math.hypot(a, b) / 2 / self.pixel2mm
+                lo, hi = self.border + r, np.array([w, h]) - self.border - r
+                if (hi <= lo).any():
+                    continue
+                c = self.rng.uniform(lo, hi)
+                if all(math.hypot(*(c - pc)) > r + pr + self.gap for _, _, pc, _, pr in placed):
+                    placed.append((k, face, c, float(self.rng.uniform(-90, 90)), r))
+                    break
+        return [p[:4] for p in placed]
+
+    def render(self, n=3):
+        # (frame, [Truth, ...]) with up to n boxes (fewer if they do not fit)
+        w, h = self.size
+        lt = self.lighting
+        base = np.full((h, w), lt.table, dtype=np.uint8)
+        truth = []
+        layout = self._layout(n)
+        scale = float(1 << SHIFT)
+        sdx, sdy, sdark = lt.shadow
+        for k, face, c, angle in layout:
+            i, j, up = FACES[face]
+            dims = self.dims[k]
+            # long side along angle; the minAreaRect corners of the top face
+            sides = sorted((dims[i], dims[j]), reverse=True)
+            box = cv2.boxPoints(((c[0], c[1]), (sides[0] / self.pixel2mm, sides[1] / self.pixel2mm), angle))
+            pts = np.int32(np.round(box * scale))
+            if sdark > 0:
+                cv2.fillPoly(base, [pts + np.int32(np.round(np.array([sdx, sdy]) * scale))],
+                             int(lt.table * (1 - sdark)), cv2.LINE_AA, SHIFT)
+            albedo = int(np.clip(lt.box + self.rng.normal(0, 8), 0, 255))
+            cv2.fillPoly(base, [pts], albedo, cv2.LINE_AA, SHIFT)
+            SN = int(self.SNs[k])
+            if self.qr:
+                self._label(base, SN, c, angle, sides[1] / self.pixel2mm * self.qr_size)
+            theta = (angle + 90.0) % 180.0 - 90.0
+            truth.append(Truth((float(c[0]), float(c[1])), 90.0 if theta == -90.0 else theta,
+                               (float(sides[0]), float(sides[1])), box, SN, face, float(dims[up])))
+        level = 1.0 + (self.rng.normal(0, lt.jitter) if lt.jitter > 0 else 0.0)
+        frame = base.astype(np.float32)
+        frame *= self.light * level
+        if self.noise is not None:
+            start = int(self.rng.integers(len(self.noise) - w * h))
+            frame += self.noise[start:start + w * h].reshape(h, w)
+        return np.clip(frame, 0, 255).astype(np.uint8), truth
+
+    def _label(self, base, SN, c, angle, side):
+        # QR code of side px, centred on the box and turned with it, only its ROI is warped
+        code = self.code(SN)
+        m = code.shape[0]
+        half = side / 2 * math.sqrt(2) + 2
+        x0, y0 = max(int(c[0] - half), 0), max(int(c[1] - half), 0)
+        x1, y1 = min(int(c[0] + half) + 1, base.shape[1]), min(int(c[1] + half) + 1, base.shape[0])
+        if x1 <= x0 or y1 <= y0:
+            return
+        R = cv2.getRotationMatrix2D((m / 2, m / 2), -angle, side / m)
+        R[:, 2] += (c[0] - x0 - m / 2, c[1] - y0 - m / 2)
+        roi = base[y0:y1, x0:x1]
+        patch = cv2.warpAffine(code, R, (x1 - x0, y1 - y0), flags=cv2.INTER_NEAREST, borderValue=255)
+        mask = cv2.warpAffine(np.full_like(code, 255), R, (x1 - x0, y1 - y0), flags=cv2.INTER_NEAREST)
+        np.copyto(roi, np.minimum(roi, patch), where=mask > 0)
+
+    def frames(self, count, n=3):
+        for _ in range(count):
+            yield self.render(n)
+
+
+def truthRecord(truth):
+    # json-friendly ground truth of one frame
+    return [{'SN': t.SN, 'centroid': list(t.centroid), 'angle': t.angle, 'length': list(t.length),
+             'box': np.asarray(t.box).tolist(), 'face': t.face, 'height': t.height} for t in truth]
+
+
+def matchDetections(objects, truth, pixel2mm, max_dist=15.0):
+    # scene.SceneObject detections vs Truth: ([(truth, object)], missed truths, false detections)
+    pairs, free = [], list(objects)
+    missed = []
+    for t in truth:
+        best, best_dist = None, max_dist
+        for obj in free:
+            d = math.hypot(obj.centroid[0] - t.centroid[0], obj.centroid[1] - t.centroid[1])
+            if d < best_dist:
+                best, best_dist = obj, d
+        if best is None:
+            missed.append(t)
+        else:
+            free.remove(best)
+            pairs.append((t, best))
+    return pairs, missed, free
+
+
+def _decoder():
+    # QR decoder as detect.qrcodeReader uses it (pyzbar), OpenCV's when pyzbar is missing
+    try:
+        from pyzbar.pyzbar import decode
+        return 'pyzbar', lambda gray: [c.data.decode('utf-8') for c in decode(gray)]
+    except ImportError:
+        detector = cv2.QRCodeDetector()
+
+        def decode(gray):
+            ok, data, _, _ = detector.detectAndDecodeMulti(gray)
+            return [d for d in data if d] if ok else []
+        return 'opencv', decode
+
+
+if __name__ == "__main__":
+
+    import argparse
+    parser = argparse.ArgumentParser(description='synthetic tabletop frames with ground truth')
+    parser.add_argument('--frames', type=int, default=1000)
+    parser.add_argument('--objects', type=int, default=3)
+    parser.add_argument('--size', type=int, nargs=2, default=(640, 480), metavar=('W', 'H'))
+    parser.add_argument('--pixel2mm', type=float, default=None, help='mm per pixel (calibration by default)')
+    parser.add_argument('--noise', type=float, default=4.0)
+    parser.add_argument('--level', type=float, default=1.0, help='light level')
+    parser.add_argument('--gradient', type=float, default=0.15)
+    parser.add_argument('--qr', action='store_true', help='print the SN as a QR label on every box')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--video', help='write the frames to this video file and the truth to FILE.jsonl')
+    args = parser.parse_args()
+
+    renderer = SceneRenderer(size=tuple(args.size), pixel2mm=args.pixel2mm, noise=args.noise, qr=args.qr,
+                             lighting=Lighting(level=args.level, gradient=args.gradient), seed=args.seed)
+    start = time.perf_counter()
+    frames = list(renderer.frames(args.frames, args.objects))
+    render_time = time.perf_counter() - start
+    print('%d frames rendered in %.2f s (%.0f frames/s)' % (len(frames), render_time, len(frames) / render_time))
+
+    if args.video:
+        writer = cv2.VideoWriter(args.video, cv2.VideoWriter_fourcc(*'MJPG'), 30.0, tuple(args.size))
+        with open(args.video + '.jsonl', 'w') as f:
+            for frame, truth in frames:
+                writer.write(cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR))
+                f.write(json.dumps(truthRecord(truth)) + '\n')
+        writer.release()
+        print('-> %s, %s.jsonl' % (args.video, args.video))
+
+    # detection (the take_pictures pipeline of scene.measureRegion) against the truth
+    from scene import measureRegion
+    errors, found, total, false = [], 0, 0, 0
+    start = time.perf_counter()
+    for frame, truth in frames:
+        pairs, missed, extra = matchDetections(measureRegion(frame), truth, renderer.pixel2mm)
+        total += len(truth)
+        found += len(pairs)
+        false += len(extra)
+        for t, obj in pairs:
+            # the principal axis of a (nearly) square face is arbitrary: no angle error
+            da = (obj.angle - t.angle + 90.0) % 180.0 - 90.0 if t.length[0] >= 1.05 * t.length[1] else np.nan
+            errors.append((math.hypot(obj.centroid[0] - t.centroid[0], obj.centroid[1] - t.centroid[1]),
+                           abs(da), abs(max(obj.length) * renderer.pixel2mm - t.length[0]),
+                           abs(min(obj.length) * renderer.pixel2mm - t.length[1])))
+    detect_time = time.perf_counter() - start
+    print('detection: %.0f frames/s, %d / %d boxes found, %d false' % (
+        len(frames) / detect_time, found, total, false))
+    if errors:
+        e = np.array(errors)
+        for k, (name, unit) in enumerate((('centroid', 'px'), ('angle', 'deg'), ('long side', 'mm'),
+                                          ('short side', 'mm'))):
+            v = e[~np.isnan(e[:, k]), k]
+            if len(v):
+                print('  %-10s error  mean %.2f  p95 %.2f %s' % (name, v.mean(), np.percentile(v, 95), unit))
+
+    if args.qr:
+        name, decode = _decoder()
+        decoded = correct = 0
+        start = time.perf_counter()
+        for frame, truth in frames:
+            codes = decode(frame)
+            decoded += len(codes)
+            correct += len(set(int(c) for c in codes if c.isdigit()) & set(t.SN for t in truth))
+        qr_time = time.perf_counter() - start
+        print('QR (%s): %.0f frames/s, %d codes read, %d / %d SNs right' % (
+            name, len(frames) / qr_time, decoded, correct, sum(len(t) for _, t in frames)))
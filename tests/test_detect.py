@@ -0,0 +1,85 @@
+import os
+import sys
+import itertools
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import detect
+import helper
+from scan import ATTEMPTS, DEFAULT_ORDER, ScanStats
+from param import scan_min_observations
+
+# match2database of the item: footprint (40, 30), 20 between the fingers in the catalog
+MATCH = ((40, 30), 20)
+PICKED = ((40, 30), 40)
+TURNED = ((40, 30), 30)
+ROLLED = ((40, 20), 20)
+
+
+class Socket:
+
+    def sendall(self, data):
+        pass
+
+
+def plans():
+    # every order ScanStats.plan gives for one candidate
+    orders = set()
+    for counts in itertools.product((0, 1, scan_min_observations), repeat=len(ATTEMPTS)):
+        stats = ScanStats(path='')
+        stats.counts = {ScanStats.key(1, 0): list(counts)}
+        orders.add(stats.plan([(1, 0)])[0])
+    return orders
+
+
+class Scanner:
+    # the code is found by the n-th scan
+
+    def __init__(self, n):
+        self.left = n
+
+    def __call__(self, s, which, camera_index):
+        self.left -= 1
+        return '1' if self.left < 0 else ''
+
+
+class Planned(ScanStats):
+
+    def __init__(self, order):
+        ScanStats.__init__(self, path='')
+        self.order = order
+
+    def candidates(self, actual_length, catalog):
+        return []
+
+    def plan(self, candidates):
+        return self.order, 0.0, 0.0
+
+
+def test_plans_include_regrasp_after_roll():
+    orders = plans()
+    assert DEFAULT_ORDER in orders
+    assert any(ATTEMPTS[order[-1]][0] == 'regrasp' for order in orders)
+    for order in orders:
+        assert sorted(order) == list(DEFAULT_ORDER)
+
+
+def test_held_as_for_every_order(monkeypatch):
+    monkeypatch.setattr(detect, 'waitForArm', lambda *args: None)
+    monkeypatch.setattr(detect, '_regrasp', lambda s: None)
+    monkeypatch.setattr(detect, '_roll', lambda s: None)
+    monkeypatch.setattr(detect, 'match2database', lambda SN, actual_length, catalog_path: MATCH)
+    monkeypatch.setattr(detect, 'GetSizeBySN', lambda SN, catalog_path: (40, 30, 20))
+    monkeypatch.setattr(helper, 'catalog', lambda path: None)
+    for order in plans():
+        for n, found in enumerate(order):
+            monkeypatch.setattr(detect, '_scanAt', Scanner(n))
+            face, grabbing, SN = detect.detect(0, Socket(), (40, 30), stats=Planned(order))
+            stages = [ATTEMPTS[k][0] for k in order[:n + 1]]
+            if 'roll' in stages:
+                expected = ROLLED
+            elif stages[-1] == 'regrasp':
+                expected = TURNED
+            else:
+                expected = PICKED
+            assert (face, grabbing) == expected, (order, found)
+            assert SN == 1
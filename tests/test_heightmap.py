@@ -0,0 +1,44 @@
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from heightmap import HeightMap
+from packing_greedy import greedyPacking
+from stacking import planBoxes, planHeight
+
+
+def test_best_position_floor_then_on_top():
+    hmap = HeightMap((100, 60, 200), 5.0)
+    # the floor, back-left, first
+    assert hmap.bestPosition((50, 60, 20)) == (0.0, 0.0, 0.0)
+    hmap.place(0, 0, (50, 60, 20))
+    assert hmap.bestPosition((50, 60, 20)) == (50.0, 0.0, 0.0)
+    hmap.place(50, 0, (50, 60, 20))
+    # floor full: on top, fully supported
+    x, y, z = hmap.bestPosition((100, 60, 10), min_support=0.6)
+    assert (x, y, z) == (0.0, 0.0, 20.0)
+    assert hmap.top() == 20.0
+
+
+def test_support_and_fragile():
+    hmap = HeightMap((100, 60, 200), 5.0)
+    hmap.place(0, 0, (30, 60, 40), fragile=True)
+    # a 60 mm box on the 30 mm column would only be half supported
+    z, support, feasible = hmap.candidates((60, 60, 10), min_support=0.6)
+    assert not feasible[0, 0] and abs(support[0, 0] - 0.5) < 1e-9
+    # heavy boxes stay off the fragile column
+    x, y, z = hmap.bestPosition((30, 60, 10), heavy=True)
+    assert x >= 30.0 and z == 0.0
+
+
+def test_grid_engine_packs_like_corners():
+    item_size = [[40, 40, 40], [50, 50, 50], [30, 30, 30]]
+    container = (95, 150, 200)
+    corners = greedyPacking(container, item_size)
+    grid = greedyPacking(container, item_size, resolution=5.0)
+    assert corners is not None and grid is not None
+    for plan in (corners, grid):
+        lo, hi = planBoxes(plan, item_size)
+        assert (lo >= -1e-9).all() and (hi <= np.asarray(container) + 1e-9).all()
+    assert planHeight(*planBoxes(grid, item_size)) == planHeight(*planBoxes(corners, item_size))
@@ -0,0 +1,88 @@
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from motion import Motion, MotionSocket, forward, inverse, toModel, fromModel, trapezoid, HOME, IO_TIME
+from pose import CartesianPose, JointPose, Command
+
+Q = np.array([10.0, -20.0, 15.0, 5.0, -60.0, 30.0])
+
+
+class Socket:
+
+    def __init__(self):
+        self.sent = []
+
+    def sendall(self, data):
+        self.sent.append(data)
+
+
+def test_trapezoid():
+    # long moves: distance / speed plus the ramp, short ones never reach top speed
+    assert abs(trapezoid(100.0, 50.0, 0.2) - 2.2) < 1e-9
+    assert trapezoid(1.0, 50.0, 0.2) < 1.0 / 50.0 + 0.2
+    assert trapezoid(0.0, 50.0, 0.2) == 0.0
+
+
+def test_inverse_of_forward():
+    p, R = forward(Q)
+    q = inverse(p, R, Q + 3.0)
+    assert q is not None and np.allclose(forward(q)[0], p, atol=0.1)
+    # controller pose <-> flange pose
+    values = fromModel(p, R)
+    p2, R2 = toModel(values)
+    assert np.allclose(p2, p, atol=1e-6) and np.allclose(R2, R, atol=1e-6)
+
+
+def test_time_scales_with_speed():
+    slow, fast = Motion(ptp_speed=10.0), Motion(ptp_speed=50.0)
+    move = JointPose(*Q)
+    assert slow.time(move) > fast.time(move) > 0
+    assert Motion().time(Command('OUTPUT 48 OFF')) == IO_TIME
+    assert Motion().time(Command('SETPTPSPEED 20')) == 0.0
+    # nothing to do at the target
+    at = Motion(joints=Q)
+    assert at.time(JointPose(*Q)) == 0.0
+    assert Motion(joints=None).time(move) is None
+
+
+def test_apply_tracks_state():
+    motion = Motion()
+    motion.apply(Command('SETPTPSPEED 40'))
+    assert motion.ptp_speed == 40.0
+    motion.apply(JointPose(*Q))
+    assert np.allclose(motion.joints, Q)
+    motion.apply(Command('GOHOME'))
+    assert np.allclose(motion.joints, HOME)
+
+
+def test_choose():
+    p, R = forward(Q)
+    x, y, z, rx, ry, rz = fromModel(p, R)
+    move = CartesianPose(x + 100.0, y, z, rx, ry, rz)
+    # the joint move is faster at the default speeds: sent as given
+    chosen, t, t0 = Motion(joints=Q).choose(move)
+    assert chosen is move and t == t0
+    # slow joints, fast lines: sent as MOVL, to the same target
+    motion = Motion(joints=Q, ptp_speed=5.0, line_speed=1000.0)
+    chosen, t, t0 = motion.choose(move)
+    assert chosen.cmd == 'MOVL' and t < t0
+    assert np.allclose(motion.target(chosen), motion.target(move), atol=0.1)
+    # MOVL (path matters) is never changed
+    line = move.withCmd('MOVL')
+    chosen, t, t0 = Motion(joints=Q).choose(line)
+    assert chosen is line and t == t0
+
+
+def test_socket_estimates():
+    sock = Socket()
+    s = MotionSocket(sock)
+    start = time.time()
+    s.sendall(b''.join(c.encode('ascii') for c in (JointPose(*Q), Command('OUTPUT 48 OFF'))))
+    assert len(sock.sent) == 1
+    # selection off: sent as given, estimated time adds up
+    total = Motion().time(JointPose(*Q)) + IO_TIME
+    assert abs(s.time_sent - total) < 1e-6
+    assert s.busy_until >= start + total - 1e-6
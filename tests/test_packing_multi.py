@@ -0,0 +1,32 @@
+import os
+import sys
+import importlib.util
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from packing_multi import packMulti, defaultEngine
+from packing_greedy import greedyPacking
+
+ITEMS = [[50, 50, 60, 55, 60, 40, 50, 50, 60],
+         [50, 45, 45, 50, 50, 30, 50, 45, 45],
+         [50, 30, 30, 35, 30, 30, 50, 30, 30]]
+
+
+def test_greedy_without_gurobipy(monkeypatch):
+    monkeypatch.setattr(importlib.util, 'find_spec', lambda name: None)
+    assert defaultEngine() is greedyPacking
+    boxes = packMulti([[95, 150, 80]], ITEMS, enlarge=True)
+    assert len(boxes) > 1
+    placed = sorted(seq for _, item_info in boxes for seq, *_ in item_info)
+    assert placed == list(range(len(ITEMS[0])))
+
+
+def test_budget_spent_uses_fallback():
+    calls = []
+
+    def engine(*args, **kwargs):
+        calls.append(1)
+        return None
+
+    boxes = packMulti([[95, 150, 80]], ITEMS, enlarge=True, engine=engine, budget=0.0)
+    assert not calls
+    assert sum(len(item_info) for _, item_info in boxes) == len(ITEMS[0])
@@ -0,0 +1,42 @@
+import os
+import sys
+import time
+import queue
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from portfolio import localSearchStrategy, greedyStrategy, solvePortfolio, lowerBound
+from stacking import planBoxes
+from param import margin
+
+CONTAINER = (95, 150, 80)
+ITEMS = [[30, 40, 30, 40, 30], [40, 40, 30, 50, 30], [20, 30, 30, 20, 40]]
+
+
+class Best:
+    value = float('inf')
+
+
+def test_local_search_stops():
+    out = queue.Queue()
+    start = time.time()
+    localSearchStrategy(out, Best(), CONTAINER, ITEMS, {}, 1)
+    assert time.time() - start < 30
+    plans = []
+    while not out.empty():
+        plans.append(out.get())
+    # every plan put out is lower than the one before
+    heights = [h for _, h, _ in plans]
+    assert heights == sorted(heights, reverse=True)
+
+
+def test_portfolio_within_budget():
+    strategies = [(greedyStrategy, ('volume',)), (localSearchStrategy, (1,))]
+    start = time.time()
+    item_info, height, name = solvePortfolio(CONTAINER, ITEMS, enlarge=True, budget=30.0, target=0.0,
+                                             strategies=strategies, verbose=False)
+    # every worker is done long before the budget
+    assert time.time() - start < 10.0
+    assert item_info is not None and len(item_info) == len(ITEMS[0])
+    lo, hi = planBoxes(item_info, [[v + margin for v in row] for row in ITEMS])
+    assert height >= lowerBound(CONTAINER, list(zip(*ITEMS))) - 1e-6
+    assert (hi <= CONTAINER).all() and (lo >= 0).all()
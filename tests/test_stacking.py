@@ -0,0 +1,37 @@
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from stacking import pushPairs, precedence, placementOrder
+
+
+def twoFloorBoxes():
+    # side by side on the floor along y: box 0 at the back (y 0-50), box 1 in front (y 60-110)
+    lo = np.array([[0., 0., 0.], [0., 60., 0.]])
+    hi = np.array([[40., 50., 30.], [40., 110., 30.]])
+    return lo, hi
+
+
+def test_push_pairs():
+    lo, hi = twoFloorBoxes()
+    i, j = pushPairs(lo, hi)
+    # box 1 is in the way of pushing box 0 in, not the other way round
+    assert list(zip(i.tolist(), j.tolist())) == [(0, 1)]
+
+
+def test_precedence():
+    lo, hi = twoFloorBoxes()
+    after, conflicts = precedence(lo, hi)
+    assert 1 in after[0] and 0 not in after[1]
+    assert conflicts == []
+
+
+def test_placement_order():
+    lo, hi = twoFloorBoxes()
+    order, conflicts = placementOrder(lo, hi)
+    assert order == [0, 1]
+    assert conflicts == []
+    # whatever the cost of the moves
+    order, _ = placementOrder(lo, hi, step=lambda a, b: 0.0 if (a, b) == (1, 0) else 100.0)
+    assert order == [0, 1]
@@ -0,0 +1,55 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from travel import planTime, reduceTravel, sequencePlan
+
+CONTAINER = (95, 150, 80)
+ORIGIN = (0, 0, 0)
+# staging in front of the container's y = 0 side
+SLOTS = [(47.5, -300.0), (47.5, -300.0)]
+
+
+def overhang():
+    # item 1 lies on the far end of item 0; mirrored in y it lies on the near end and item 0
+    # is where the gripper comes down to push item 1, a conflict in any order
+    item_size = [[50, 50], [110, 50], [45, 30]]
+    item_info = [(0, 45.0, 95.0, 0.0, ['x', 'y', 'z']), (1, 45.0, 125.0, 45.0, ['x', 'y', 'z'])]
+    return item_info, item_size
+
+
+def test_mirror_with_conflicts_not_used():
+    item_info, item_size = overhang()
+    _, conflicts = sequencePlan(item_info, item_size, SLOTS, ORIGIN)
+    assert conflicts == []
+    mirrored = [(0, 45.0, 55.0, 0.0, ['x', 'y', 'z']), (1, 45.0, 25.0, 45.0, ['x', 'y', 'z'])]
+    _, conflicts = sequencePlan(mirrored, item_size, SLOTS, ORIGIN)
+    assert conflicts == [(1, 0)]
+    # the mirror is faster, but not chosen
+    assert planTime(mirrored, SLOTS, ORIGIN) < planTime(item_info, SLOTS, ORIGIN)
+    plan, t, conflicts = reduceTravel(item_info, item_size, CONTAINER, SLOTS, ORIGIN)
+    assert conflicts == []
+    assert {seq: y for seq, x, y, z, o in plan} == {0: 95.0, 1: 125.0}
+    assert [item[0] for item in plan] == [0, 1]
+
+
+def test_time_of_the_plan_returned():
+    # two loose items at the far side: mirrored in y they are nearer the slots
+    item_size = [[40, 40], [40, 40], [30, 30]]
+    item_info = [(0, 25.0, 125.0, 0.0, ['x', 'y', 'z']), (1, 70.0, 125.0, 0.0, ['x', 'y', 'z'])]
+    plan, t, conflicts = reduceTravel(item_info, item_size, CONTAINER, SLOTS, ORIGIN)
+    assert t == planTime(plan, SLOTS, ORIGIN)
+    assert t < planTime(item_info, SLOTS, ORIGIN)
+    assert all(y == 25.0 for seq, x, y, z, o in plan)
+    assert conflicts == []
+
+
+def test_accept_rejects_variants():
+    item_size = [[40, 40], [40, 40], [30, 30]]
+    item_info = [(0, 25.0, 125.0, 0.0, ['x', 'y', 'z']), (1, 70.0, 125.0, 0.0, ['x', 'y', 'z'])]
+    # nothing but the plan as packed is acceptable
+    packed = {(x, y) for seq, x, y, z, o in item_info}
+    accept = lambda plan, sizes, container: [] if {(x, y) for seq, x, y, z, o in plan} == packed else ['moved']
+    plan, t, _ = reduceTravel(item_info, item_size, CONTAINER, SLOTS, ORIGIN, accept=accept)
+    assert sorted(plan) == sorted(item_info)
+    assert t == planTime(item_info, SLOTS, ORIGIN)
@@ -0,0 +1,56 @@
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import validate
+from validate import validatePlan, validateBoxes, closePairs, describe
+
+CONTAINER = (95, 150, 80)
+ORI = ['x', 'y', 'z']
+
+
+def test_valid_plan():
+    item_size = [[40, 40], [50, 50], [30, 30]]
+    # side by side, 5 mm apart, on the floor
+    item_info = [(0, 20.0, 25.0, 0.0, ORI), (1, 65.0, 25.0, 0.0, ORI)]
+    report = validatePlan(item_info, item_size, CONTAINER, clearance=5.0, min_support=0.6)
+    assert report.ok and describe(report) == []
+
+
+def test_every_problem_reported():
+    item_size = [[40, 40, 40], [50, 50, 50], [30, 30, 30]]
+    item_info = [(0, 20.0, 25.0, 0.0, ORI), (1, 50.0, 25.0, 0.0, ORI), (2, 80.0, 125.0, 30.0, ORI)]
+    report = validatePlan(item_info, item_size, CONTAINER, min_support=0.6)
+    assert not report.ok
+    assert report.overlaps.tolist() == [[0, 1]]
+    # item 2 sticks out in x and floats
+    assert report.out_of_bounds.tolist() == [2]
+    assert report.unsupported.tolist() == [2]
+    assert len(describe(report)) == 3
+
+
+def test_missing_and_duplicated():
+    item_size = [[40, 40, 40], [50, 50, 50], [30, 30, 30]]
+    item_info = [(0, 20.0, 25.0, 0.0, ORI), (0, 70.0, 25.0, 0.0, ORI)]
+    report = validatePlan(item_info, item_size, CONTAINER)
+    assert not report.ok and report.missing == [1, 2, 0]
+
+
+def test_support_within_clearance():
+    # a box kept clearance above the one below still rests on it
+    lo = np.array([[0., 0., 0.], [0., 0., 35.]])
+    hi = np.array([[40., 50., 30.], [40., 50., 65.]])
+    assert validateBoxes(lo, hi, CONTAINER, clearance=5.0, min_support=0.6).ok
+    assert not validateBoxes(lo, hi, CONTAINER, clearance=0.0, min_support=0.6).ok
+
+
+def test_sweep_matches_all_pairs(monkeypatch):
+    rng = np.random.default_rng(0)
+    lo = rng.uniform(0, 900, (300, 3))
+    hi = lo + rng.uniform(10, 80, (300, 3))
+    every = closePairs(lo, hi, 5.0)
+    monkeypatch.setattr(validate, 'SWEEP_MIN', 1)
+    swept = closePairs(lo, hi, 5.0)
+    key = lambda pairs: sorted(map(tuple, np.sort(pairs, axis=1).tolist()))
+    assert key(swept) == key(every)
@@ -1,16 +1,13 @@
-import cv2
-import numpy as np
-import queue
-from param import *
-import pandas as pd
-from helper import *
+from param import man_pose_J, man_pose_inv, man_pose_J_adj, man_pose_inv_adj, open_grip, close_grip, \
+    rise_pose, Rotate_gripper_90, temp_pose, woman_pose, catalog_path
+from helper import GetSizeBySN
+from pose import sendCommands
 
 # grabbing (int, int)
 
-def traceRoute(s, ind, SN, face, grabbing):
+def traceRoute(s, ind, SN, face, grabbing, catalog_path=catalog_path):
     # edges = [7, 5, 3], face = (7, 3), grabbing = 3
-    df = pd.read_csv("./obj_data/obj_info.csv")
-    edges = df.iloc[SN - 1][1:4].to_numpy()
+    edges = GetSizeBySN(SN, catalog_path)
     face = (max(face), min(face))
     
     
@@ -23,13 +20,8 @@ def traceRoute(s, ind, SN, face, grabbing):
             # do nothing
         else:
             print("***** 1-2 *****")
-            s.sendall(man_pose_J.encode('ascii'))
-            s.sendall(open_grip.encode('ascii'))
-            s.sendall(rise_pose.encode('ascii'))
-            s.sendall(Rotate_gripper_90.encode('ascii'))
-            s.sendall(man_pose_inv.encode('ascii'))
-            s.sendall(close_grip.encode('ascii'))
-            s.sendall(rise_pose.encode('ascii'))
+            sendCommands(s, man_pose_J, open_grip, rise_pose, Rotate_gripper_90,
+                         man_pose_inv, close_grip, rise_pose)
             
             # grabbing 5
             # release, rotate, grab
@@ -41,28 +33,16 @@ def traceRoute(s, ind, SN, face, grabbing):
             print("***** 2-1 *****")
             # grabbing 5
             # rotate 90, release, woman pose, done
-            s.sendall(man_pose_J.encode('ascii'))
-            s.sendall(rise_pose.encode('ascii'))
-            s.sendall(Rotate_gripper_90.encode('ascii'))
-            s.sendall(man_pose_inv.encode('ascii'))
-            s.sendall(open_grip.encode('ascii'))
-            s.sendall(rise_pose.encode('ascii'))
-            s.sendall(temp_pose.encode('ascii'))
-            s.sendall(woman_pose.encode('ascii'))
-            s.sendall(close_grip.encode('ascii'))
-            s.sendall(rise_pose.encode('ascii'))
+            sendCommands(s, man_pose_J, rise_pose, Rotate_gripper_90, man_pose_inv,
+                         open_grip, rise_pose, temp_pose, woman_pose, close_grip,
+                         rise_pose)
             
             pass
         else:
             print("***** 2-2 *****")
             # grabbing 3
-            s.sendall(man_pose_J.encode('ascii'))
-            s.sendall(open_grip.encode('ascii'))
-            s.sendall(rise_pose.encode('ascii'))
-            s.sendall(temp_pose.encode('ascii'))
-            s.sendall(woman_pose.encode('ascii'))
-            s.sendall(close_grip.encode('ascii'))
-            s.sendall(rise_pose.encode('ascii'))
+            sendCommands(s, man_pose_J, open_grip, rise_pose, temp_pose, woman_pose,
+                         close_grip, rise_pose)
             # release, rise, rotate, aprroach, grab, and do grabbing 5
             pass
     else:
@@ -71,47 +51,25 @@ def traceRoute(s, ind, SN, face, grabbing):
             print("***** 3-1 *****")
             # grabbing 7
             # go to woman pose, grab 5, do grabbing 5
-            s.sendall(man_pose_J.encode('ascii'))
-            s.sendall(Rotate_gripper_90.encode('ascii'))
-            s.sendall(open_grip.encode('ascii'))
-            s.sendall(rise_pose.encode('ascii'))
-            s.sendall(temp_pose.encode('ascii'))
-            s.sendall(woman_pose.encode('ascii'))
-            s.sendall(close_grip.encode('ascii'))
-            s.sendall(rise_pose.encode('ascii'))
-            s.sendall(man_pose_J_adj.encode('ascii'))
-            s.sendall(open_grip.encode('ascii'))
-            s.sendall(rise_pose.encode('ascii'))
-            s.sendall(Rotate_gripper_90.encode('ascii'))
-            s.sendall(man_pose_inv_adj.encode('ascii'))
-            s.sendall(close_grip.encode('ascii'))
-            s.sendall(rise_pose.encode('ascii'))
+            sendCommands(s, man_pose_J, Rotate_gripper_90, open_grip, rise_pose,
+                         temp_pose, woman_pose, close_grip, rise_pose, man_pose_J_adj,
+                         open_grip, rise_pose, Rotate_gripper_90, man_pose_inv_adj,
+                         close_grip, rise_pose)
             
         else:
             print("***** 3-2 *****")
-            s.sendall(man_pose_J.encode('ascii'))
-            s.sendall(open_grip.encode('ascii'))
-            s.sendall(rise_pose.encode('ascii'))
-            s.sendall(temp_pose.encode('ascii'))
-            s.sendall(woman_pose.encode('ascii'))
-            s.sendall(close_grip.encode('ascii'))
-            s.sendall(rise_pose.encode('ascii'))
-            s.sendall(man_pose_J_adj.encode('ascii'))
-            s.sendall(open_grip.encode('ascii'))
-            s.sendall(rise_pose.encode('ascii'))
-            s.sendall(Rotate_gripper_90.encode('ascii'))
-            s.sendall(man_pose_inv_adj.encode('ascii'))
-            s.sendall(close_grip.encode('ascii'))
-            s.sendall(rise_pose.encode('ascii'))
+            sendCommands(s, man_pose_J, open_grip, rise_pose, temp_pose, woman_pose,
+                         close_grip, rise_pose, man_pose_J_adj, open_grip, rise_pose,
+                         Rotate_gripper_90, man_pose_inv_adj, close_grip, rise_pose)
             # grabbing 3
             # rotate to grab 7, do the rest as grabbing 7
             pass
 
-def GetReady(s, SN, matching):
+def GetReady(s, SN, matching, catalog_path=catalog_path):
     # matching ['x', 'y', 'z']
     # saying a should match to x axis, and so on.
     # [a , b, c]
-    size_of_box = GetSizeBySN(SN)
+    size_of_box = GetSizeBySN(SN, catalog_path)
     return_matching = 0
     for i in range(len(matching)):
         if matching[i] == 'y':
@@ -122,11 +80,8 @@ def GetReady(s, SN, matching):
         if matching[0] == 'y':
             # no rotation
             print("rotate 90")
-            s.sendall(open_grip.encode('ascii'))
-            s.sendall(rise_pose.encode('ascii'))
-            s.sendall(Rotate_gripper_90.encode('ascii'))
-            s.sendall(man_pose_inv_adj.encode('ascii'))
-            s.sendall(close_grip.encode('ascii'))
+            sendCommands(s, open_grip, rise_pose, Rotate_gripper_90, man_pose_inv_adj,
+                         close_grip)
             pass
         else:
             # rotate 90
@@ -139,18 +94,11 @@ def GetReady(s, SN, matching):
     elif matching[0] == 'z':
         # go to woman pose
         # release, man pose
-        s.sendall(rise_pose.encode('ascii'))
-        s.sendall(temp_pose.encode('ascii'))
-        s.sendall(woman_pose.encode('ascii'))
-        s.sendall(open_grip.encode('ascii'))
-        s.sendall(temp_pose.encode('ascii'))
+        sendCommands(s, rise_pose, temp_pose, woman_pose, open_grip, temp_pose)
         
         if matching[1] == 'x':
             # no rotation
-            s.sendall(man_pose_J.encode('ascii'))
-            s.sendall(rise_pose.encode('ascii'))
-            s.sendall(Rotate_gripper_90.encode('ascii'))
-            s.sendall(man_pose_inv.encode('ascii'))
+            sendCommands(s, man_pose_J, rise_pose, Rotate_gripper_90, man_pose_inv)
             
             print("z x")
             pass
@@ -159,19 +107,12 @@ def GetReady(s, SN, matching):
             # rotate 90
             print("z x 90")
             pass
-        s.sendall(close_grip.encode('ascii'))
-        s.sendall(rise_pose.encode('ascii'))
+        sendCommands(s, close_grip, rise_pose)
         # go to packing pose
     else:
         # go to man pose
-        s.sendall(Rotate_gripper_90.encode('ascii'))
-        s.sendall(open_grip.encode('ascii'))
-        s.sendall(rise_pose.encode('ascii'))
-        s.sendall(temp_pose.encode('ascii'))
-        s.sendall(woman_pose.encode('ascii'))
-        s.sendall(close_grip.encode('ascii'))
-        s.sendall(temp_pose.encode('ascii'))
-        s.sendall(man_pose_J.encode('ascii'))
+        sendCommands(s, Rotate_gripper_90, open_grip, rise_pose, temp_pose, woman_pose,
+                     close_grip, temp_pose, man_pose_J)
         
         # rotate 90
         # woman pose
@@ -179,11 +120,8 @@ def GetReady(s, SN, matching):
             # do nothing
             
             print("x z")
-            s.sendall(open_grip.encode('ascii'))
-            s.sendall(rise_pose.encode('ascii'))
-            s.sendall(Rotate_gripper_90.encode('ascii'))
-            s.sendall(man_pose_inv.encode('ascii'))
-            s.sendall(close_grip.encode('ascii'))
+            sendCommands(s, open_grip, rise_pose, Rotate_gripper_90, man_pose_inv,
+                         close_grip)
             
             pass
         else:
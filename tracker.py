@@ -0,0 +1,98 @@
+# Region-of-interest tracker used to re-centroid a single object after it was
+# put back on the table, instead of sending the arm home and re-running the
+# full take_pictures pass.
+import numpy as np
+import cv2
+import math
+from image import findContours, uniqueObjects, principalAngle, imageToActual, camera_index, pixelRatio
+from param import calibration_dir
+from framebus import openCapture
+
+
+class RoiTracker:
+
+    def __init__(self, A, camera_index=camera_index, pixel2mm=None, roi_mm=70, max_shift=20,
+                 settle_tol=1.0, max_frames=30, flush_frames=5, calib_dir=calibration_dir):
+        # A: img2actual (3x3), roi_mm: half size of the crop around the prediction,
+        # max_shift: largest accepted distance (mm) from the predicted position,
+        # flush_frames: frames dropped before measuring (buffered while the arm moved)
+        self.A = np.asarray(A, dtype=float)
+        self.A_inv = np.linalg.inv(self.A)
+        self.camera_index = camera_index
+        self.calib_dir = calib_dir
+        if pixel2mm is None:
+            pixel2mm = pixelRatio(calib_dir)
+        self.pixel2mm = pixel2mm
+        self.roi_px = int(math.ceil(roi_mm / float(pixel2mm)))
+        self.max_shift = max_shift
+        self.settle_tol = settle_tol
+        self.max_frames = max_frames
+        self.flush_frames = flush_frames
+        self.cap = None
+
+    def toImage(self, p):
+        u = np.matmul(self.A_inv, [p[0], p[1], 1.0])
+        return u[0] / u[2], u[1] / u[2]
+
+    def toActual(self, mc):
+        return tuple(imageToActual(self.A, mc))
+
+    def grab(self):
+        if self.cap is None:
+            self.cap = openCapture(self.camera_index)
+        ret, frame = self.cap.read()
+        return frame if ret else None
+
+    def measure(self, frame, p_hat):
+        # centroid (mm) and principal angle (deg) of the object nearest to p_hat,
+        # found in a crop around its predicted pixel position only
+        u, v = self.toImage(p_hat)
+        h, w = frame.shape[:2]
+        x0, x1 = max(int(u) - self.roi_px, 0), min(int(u) + self.roi_px, w)
+        y0, y1 = max(int(v) - self.roi_px, 0), min(int(v) + self.roi_px, h)
+        if x1 <= x0 or y1 <= y0:
+            return None
+        roi = frame[y0:y1, x0:x1]
+        if roi.ndim == 3:
+            roi = cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY)
+        _, contours = findContours(roi, offset=(x0, y0), calib_dir=self.calib_dir)
+        _, mu, mc = uniqueObjects(contours)
+
+        best = None
+        for i in range(len(mc)):
+            x, y = self.toActual(mc[i])
+            dist = np.sqrt((p_hat[0] - x) ** 2 + (p_hat[1] - y) ** 2)
+            if dist < self.max_shift and (best is None or dist < best[0]):
+                best = (dist, (x, y), principalAngle(mu[i]) * 180 / math.pi)
+        if best is None:
+            return None
+        return best[1], best[2]
+
+    def flush(self):
+        # drop the frames the capture buffered before now
+        for _ in range(self.flush_frames):
+            self.grab()
+
+    def remeasure(self, p_hat):
+        # read frames until two consecutive measurements agree, i.e. the arm has
+        # left the region and the object is at rest; None when they never do.
+        # Call it once the arm is done moving (see main.recentre)
+        self.flush()
+        last = None
+        for _ in range(self.max_frames):
+            frame = self.grab()
+            if frame is None:
+                continue
+            cur = self.measure(frame, p_hat)
+            if cur is None:
+                last = None
+                continue
+            if last is not None and np.hypot(cur[0][0] - last[0][0], cur[0][1] - last[0][1]) < self.settle_tol:
+                return cur
+            last = cur
+        return None
+
+    def release(self):
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
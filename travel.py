@@ -0,0 +1,167 @@
+# Placement motion cost of a packing plan and a second stage that lowers it.
+# Each item travels from its staging slot (lane.inter_slots) to its spot in the container
+# (packing origin + plan centroid) and, before that, gets the regrasp sequence
+# trace.GetReady runs for its orientation. The second stage only applies changes that
+# leave the plan's boxes (hence height, fill, support and load rules) as they are:
+#   - mirroring the plan in x and / or y
+#   - another orientation of an item with the same extents (a cheaper regrasp)
+#   - swapping items with the same extents, weight and fragility
+# handlingCost gives the same regrasp times per orientation to the packing engines, which
+# then prefer cheap orientations when the plan height allows.
+# sequencePlan orders a plan for placement: among the orders every item can be lowered in
+# (stacking.placementOrder), the one with the least return travel from the container to
+# the next staging slot and the fewest speed profile switches between items.
+import math
+import itertools
+import numpy as np
+from param import travel_speed, regrasp_time, unhandled_cost, speed_change_time
+from stacking import planBoxes, placementOrder
+from speed import speedFactor
+
+AXES = ('x', 'y', 'z')
+
+
+def regraspKind(orientation):
+    # the GetReady branch an orientation (container axis of item dimensions a, b, c) takes
+    o = list(orientation)
+    if o[2] == 'z':
+        return 'rotate' if o[0] == 'y' else 'none'
+    if o[0] == 'z':
+        return 'roll_rotate' if o[1] == 'x' else 'roll'
+    return 'flip_rotate' if o[0] == 'x' else 'flip'
+
+
+def handlingCost(upright=None):
+    # seconds of regrasp for each orientation (tuple of axes) of one item. After traceRoute
+    # the item is held in the grasp GetReady starts from; items put down as picked
+    # (upright = index of the dimension that stood vertical) are never regrasped, so only
+    # orientations keeping that dimension on z are possible (the others cost unhandled_cost,
+    # see allowed)
+    cost = {}
+    for perm in itertools.permutations(AXES):
+        if upright is None:
+            cost[perm] = regrasp_time[regraspKind(perm)]
+        else:
+            cost[perm] = 0.0 if perm[upright] == 'z' else unhandled_cost
+    return cost
+
+
+def allowed(handling, orientation):
+    # the item can be put in with this orientation at all
+    return handling is None or handling[tuple(orientation)] < unhandled_cost
+
+
+def _regrasp(orientation, handling=None):
+    return regrasp_time[regraspKind(orientation)] if handling is None else handling[tuple(orientation)]
+
+
+def _extent(dims, orientation):
+    ext = [0.0, 0.0, 0.0]
+    for k, ax in enumerate(orientation):
+        ext[AXES.index(ax)] = dims[k]
+    return tuple(ext)
+
+
+def itemTime(slot, origin, x, y, orientation, handling=None):
+    # seconds to regrasp and carry one item from its staging slot to (x, y) in the container;
+    # handling = handlingCost of the item (nominal GetReady times by default)
+    d = math.hypot(origin[0] + x - slot[0], origin[1] + y - slot[1])
+    return d / travel_speed + _regrasp(orientation, handling)
+
+
+def planTime(item_info, slots, origin, handling=None):
+    # handling = handlingCost per item, indexed by seq
+    return sum(itemTime(slots[seq], origin, x, y, o, None if handling is None else handling[seq])
+               for seq, x, y, z, o in item_info)
+
+
+def _cheapest(dims, ext, handling=None):
+    # orientation with extents ext and the cheapest regrasp, None if dims cannot give ext
+    # in an allowed orientation
+    best = None
+    for perm in itertools.permutations(AXES):
+        if allowed(handling, perm) and np.allclose(_extent(dims, perm), ext, atol=1e-6):
+            if best is None or _regrasp(perm, handling) < _regrasp(best, handling):
+                best = list(perm)
+    return best
+
+
+def sequencePlan(item_info, item_size, slots, origin, weight=None, fragility=None):
+    # -> (item_info in placement order, conflicts: (seq, seq) pairs, the second item in the
+    # way of putting in the first whatever the order); item_size as packed, weight and
+    # fragility indexed by seq (the items of one box of a split basket are renumbered to get their boxes)
+    seqs = [item[0] for item in item_info]
+    lo, hi = planBoxes([(n,) + tuple(item[1:]) for n, item in enumerate(item_info)],
+                       [[item_size[k][seq] for seq in seqs] for k in range(3)])
+    centre = (lo[:, :2] + hi[:, :2]) / 2 + np.asarray(origin[:2], dtype=float)
+    profile = [speedFactor('transit', None if weight is None else weight[seq],
+                           0 if fragility is None else fragility[seq]) for seq in seqs]
+
+    def step(a, b):
+        # back from item a in the container to the slot of item b, switching speeds if needed
+        slot = slots[seqs[b]]
+        d = math.hypot(centre[a, 0] - slot[0], centre[a, 1] - slot[1])
+        return d / travel_speed + (speed_change_time if profile[a] != profile[b] else 0.0)
+
+    order, conflicts = placementOrder(lo, hi, step)
+    by_seq = {item[0]: item for item in item_info}
+    return [tuple(by_seq[seqs[n]]) for n in order], [(seqs[i], seqs[j]) for i, j in conflicts]
+
+
+def reduceTravel(item_info, item_size, container_size, slots, origin, weight=None, fragility=None,
+                 handling=None, accept=None):
+    # same boxes, lower planTime -> (item_info, planTime, conflicts as in sequencePlan);
+    # item_size as packed (with margin), weight, fragility and handling indexed by seq;
+    # accept(item_info, item_size, container_size) -> problems, a variant with problems
+    # (e.g. reach.placementProblems of a mirrored plan) is not used; variants are ranked by
+    # their conflicts, then time, and none has more conflicts than the plan as packed
+    X, Y = container_size[0], container_size[1]
+    cost = (lambda seq: None) if handling is None else (lambda seq: handling[seq])
+    dims = {seq: [item_size[k][seq] for k in range(3)] for seq, *_ in item_info}
+    variants = []
+    for mx, my in ((False, False), (True, False), (False, True), (True, True)):
+        plan = [[seq, X - x if mx else x, Y - y if my else y, z, list(o)] for seq, x, y, z, o in item_info]
+        # cheapest orientation of each item for the box it has
+        for item in plan:
+            item[4] = _cheapest(dims[item[0]], _extent(dims[item[0]], item[4]), cost(item[0]))
+        # swap interchangeable items while that saves time
+        improved = True
+        while improved:
+            improved = False
+            for a, b in itertools.combinations(range(len(plan)), 2):
+                i, j = plan[a], plan[b]
+                if weight is not None and weight[i[0]] != weight[j[0]]:
+                    continue
+                if fragility is not None and fragility[i[0]] != fragility[j[0]]:
+                    continue
+                oi = _cheapest(dims[i[0]], _extent(dims[j[0]], j[4]), cost(i[0]))
+                oj = _cheapest(dims[j[0]], _extent(dims[i[0]], i[4]), cost(j[0]))
+                if oi is None or oj is None:
+                    continue
+                now = itemTime(slots[i[0]], origin, i[1], i[2], i[4], cost(i[0])) + \
+                    itemTime(slots[j[0]], origin, j[1], j[2], j[4], cost(j[0]))
+                swapped = itemTime(slots[i[0]], origin, j[1], j[2], oi, cost(i[0])) + \
+                    itemTime(slots[j[0]], origin, i[1], i[2], oj, cost(j[0]))
+                if swapped < now - 1e-9:
+                    plan[a] = [i[0], j[1], j[2], j[3], oi]
+                    plan[b] = [j[0], i[1], i[2], i[3], oj]
+                    improved = True
+        variants.append((planTime(plan, slots, origin, handling), len(variants), plan))
+
+    def problems(plan):
+        # checked as a box of its own, items renumbered from 0
+        seqs = [item[0] for item in plan]
+        local = [(n,) + tuple(item[1:]) for n, item in enumerate(plan)]
+        return accept(local, [[item_size[k][seq] for seq in seqs] for k in range(3)], container_size)
+
+    packed, packed_conflicts = sequencePlan(item_info, item_size, slots, origin, weight, fragility)
+    ranked = []
+    for t, k, plan in variants:
+        plan, conflicts = sequencePlan(plan, item_size, slots, origin, weight, fragility)
+        if len(conflicts) <= len(packed_conflicts):
+            ranked.append((len(conflicts), t, k, plan, conflicts))
+    for _, _, _, plan, conflicts in sorted(ranked, key=lambda v: v[:3]):
+        if accept is None or not problems(plan):
+            return plan, planTime(plan, slots, origin, handling), conflicts
+    # no variant passes: the plan as packed
+    return packed, planTime(packed, slots, origin, handling), packed_conflicts
@@ -0,0 +1,103 @@
+# Feasibility check for packing plans: containment, pairwise overlap / clearance
+# and support, vectorized over the whole plan.
+import numpy as np
+from collections import namedtuple
+from stacking import planBoxes, supportFraction
+
+# ok: plan passed every check
+# missing: item numbers not in the plan (or placed twice)
+# out_of_bounds: items sticking out of the container
+# overlaps: (i, j) pairs closer than the clearance (overlapping when clearance = 0)
+# unsupported: items resting on less than min_support of their footprint
+PlanReport = namedtuple('PlanReport', ['ok', 'missing', 'out_of_bounds', 'overlaps', 'unsupported', 'support'])
+
+# above this many boxes candidate pairs come from sweep-and-prune instead of all pairs
+SWEEP_MIN = 64
+
+
+def _pairsAll(lo, hi, clearance, tol):
+    # interval broadcasting over all pairs
+    sep = np.maximum(lo[:, None, :], lo[None, :, :]) - np.minimum(hi[:, None, :], hi[None, :, :])
+    close = (sep < clearance - tol).all(axis=2)
+    i, j = np.nonzero(np.triu(close, 1))
+    return np.stack([i, j], axis=1)
+
+
+def _pairsSweep(lo, hi, clearance, tol):
+    # sort by x, each box is only compared with the boxes starting before it ends
+    order = np.argsort(lo[:, 0])
+    lo_s, hi_s = lo[order], hi[order]
+    stop = np.searchsorted(lo_s[:, 0], hi_s[:, 0] + clearance - tol, side='left')
+    count = stop - np.arange(len(lo)) - 1
+    count = np.maximum(count, 0)
+    i = np.repeat(np.arange(len(lo)), count)
+    j = i + 1 + (np.arange(count.sum()) - np.repeat(np.cumsum(count) - count, count))
+    sep = np.maximum(lo_s[i], lo_s[j]) - np.minimum(hi_s[i], hi_s[j])
+    close = (sep < clearance - tol).all(axis=1)
+    pairs = np.stack([order[i[close]], order[j[close]]], axis=1)
+    return np.sort(pairs, axis=1)
+
+
+def closePairs(lo, hi, clearance=0.0, tol=1e-6):
+    if len(lo) < SWEEP_MIN:
+        return _pairsAll(lo, hi, clearance, tol)
+    return _pairsSweep(lo, hi, clearance, tol)
+
+
+def validateBoxes(lo, hi, container_size, clearance=0.0, min_support=0.0, tol=1e-6):
+    lo = np.asarray(lo, dtype=float)
+    hi = np.asarray(hi, dtype=float)
+    container = np.asarray(container_size, dtype=float)
+    out = np.nonzero((lo < -tol).any(axis=1) | (hi > container + tol).any(axis=1))[0]
+    overlaps = closePairs(lo, hi, clearance, tol)
+    # boxes kept clearance apart rest on what is up to clearance below them
+    support = supportFraction(lo, hi, tol=clearance + 0.5) if len(lo) else np.zeros(0)
+    unsupported = np.nonzero(support < min_support - tol)[0]
+    ok = len(out) == 0 and len(overlaps) == 0 and len(unsupported) == 0
+    return PlanReport(ok, [], out, overlaps, unsupported, support)
+
+
+# INPUT
+# item_info = packing() output, item_size = the sizes the plan was made with
+# clearance = required gap between boxes (mm), e.g. margin when item_size is not enlarged
+# min_support = share of the footprint every box has to rest on (param.min_support)
+
+def validatePlan(item_info, item_size, container_size, clearance=0.0, min_support=0.0, tol=1e-6):
+    n_item = len(item_size[0])
+    seqs = [item[0] for item in item_info]
+    missing = sorted(set(range(n_item)) - set(seqs))
+    if len(seqs) != len(set(seqs)):
+        missing += sorted(set(s for s in seqs if seqs.count(s) > 1))
+    if missing:
+        return PlanReport(False, missing, [], [], [], None)
+    lo, hi = planBoxes(item_info, item_size)
+    return validateBoxes(lo, hi, container_size, clearance, min_support, tol)
+
+
+def describe(report):
+    lines = []
+    if report.missing:
+        lines.append('missing / duplicated items: %s' % list(report.missing))
+    if len(report.out_of_bounds):
+        lines.append('outside the container: %s' % list(report.out_of_bounds))
+    for i, j in report.overlaps:
+        lines.append('items %d and %d overlap' % (i, j))
+    for i in report.unsupported:
+        lines.append('item %d supported on %.0f%% of its footprint' % (i, 100 * report.support[i]))
+    return lines
+
+
+if __name__ == "__main__":
+
+    # timing on random plans (overlapping on purpose, so every path is exercised)
+    import time
+    rng = np.random.default_rng(0)
+    for n in [10, 50, 200, 1000, 5000]:
+        container = np.array([1000.0, 1000.0, 1000.0])
+        lo = rng.uniform(0, 950, (n, 3))
+        hi = lo + rng.uniform(10, 50, (n, 3))
+        start = time.time()
+        report = validateBoxes(lo, hi, container)
+        elapsed = time.time() - start
+        print('n = %5d  %.2f ms  %d overlaps  %d out of bounds' % (n, elapsed * 1000, len(report.overlaps),
+                                                                      len(report.out_of_bounds)))
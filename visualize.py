@@ -1,5 +1,4 @@
 import matplotlib.pyplot as plt
-import numpy as np
 import glob
 import os
 from mpl_toolkits.mplot3d import Axes3D
@@ -19,10 +18,26 @@ def gifGenerator(filenames):
     print('visualization/gif.gif saved')
 
 
+def _axes(container_size, shrink_ratio):
+    fig = plt.figure()
+    ax = fig.add_subplot(projection=Axes3D.name)
+    ax.set_xlabel('x (%dmm)'%shrink_ratio)
+    ax.set_ylabel('y (%dmm)'%shrink_ratio)
+    ax.set_zlabel('z (%dmm)'%shrink_ratio)
+    ax.set_xlim3d(0.0, container_size[0])
+    ax.set_ylim3d(0.0, container_size[1])
+    ax.set_zlim3d(0.0, container_size[2])
+    ax.set_xticks(range(0, int(container_size[0])+1, 5))
+    ax.set_yticks(range(0, int(container_size[1])+1, 5))
+    ax.set_zticks(range(0, int(container_size[2])+1, 5))
+    ax.view_init(30, 110)
+    return fig, ax
+
+
 def visualize(seq, container_size, x_pos, y_pos, z_pos, a_len, b_len, c_len, shrink_ratio=5):
 
     # shrink
-    shrink = lambda li: list(map(lambda length: int(length/shrink_ratio), li))
+    shrink = lambda li: list(map(lambda length: length/shrink_ratio, li))
     container_size = shrink(container_size)
     x_pos, y_pos, z_pos = shrink(x_pos), shrink(y_pos), shrink(z_pos)
     a_len, b_len, c_len = shrink(a_len), shrink(b_len), shrink(c_len)
@@ -32,57 +47,61 @@ def visualize(seq, container_size, x_pos, y_pos, z_pos, a_len, b_len, c_len, shr
     for f in files:
         os.remove(f)
 
-    # draw figures
+    # draw figures, each packed item as one box instead of a voxel grid of the container
     color_packed = 'orange'
     filenames = []
-    # x_points, y_points, z_points = [], [], []
-    filled = np.zeros(tuple(container_size), dtype=bool)
-    colors = np.empty(filled.shape, dtype=object)
 
-    fig = plt.figure()
-    ax = fig.gca(projection='3d')
-    ax.set_xlabel('x (%dmm)'%shrink_ratio)
-    ax.set_ylabel('y (%dmm)'%shrink_ratio)
-    ax.set_zlabel('z (%dmm)'%shrink_ratio)
-    ax.set_xlim3d(0.0, container_size[0])
-    ax.set_ylim3d(0.0, container_size[1])
-    ax.set_zlim3d(0.0, container_size[2])
-    ax.set_xticks(range(0, container_size[0]+1, 5))
-    ax.set_yticks(range(0, container_size[1]+1, 5))
-    ax.set_zticks(range(0, container_size[2]+1, 5))
-    ax.view_init(30, 110)
-    ax.voxels(filled, facecolors=colors, alpha=0.9)
-    
+    fig, ax = _axes(container_size, shrink_ratio)
     filenames.append('visualization/0.png')
     plt.title(' ')
     plt.savefig(filenames[-1])
+    plt.close(fig)
     print(filenames[-1], 'saved')
 
     for i in range(len(seq)):
-        fig = plt.figure()
-        ax = fig.gca(projection='3d')
-        ax.set_xlabel('x (%dmm)'%shrink_ratio)
-        ax.set_ylabel('y (%dmm)'%shrink_ratio)
-        ax.set_zlabel('z (%dmm)'%shrink_ratio)
-        ax.set_xlim3d(0.0, container_size[0])
-        ax.set_ylim3d(0.0, container_size[1])
-        ax.set_zlim3d(0.0, container_size[2])
-        ax.set_xticks(range(0, container_size[0]+1, 5))
-        ax.set_yticks(range(0, container_size[1]+1, 5))
-        ax.set_zticks(range(0, container_size[2]+1, 5))
-        ax.view_init(30, 110)
-        filled[x_pos[seq[i]]:x_pos[seq[i]] + a_len[seq[i]], y_pos[seq[i]]:y_pos[seq[i]] + b_len[seq[i]], z_pos[seq[i]]:z_pos[seq[i]] + c_len[seq[i]]] = True
-        colors[x_pos[seq[i]]:x_pos[seq[i]] + a_len[seq[i]], y_pos[seq[i]]:y_pos[seq[i]] + b_len[seq[i]], z_pos[seq[i]]:z_pos[seq[i]] + c_len[seq[i]]] = color_packed # color_new
-        ax.voxels(filled, facecolors=colors, alpha=0.9)
-        
+        fig, ax = _axes(container_size, shrink_ratio)
+        for j in seq[:i+1]:
+            ax.bar3d(x_pos[j], y_pos[j], z_pos[j], a_len[j], b_len[j], c_len[j], color=color_packed, alpha=0.9,
+                     edgecolor='k', linewidth=0.3)
+
         filenames.append('visualization/%d.png'%(i+1))
         plt.title('Item #%d Packed'%seq[i])
         plt.savefig(filenames[-1])
+        plt.close(fig)
         print(filenames[-1], 'saved')
 
     gifGenerator(filenames)
 
 
+def drawHeightMap(hmap, filename='visualization/heightmap.png'):
+    # top view of a heightmap.HeightMap, fragile columns hatched
+    fig, ax = plt.subplots()
+    extent = [0, hmap.heights.shape[0] * hmap.resolution, 0, hmap.heights.shape[1] * hmap.resolution]
+    im = ax.imshow(hmap.heights.T, origin='lower', extent=extent, cmap='viridis',
+                   vmin=0, vmax=hmap.container_size[2])
+    if hmap.fragile.any():
+        ax.contourf(hmap.fragile.T.astype(float), levels=[0.5, 1.5], colors='none', hatches=['//'],
+                    extent=extent, origin='lower')
+    ax.set_xlabel('x (mm)')
+    ax.set_ylabel('y (mm)')
+    fig.colorbar(im, ax=ax, label='height (mm)')
+    plt.savefig(filename)
+    plt.close(fig)
+    print(filename, 'saved')
+
+
+def visualizePlan(item_info, item_size, container_size, shrink_ratio=5):
+    # packing() output -> visualize()
+    from stacking import planBoxes
+    from heightmap import HeightMap
+    lo, hi = planBoxes(item_info, item_size)
+    seq = [item[0] for item in item_info]
+    ext = hi - lo
+    visualize(seq, container_size, lo[:, 0], lo[:, 1], lo[:, 2], ext[:, 0], ext[:, 1], ext[:, 2],
+              shrink_ratio=shrink_ratio)
+    drawHeightMap(HeightMap.fromBoxes(container_size, lo, hi))
+
+
 if __name__ == "__main__":
 
     container_size = [150, 95, 80]